@@ -1,5 +1,6 @@
 import streamlit as st
 import plotly.graph_objects as go
+from datetime import date, timedelta
 from utils.portfolio import Portfolio
 from utils.market_data import MarketData
 from utils.sentiment import SentimentAnalyzer
@@ -15,6 +16,8 @@ def render_dashboard(portfolio: Portfolio):
     with col3:
         st.metric("Positions", len(portfolio.get_positions()))
 
+    _render_pnl_attribution(portfolio)
+
     # Portfolio Composition
     if portfolio.get_positions():
         fig = go.Figure(data=[go.Pie(
@@ -48,3 +51,42 @@ def render_dashboard(portfolio: Portfolio):
             with col3:
                 sentiment = SentimentAnalyzer().analyze_news(symbol)
                 st.write(f"Sentiment: {sentiment['sentiment_label']}")
+
+def _render_pnl_attribution(portfolio: Portfolio):
+    periods = {
+        "Today": date.today(),
+        "1W": date.today() - timedelta(days=7),
+        "1M": date.today() - timedelta(days=30),
+        "YTD": date(date.today().year, 1, 1)
+    }
+    period = st.radio("P/L Period", list(periods), horizontal=True, key="pnl_period")
+    attribution = portfolio.get_pnl_attribution(periods[period])
+    if not attribution:
+        st.info("P/L attribution is computed after the market close")
+        return
+
+    totals = attribution['daily'].sum()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("P/L", f"${totals['total']:,.2f}")
+    with col2:
+        st.metric("From Price Moves", f"${totals['price_move']:,.2f}")
+    with col3:
+        st.metric("From Trading", f"${totals['trading']:,.2f}")
+
+    col1, col2 = st.columns(2)
+    for column, key, title in [(col1, 'by_position', "P/L by Position"), (col2, 'by_sector', "P/L by Sector")]:
+        breakdown = attribution[key]
+        fig = go.Figure(data=[
+            go.Bar(y=breakdown.index, x=breakdown['price_move'], name='Price Move', orientation='h', marker_color='#FFD700'),
+            go.Bar(y=breakdown.index, x=breakdown['trading'], name='Trading', orientation='h', marker_color='#64B5F6')
+        ])
+        fig.update_layout(
+            title=title,
+            barmode='relative',
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            font=dict(color="white")
+        )
+        with column:
+            st.plotly_chart(fig, use_container_width=True)
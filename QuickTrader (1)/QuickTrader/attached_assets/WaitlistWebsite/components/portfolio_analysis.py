@@ -2,9 +2,15 @@ import streamlit as st
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime, timedelta
+import os
+import numpy as np
 import pandas as pd
 from utils.market_data import MarketData
 from utils.portfolio import Portfolio
+from utils.value_at_risk import MonteCarloVaR
+from utils.history_store import get_history_store
+from utils.optimizer import PortfolioOptimizer
+from utils.export import EXPORT_FORMATS, MAX_DOWNLOAD_BYTES
 
 def render_portfolio_analysis(portfolio: Portfolio):
     st.subheader("Portfolio Analysis")
@@ -44,6 +50,34 @@ def render_portfolio_analysis(portfolio: Portfolio):
         st.metric("Daily Average Return", f"{metrics.get('daily_return', 0):.2f}%")
         st.metric("Total Value", f"${metrics['total_value']:,.2f}")
 
+        if 'volatility' in metrics:
+            risk_col1, risk_col2 = st.columns(2)
+            with risk_col1:
+                st.metric("Volatility (ann.)", f"{metrics['volatility'] * 100:.2f}%")
+                st.metric("Sharpe Ratio", f"{metrics['sharpe_ratio']:.2f}")
+                st.metric("Beta", f"{metrics.get('beta', float('nan')):.2f}")
+            with risk_col2:
+                st.metric("Max Drawdown", f"{metrics['max_drawdown'] * 100:.2f}%")
+                st.metric("Sortino Ratio", f"{metrics['sortino_ratio']:.2f}")
+
+    rolling = metrics.get('rolling', pd.DataFrame())
+    if not rolling.empty:
+        with st.expander("Rolling Risk Metrics"):
+            selected = st.selectbox("Metric", list(rolling.columns))
+            fig_rolling = go.Figure(go.Scatter(
+                x=rolling.index,
+                y=rolling[selected],
+                mode='lines',
+                line=dict(color='#FFD700')
+            ))
+            fig_rolling.update_layout(
+                title=f"Rolling {selected.replace('_', ' ').title()}",
+                paper_bgcolor="rgba(0,0,0,0)",
+                plot_bgcolor="rgba(0,0,0,0)",
+                font=dict(color="white")
+            )
+            st.plotly_chart(fig_rolling, use_container_width=True)
+
     # Asset Allocation (Bar Chart)
     st.markdown("### Asset Allocation")
     positions = portfolio.get_positions()
@@ -97,67 +131,278 @@ def render_portfolio_analysis(portfolio: Portfolio):
         )
         st.plotly_chart(fig_returns, use_container_width=True)
 
-def _get_portfolio_value_history(portfolio: Portfolio) -> pd.DataFrame:
-    """Generate historical portfolio value data"""
-    dates = pd.date_range(
-        start=portfolio._get_account_age(),
-        end=datetime.now(),
-        freq='D'
+    _render_holdings_as_of(portfolio)
+    _render_correlation_heatmap(portfolio)
+    _render_value_at_risk(portfolio)
+    _render_optimization(portfolio)
+    _render_rebalancing(portfolio)
+
+def _render_optimization(portfolio: Portfolio):
+    st.markdown("### Portfolio Optimization")
+    candidates = st.text_input("Candidate Symbols (comma separated)", "", key="optimizer_candidates")
+    symbols = sorted(set(portfolio.get_positions()) | {
+        s.strip().upper() for s in candidates.split(',') if s.strip()
+    })
+    if len(symbols) < 2:
+        st.info("Hold or add at least two symbols to compute the efficient frontier")
+        return
+
+    service = get_history_store().get_covariance_service(symbols)
+    if not service.covers(symbols):
+        st.info("Not enough price history to optimize these symbols")
+        return
+    frontier = PortfolioOptimizer().optimize(
+        symbols,
+        service.expected_returns(symbols),
+        service.covariance(symbols, kind='sample').to_numpy()
     )
 
-    values = []
-    positions = portfolio.get_positions()
+    point = st.slider("Risk Level", 0, len(frontier['volatility']) - 1, 0, key="frontier_point")
 
-    for date in dates:
-        daily_value = portfolio.get_cash()
-        for symbol, quantity in positions.items():
-            stock_data = MarketData.get_stock_data(
-                symbol,
-                period='1d',
-                start=date,
-                end=date + timedelta(days=1)
-            )
-            if not stock_data.empty:
-                daily_value += stock_data['Close'].iloc[0] * quantity
-        values.append(daily_value)
+    fig_frontier = go.Figure()
+    fig_frontier.add_trace(go.Scatter(
+        x=frontier['volatility'] * 100,
+        y=frontier['returns'] * 100,
+        mode='lines+markers',
+        name='Efficient Frontier',
+        line=dict(color='#FFD700')
+    ))
+    fig_frontier.add_trace(go.Scatter(
+        x=[frontier['volatility'][point] * 100],
+        y=[frontier['returns'][point] * 100],
+        mode='markers',
+        name='Selected',
+        marker=dict(color='#FF4B4B', size=12)
+    ))
+    fig_frontier.update_layout(
+        title="Efficient Frontier",
+        xaxis_title="Volatility (%)",
+        yaxis_title="Expected Return (%)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white")
+    )
+    st.plotly_chart(fig_frontier, use_container_width=True)
 
-    return pd.DataFrame({
-        'value': values
-    }, index=dates)
+    choice = st.radio("Weights", ["Selected Point", "Max Sharpe", "Min Variance"], horizontal=True)
+    if choice == "Max Sharpe":
+        weights = frontier['max_sharpe']
+    elif choice == "Min Variance":
+        weights = frontier['min_variance']
+    else:
+        weights = dict(zip(symbols, frontier['weights'][point]))
 
-def render_transaction_history(portfolio: Portfolio):
-    st.subheader("Transaction History")
+    weights_df = pd.DataFrame({
+        'Symbol': list(weights),
+        'Weight %': [w * 100 for w in weights.values()]
+    })
+    st.dataframe(weights_df[weights_df['Weight %'] > 0.01].round(2), use_container_width=True)
 
-    transactions = portfolio.get_transaction_history()
-    if not transactions:
-        st.info("No transactions yet")
+    if st.button("Use as Target Allocation"):
+        # Rounded down, so the rounded weights never sum past the optimizer's 100%
+        success, message = portfolio.set_target_weights(
+            {s: float(np.floor(w * 1e4)) / 1e4 for s, w in weights.items() if w > 1e-4}
+        )
+        if success:
+            st.success(message)
+        else:
+            st.error(message)
+
+def _render_holdings_as_of(portfolio: Portfolio):
+    st.markdown("### Holdings As Of")
+    created = portfolio._get_account_age().date()
+    as_of_date = st.date_input(
+        "Date", datetime.now().date(), min_value=created, max_value=datetime.now().date(), key="holdings_as_of"
+    )
+    holdings = portfolio.get_holdings_as_of(datetime.combine(as_of_date, datetime.max.time()))
+
+    col1, col2 = st.columns(2)
+    col1.metric("Value", f"${holdings['value']:,.2f}")
+    col2.metric("Cash", f"${holdings['cash']:,.2f}")
+    if holdings['positions']:
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    'Symbol': symbol,
+                    'Quantity': quantity,
+                    'Close': holdings['prices'].get(symbol),
+                    'Value': quantity * holdings['prices'].get(symbol, 0.0)
+                }
+                for symbol, quantity in sorted(holdings['positions'].items())
+            ]),
+            use_container_width=True
+        )
+    else:
+        st.info("No positions held on this date")
+
+def _render_correlation_heatmap(portfolio: Portfolio):
+    symbols = sorted(portfolio.get_positions())
+    if len(symbols) < 2:
         return
 
-    df = pd.DataFrame(transactions)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    df['profit_loss'] = df.apply(
-        lambda x: (x['price'] - x['entry_price']) * x['quantity'] 
-        if x['type'] == 'sell' else 0,
-        axis=1
+    st.markdown("### Correlation")
+    service = get_history_store().get_covariance_service(symbols)
+    if not service.covers(symbols):
+        st.info("Not enough price history to compute correlations")
+        return
+    corr = service.correlation(symbols)
+
+    fig_corr = go.Figure(data=go.Heatmap(
+        z=corr.to_numpy(),
+        x=symbols,
+        y=symbols,
+        zmin=-1,
+        zmax=1,
+        colorscale='RdYlGn'
+    ))
+    fig_corr.update_layout(
+        title="Return Correlation (EWMA)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white")
     )
+    st.plotly_chart(fig_corr, use_container_width=True)
+
+def _render_value_at_risk(portfolio: Portfolio):
+    st.markdown("### Value at Risk")
+    if not portfolio.get_positions():
+        st.info("Add positions to estimate Value at Risk")
+        return
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        method = st.selectbox("Method", ["historical", "parametric"], format_func=str.title)
+    with col2:
+        horizon = st.selectbox("Horizon (days)", [1, 5, 10, 21], index=2)
+    with col3:
+        confidence = st.selectbox("Confidence", [0.95, 0.99], format_func=lambda c: f"{c:.0%}")
+    with col4:
+        n_paths = st.selectbox("Paths", [100_000, 250_000, 500_000], format_func=lambda n: f"{n:,}")
+
+    var_engine = MonteCarloVaR(n_paths=n_paths, horizon=horizon, confidence=confidence, method=method)
+
+    # Only cached results are shown on rerender; simulation runs on demand
+    result = portfolio.get_value_at_risk(var_engine, run=False)
+    if result is None and st.button("Run Simulation"):
+        progress = st.progress(0.0, text="Simulating paths...")
+        result = portfolio.get_value_at_risk(
+            var_engine,
+            progress_callback=lambda done: progress.progress(done, text=f"Simulating paths... {done:.0%}")
+        )
+        progress.empty()
+        if result is None:
+            st.warning("Not enough price history to simulate these positions")
+
+    if result is None:
+        return
+    if result['excluded']:
+        st.warning(f"Left out for lack of price history: {', '.join(result['excluded'])}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric(f"VaR ({confidence:.0%}, {horizon}d)", f"${result['var']:,.2f}")
+    with col2:
+        st.metric(f"CVaR ({confidence:.0%}, {horizon}d)", f"${result['cvar']:,.2f}")
+
+    fig_var = go.Figure(go.Scatter(
+        x=list(range(1, 100)),
+        y=result['pnl_percentiles'],
+        mode='lines',
+        line=dict(color='#FFD700')
+    ))
+    fig_var.update_layout(
+        title="Simulated P&L by Percentile",
+        xaxis_title="Percentile",
+        yaxis_title="P&L ($)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        font=dict(color="white")
+    )
+    st.plotly_chart(fig_var, use_container_width=True)
+
+def _render_rebalancing(portfolio: Portfolio):
+    st.markdown("### Target Allocation")
+    current_targets = portfolio.get_target_weights()
+    symbols = sorted(set(portfolio.get_positions()) | set(current_targets))
+    targets_df = pd.DataFrame({
+        'Symbol': symbols,
+        'Target %': [current_targets.get(s, 0.0) * 100 for s in symbols]
+    })
+
+    with st.form("target_allocation_form"):
+        edited = st.data_editor(
+            targets_df,
+            num_rows="dynamic",
+            use_container_width=True,
+            key="target_allocation_editor"
+        )
+        tolerance = st.slider("Rebalance Tolerance (%)", 0.0, 10.0, 2.0, 0.5)
+        if st.form_submit_button("Save Targets"):
+            edited = edited.dropna()
+            success, message = portfolio.set_target_weights(
+                dict(zip(edited['Symbol'].astype(str), edited['Target %'].astype(float) / 100))
+            )
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
+
+    if not portfolio.get_target_weights():
+        st.info("Set target weights to get rebalancing suggestions")
+        return
+
+    orders = portfolio.get_rebalance_orders(tolerance / 100)
+    if not orders:
+        st.success("Portfolio is within tolerance of its targets")
+        return
 
-    # Transaction Table
     st.dataframe(
-        df[['timestamp', 'symbol', 'type', 'quantity', 'price', 'profit_loss']],
+        pd.DataFrame(orders).assign(side=lambda df: df['is_buy'].map({True: 'Buy', False: 'Sell'}))[
+            ['symbol', 'side', 'quantity', 'price', 'value']
+        ],
         use_container_width=True
     )
+    if st.button("Execute Rebalance"):
+        filled = portfolio.apply_orders(orders)
+        st.success(f"Executed {filled} of {len(orders)} rebalance orders")
 
-    # Profit/Loss Over Time (Line Chart)
-    cumulative_pl = df['profit_loss'].cumsum()
+def _get_portfolio_value_history(portfolio: Portfolio) -> pd.DataFrame:
+    """Generate historical portfolio value data"""
+    return portfolio.get_nav_history().to_frame('value')
+
+def render_transaction_history(portfolio: Portfolio):
+    st.subheader("Transaction History")
+
+    traded = portfolio.summarize_transactions('symbol')
+    if traded.empty:
+        st.info("No transactions yet")
+        return
+
+    symbols = list(traded['symbol'])
+    _render_export(portfolio, symbols)
+    filters = _render_transaction_filters(portfolio, symbols)
+    _render_transaction_page(portfolio, filters)
 
+    # Profit/Loss Over Time (Line Chart)
+    pnl = portfolio.get_pnl()
+    daily = pnl['daily']
     fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=df['timestamp'],
-        y=cumulative_pl,
-        mode='lines+markers',
-        name='Cumulative P/L',
-        line=dict(color='#FFD700' if cumulative_pl.iloc[-1] > 0 else '#FF4B4B')
-    ))
+    if not daily.empty:
+        for column, name, color in [
+            ('total', 'Total P/L', '#FFD700'),
+            ('realized', 'Realized', '#4CAF50'),
+            ('unrealized', 'Unrealized', '#64B5F6')
+        ]:
+            fig.add_trace(go.Scatter(x=daily.index, y=daily[column], mode='lines', name=name, line=dict(color=color)))
+    else:
+        trades = pnl['trades']
+        fig.add_trace(go.Scatter(
+            x=pd.to_datetime(trades['timestamp']),
+            y=trades['cumulative_pl'],
+            mode='lines+markers',
+            name='Cumulative P/L',
+            line=dict(color='#FFD700' if trades['cumulative_pl'].iloc[-1] > 0 else '#FF4B4B')
+        ))
 
     fig.update_layout(
         title="Cumulative Profit/Loss Over Time",
@@ -165,17 +410,20 @@ def render_transaction_history(portfolio: Portfolio):
         yaxis_title="Profit/Loss ($)",
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgba(0,0,0,0)",
-        font=dict(color="white")
+        font=dict(color="white"),
+        hovermode='x unified'
     )
     st.plotly_chart(fig, use_container_width=True)
 
     # Trading Activity by Symbol (Bar Chart)
-    trades_by_symbol = df.groupby('symbol').size()
+    by_symbol = portfolio.summarize_transactions('symbol', **filters)
+    if by_symbol.empty:
+        return
 
     fig_activity = go.Figure(data=[
         go.Bar(
-            x=trades_by_symbol.index,
-            y=trades_by_symbol.values,
+            x=by_symbol['symbol'],
+            y=by_symbol['trades'],
             marker_color='#FFD700'
         )
     ])
@@ -188,4 +436,100 @@ def render_transaction_history(portfolio: Portfolio):
         plot_bgcolor="rgba(0,0,0,0)",
         font=dict(color="white")
     )
-    st.plotly_chart(fig_activity, use_container_width=True)
\ No newline at end of file
+    st.plotly_chart(fig_activity, use_container_width=True)
+
+    with st.expander("Monthly Summary"):
+        st.dataframe(portfolio.summarize_transactions('month', **filters), use_container_width=True)
+
+def _render_transaction_filters(portfolio: Portfolio, symbols: list) -> dict:
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        selected = st.multiselect("Symbols", symbols, key="tx_symbols")
+    with col2:
+        side = st.selectbox("Side", ["All", "Buy", "Sell"], key="tx_side")
+    with col3:
+        start = st.date_input("From", portfolio._get_account_age().date(), key="tx_start")
+    with col4:
+        end = st.date_input("To", datetime.now().date(), key="tx_end")
+    return {
+        'symbols': selected or None,
+        'side': None if side == "All" else side.lower(),
+        'start': start.isoformat(),
+        'end': datetime.combine(end, datetime.max.time()).isoformat()
+    }
+
+def _render_transaction_page(portfolio: Portfolio, filters: dict):
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        sort = st.selectbox("Sort By", ['timestamp', 'symbol', 'quantity', 'price'], key="tx_sort")
+    with col2:
+        descending = st.checkbox("Descending", True, key="tx_descending")
+    with col3:
+        page_size = st.selectbox("Rows", [25, 50, 100], key="tx_page_size")
+
+    # Cursors of the pages visited so far; any change to the query starts over
+    query = (tuple(filters['symbols'] or ()), filters['side'], filters['start'], filters['end'], sort, descending, page_size)
+    if st.session_state.get('tx_query') != query:
+        st.session_state.tx_query = query
+        st.session_state.tx_cursors = [None]
+    cursors = st.session_state.tx_cursors
+
+    rows, next_cursor = portfolio.query_transactions(
+        sort=sort, descending=descending, cursor=cursors[-1], limit=page_size, **filters
+    )
+    if not rows:
+        st.info("No transactions match these filters")
+        return
+
+    page = pd.DataFrame(rows)
+    page['profit_loss'] = np.where(
+        page['type'] == 'sell', (page['price'] - page['entry_price']) * page['quantity'], 0.0
+    )
+    st.dataframe(
+        page[['timestamp', 'symbol', 'type', 'quantity', 'price', 'profit_loss']],
+        use_container_width=True
+    )
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("Previous", disabled=len(cursors) == 1, key="tx_previous"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Page {len(cursors)}")
+    with col3:
+        if st.button("Next", disabled=next_cursor is None, key="tx_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+
+def _render_export(portfolio: Portfolio, symbols: list):
+    with st.expander("Export Transactions"):
+        with st.form("export_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                start = st.date_input("From", portfolio._get_account_age().date())
+                fmt = st.selectbox("Format", EXPORT_FORMATS, format_func=str.upper)
+            with col2:
+                end = st.date_input("To", datetime.now().date())
+                selected = st.multiselect("Symbols (all if empty)", symbols)
+            submitted = st.form_submit_button("Prepare Export")
+
+        if submitted:
+            path = portfolio.export_transactions(fmt, start, end, selected or None)
+            try:
+                size = os.path.getsize(path)
+                if size > MAX_DOWNLOAD_BYTES:
+                    st.error(
+                        f"This export is {size / 2**20:,.0f} MB, over the {MAX_DOWNLOAD_BYTES / 2**20:.0f} MB "
+                        "download limit. Narrow the dates or symbols and export again."
+                    )
+                    return
+                with open(path, 'rb') as f:
+                    st.download_button(
+                        f"Download {fmt.upper()}",
+                        data=f,
+                        file_name=f"transactions_{start}_{end}.{fmt}",
+                        mime='text/csv' if fmt == 'csv' else 'application/octet-stream'
+                    )
+            finally:
+                os.remove(path)
@@ -9,7 +9,7 @@ def render_profile_settings(auth: AuthManager):
     if not user:
         return
         
-    user_data = st.session_state.users[user]
+    user_data = auth.get_user(user) or {}
     
     with st.container():
         st.markdown("### Personal Information")
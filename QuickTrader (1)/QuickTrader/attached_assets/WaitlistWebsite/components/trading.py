@@ -3,6 +3,8 @@ import plotly.graph_objects as go
 from utils.market_data import MarketData
 from utils.portfolio import Portfolio
 from utils.sentiment import SentimentAnalyzer
+from utils.history_store import get_history_store
+from utils.backtest import Backtester, sma_crossover_targets, apply_trailing_stop
 import pandas as pd
 
 def render_trading_interface(portfolio: Portfolio):
@@ -83,6 +85,8 @@ def render_trading_interface(portfolio: Portfolio):
 
             st.plotly_chart(fig, use_container_width=True)
 
+            _render_backtest(symbol)
+
             # Trading Stats
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -136,7 +140,7 @@ def render_trading_interface(portfolio: Portfolio):
                 st.write(f"Estimated Cost: ${total_cost:,.2f}")
 
                 if st.form_submit_button("Place Order", use_container_width=True):
-                    success = portfolio.execute_trade(
+                    success, message = portfolio.execute_trade(
                         symbol, 
                         quantity, 
                         trade_type == "Buy",
@@ -146,9 +150,9 @@ def render_trading_interface(portfolio: Portfolio):
                         validity=validity
                     )
                     if success:
-                        st.success(f"Successfully placed {order_type} order for {quantity} shares of {symbol}")
+                        st.success(message)
                     else:
-                        st.error(f"Failed to place order. Please check your balance/positions.")
+                        st.error(message)
 
             # Holdings for this stock
             if symbol in portfolio.get_positions():
@@ -166,4 +170,55 @@ def render_trading_interface(portfolio: Portfolio):
                 with col3:
                     st.metric("Current Value", f"${position_value:,.2f}")
                 with col4:
-                    st.metric("P&L", f"${profit_loss:,.2f}", f"{(profit_loss/position_value)*100:.2f}%")
\ No newline at end of file
+                    st.metric("P&L", f"${profit_loss:,.2f}", f"{(profit_loss/position_value)*100:.2f}%")
+
+def _render_backtest(symbol: str):
+    with st.expander("Backtest MA Crossover"):
+        with st.form("backtest_form"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                fast = st.number_input("Fast MA", min_value=2, value=20)
+            with col2:
+                slow = st.number_input("Slow MA", min_value=3, value=50)
+            with col3:
+                stop = st.number_input("Trailing Stop (%)", min_value=0.0, max_value=50.0, value=0.0, step=1.0)
+            run = st.form_submit_button("Run Backtest")
+
+        if not run:
+            return
+        if fast >= slow:
+            st.error("Fast MA must be shorter than slow MA")
+            return
+
+        closes = get_history_store().get_close_matrix([symbol]).dropna()
+        if len(closes) <= slow:
+            st.error(f"Not enough history for {symbol}")
+            return
+
+        targets = sma_crossover_targets(closes, int(fast), int(slow))
+        if stop > 0:
+            targets = apply_trailing_stop(closes, targets, stop / 100)
+        result = Backtester().run(closes, targets)
+        buy_and_hold = closes[symbol] / closes[symbol].iloc[0] * result['nav'].iloc[0]
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Return", f"{result['total_return']:.2f}%")
+        with col2:
+            st.metric("Sharpe Ratio", f"{result.get('sharpe_ratio', 0):.2f}")
+        with col3:
+            st.metric("Max Drawdown", f"{result.get('max_drawdown', 0) * 100:.2f}%")
+        with col4:
+            st.metric("Trades", result['trade_count'])
+
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(x=result['nav'].index, y=result['nav'], name="Strategy", line=dict(color='#FFD700')))
+        fig.add_trace(go.Scatter(x=buy_and_hold.index, y=buy_and_hold, name="Buy & Hold", line=dict(color='blue')))
+        fig.update_layout(
+            title=f"{symbol} {int(fast)}/{int(slow)} MA Crossover",
+            yaxis_title="Value ($)",
+            paper_bgcolor="rgba(0,0,0,0)",
+            plot_bgcolor="rgba(0,0,0,0)",
+            font=dict(color="white")
+        )
+        st.plotly_chart(fig, use_container_width=True)
@@ -40,13 +40,9 @@ def show_help_tooltip(text: str):
     """, unsafe_allow_html=True)
 
 def main():
-    # Check session validity
-    if auth.get_current_user() and not auth.check_session_valid():
-        st.warning("Your session has expired. Please log in again.")
-        auth.logout()
-        st.rerun()
-
     if auth.get_current_user() is None:
+        if auth.session_expired:
+            st.warning("Your session has expired. Please log in again.")
         st.markdown(
             """
             <div style='text-align: center; padding: 2rem;'>
@@ -106,6 +102,12 @@ def main():
 
         with tab2:
             show_help_tooltip("Create a new account to start trading")
+            if st.session_state.get('verification_username'):
+                delivery = auth.get_verification_delivery(st.session_state.verification_username)
+                st.info(
+                    f"Verification email: {delivery.get('email_verification', 'pending')} · "
+                    f"Verification SMS: {delivery.get('sms_otp', 'pending')}"
+                )
             with st.form("register_form"):
                 st.markdown("### Join Velasa Trading")
                 st.markdown("""
@@ -135,6 +137,7 @@ def main():
                             st.success(message)
                             st.session_state.verification_email = email
                             st.session_state.verification_phone = phone
+                            st.session_state.verification_username = new_username
                             st.rerun()
                         else:
                             st.error(message)
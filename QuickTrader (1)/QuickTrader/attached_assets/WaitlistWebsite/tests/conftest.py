@@ -0,0 +1,25 @@
+import time
+import pytest
+from utils.store import Store
+
+@pytest.fixture
+def store(tmp_path):
+    return Store(str(tmp_path / 'test.db'))
+
+class Clock:
+    """Stands in for ``time.time`` so expiry can be tested without waiting"""
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(time.time())
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
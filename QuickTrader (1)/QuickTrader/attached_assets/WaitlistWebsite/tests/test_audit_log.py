@@ -0,0 +1,134 @@
+import threading
+from datetime import datetime
+import pytest
+from utils.audit_log import AuditLog, FRAME, backfill_pending, list_segments, read_segment
+
+def _fill(symbol='AAPL', quantity=1, price=10.0):
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'symbol': symbol,
+        'type': 'buy',
+        'quantity': quantity,
+        'price': price,
+        'entry_price': price
+    }
+
+def _read_all(directory):
+    return [record for path in list_segments(directory) for record in read_segment(path)]
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / 'audit')
+
+@pytest.fixture
+def log(directory):
+    log = AuditLog(directory)
+    yield log
+    log.close()
+
+def test_records_round_trip(log, directory):
+    fills = [_fill('AAPL', 3, 101.25), _fill('MSFT', 7, 402.5)]
+    for fill in fills:
+        log.record('alice', fill)
+    records = _read_all(directory)
+    assert [r['seq'] for r in records] == [1, 2]
+    for record, fill in zip(records, fills):
+        assert record['username'] == 'alice'
+        assert {k: record[k] for k in fill} == fill
+
+def test_concurrent_records_are_all_durable(log, directory):
+    def record(i):
+        for j in range(25):
+            log.record(f'user{i}', _fill(quantity=j + 1))
+
+    threads = [threading.Thread(target=record, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(r['seq'] for r in _read_all(directory)) == list(range(1, 201))
+
+def test_segments_roll_over(directory):
+    log = AuditLog(directory, segment_bytes=200)
+    for i in range(20):
+        log.record('alice', _fill(quantity=i + 1))
+    log.close()
+    assert len(list_segments(directory)) > 1
+    assert [r['quantity'] for r in _read_all(directory)] == list(range(1, 21))
+
+def _write_three(directory):
+    log = AuditLog(directory)
+    for i in range(3):
+        log.record('alice', _fill(quantity=i + 1))
+    log.close()
+    path, = list_segments(directory)
+    with open(path, 'rb') as f:
+        data = f.read()
+    return path, data
+
+def test_torn_tail_is_dropped(directory):
+    path, data = _write_three(directory)
+    with open(path, 'wb') as f:
+        f.write(data[:-5])
+    assert [r['quantity'] for r in read_segment(path)] == [1, 2]
+
+def test_torn_frame_header_is_dropped(directory):
+    path, data = _write_three(directory)
+    record_size = len(data) // 3
+    with open(path, 'wb') as f:
+        f.write(data[:2 * record_size + FRAME.size - 1])
+    assert [r['quantity'] for r in read_segment(path)] == [1, 2]
+
+def test_reading_stops_at_a_bad_checksum(directory):
+    path, data = _write_three(directory)
+    record_size = len(data) // 3
+    corrupt = bytearray(data)
+    corrupt[record_size + FRAME.size + 3] ^= 0xFF
+    with open(path, 'wb') as f:
+        f.write(bytes(corrupt))
+    assert [r['quantity'] for r in read_segment(path)] == [1]
+
+def test_a_reopened_log_keeps_earlier_segments_readable(directory):
+    path, data = _write_three(directory)
+    with open(path, 'wb') as f:
+        f.write(data[:-5])
+    log = AuditLog(directory)
+    log.record('alice', _fill(quantity=4))
+    log.close()
+    assert [r['quantity'] for r in _read_all(directory)] == [1, 2, 4]
+
+def _commit_fill(store, username, version, fill):
+    store.append_events(
+        username, version,
+        [('fill', {'symbol': fill['symbol'], 'side': 'buy', 'quantity': fill['quantity'], 'price': fill['price']})],
+        fill
+    )
+
+def test_backfill_records_unconfirmed_fills(store, log, directory):
+    store.create_account('alice', {'email': 'alice@example.com'}, 10000.0)
+    _commit_fill(store, 'alice', 2, _fill('AAPL', 1))
+    _commit_fill(store, 'alice', 3, _fill('MSFT', 2))
+    store.clear_audit_pending('alice', 3)
+
+    assert backfill_pending(log, store, before=float('inf')) == 1
+    assert [(r['symbol'], r['quantity']) for r in _read_all(directory)] == [('MSFT', 2)]
+    assert backfill_pending(log, store, before=float('inf')) == 0
+
+def test_backfill_waits_for_the_grace_period(store, log):
+    store.create_account('alice', {'email': 'alice@example.com'}, 10000.0)
+    _commit_fill(store, 'alice', 2, _fill())
+    assert backfill_pending(log, store, before=0.0) == 0
+    assert backfill_pending(log, store, before=float('inf')) == 1
+
+def test_failed_backfill_puts_fills_back(store, directory):
+    store.create_account('alice', {'email': 'alice@example.com'}, 10000.0)
+    _commit_fill(store, 'alice', 2, _fill())
+    closed = AuditLog(directory)
+    closed.close()
+    with pytest.raises(RuntimeError):
+        backfill_pending(closed, store, before=float('inf'))
+
+    log = AuditLog(directory)
+    assert backfill_pending(log, store, before=float('inf')) == 1
+    log.close()
+    assert len(_read_all(directory)) == 1
@@ -0,0 +1,82 @@
+import time
+from datetime import datetime
+import pytest
+from utils.event_log import PortfolioEventLog, ConcurrentModificationError, SNAPSHOT_INTERVAL, apply_event, empty_state
+
+def _fill(symbol, side, quantity, price):
+    return ('fill', {'symbol': symbol, 'side': side, 'quantity': quantity, 'price': price})
+
+def _replay_all(store, username):
+    state = empty_state()
+    for event in store.get_events(username):
+        apply_event(state, event['event_type'], event['payload'])
+    return state
+
+@pytest.fixture
+def log(store):
+    store.create_account('alice', {'email': 'alice@example.com'}, 100000.0)
+    return PortfolioEventLog(store)
+
+def test_new_account_replays_to_its_deposit(log):
+    state = log.load('alice')
+    assert state['cash'] == 100000.0
+    assert state['positions'] == {}
+    assert state['version'] == 2
+    assert log.load('nobody') is None
+
+def test_snapshots_are_written_at_interval_boundaries(store, log):
+    state = log.load('alice')
+    while state['version'] < 2 * SNAPSHOT_INTERVAL + 5:
+        state = log.append('alice', state, [_fill('AAPL', 'buy', 1, 10.0)])
+    snapshot = store.get_latest_snapshot('alice')
+    assert snapshot['seq'] == 2 * SNAPSHOT_INTERVAL
+    assert snapshot['state']['version'] == snapshot['seq']
+
+def test_snapshot_replay_matches_full_replay(store, log):
+    state = log.load('alice')
+    for i in range(2 * SNAPSHOT_INTERVAL + 17):
+        side = 'sell' if i % 3 == 2 else 'buy'
+        state = log.append('alice', state, [_fill('AAPL' if i % 2 else 'MSFT', side, 1, 10.0 + i)])
+    loaded = log.load('alice')
+    assert loaded == state
+    assert loaded == _replay_all(store, 'alice')
+
+def test_a_batch_crossing_a_boundary_is_snapshotted(store, log):
+    state = log.load('alice')
+    while state['version'] < SNAPSHOT_INTERVAL - 1:
+        state = log.append('alice', state, [('fee', {'amount': 1.0})])
+    state = log.append('alice', state, [('fee', {'amount': 1.0})] * 3)
+    assert store.get_latest_snapshot('alice')['seq'] == SNAPSHOT_INTERVAL + 2
+    assert log.load('alice') == state
+
+def test_catch_up_replays_only_newer_events(log):
+    stale = log.load('alice')
+    current = log.append('alice', stale, [_fill('AAPL', 'buy', 5, 100.0)])
+    current = log.append('alice', current, [('fee', {'amount': 2.5})])
+    caught_up = log.catch_up('alice', stale)
+    assert caught_up == current
+    assert stale['version'] == 2
+
+def test_conflicting_append_is_rejected_and_writes_nothing(store, log):
+    state = log.load('alice')
+    first = log.append('alice', state, [_fill('AAPL', 'buy', 1, 10.0)])
+    with pytest.raises(ConcurrentModificationError):
+        log.append('alice', state, [_fill('MSFT', 'buy', 1, 10.0)], transaction={
+            'timestamp': datetime.now().isoformat(), 'symbol': 'MSFT', 'type': 'buy',
+            'quantity': 1, 'price': 10.0, 'entry_price': 10.0
+        })
+    assert log.load('alice') == first
+    # Neither the ledger row nor its pending audit entry survives the rollback
+    assert store.claim_audit_pending(float('inf')) == []
+
+def test_state_as_of_uses_the_nearest_earlier_snapshot(log):
+    state = log.load('alice')
+    while state['version'] < SNAPSHOT_INTERVAL + 10:
+        state = log.append('alice', state, [_fill('AAPL', 'buy', 1, 10.0)])
+    midway = datetime.now()
+    expected = log.load('alice')
+    time.sleep(0.001)
+    while state['version'] < 2 * SNAPSHOT_INTERVAL + 10:
+        state = log.append('alice', state, [_fill('AAPL', 'sell', 1, 12.0)])
+    assert log.state_as_of('alice', midway) == expected
+    assert log.state_as_of('alice', datetime.now()) == state
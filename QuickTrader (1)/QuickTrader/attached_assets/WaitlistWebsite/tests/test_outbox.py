@@ -0,0 +1,108 @@
+import threading
+import time
+import pytest
+
+LEASE = 60.0
+
+def _message(key, recipient='alice@example.com'):
+    return {
+        'idempotency_key': key,
+        'username': None,
+        'kind': 'email',
+        'recipient': recipient,
+        'payload': {'token': key},
+        'next_attempt_at': 0.0,
+        'created_at': 0.0
+    }
+
+def test_enqueue_is_idempotent(store):
+    assert store.enqueue_messages([_message('a'), _message('b')]) == 2
+    assert store.enqueue_messages([_message('a')]) == 0
+
+def test_claimed_messages_are_leased_to_one_worker(store):
+    store.enqueue_messages([_message('a'), _message('b')])
+    claimed = store.claim_messages(now=100.0, limit=10, lease=LEASE)
+    assert {m['idempotency_key'] for m in claimed} == {'a', 'b'}
+    assert all(m['status'] == 'sending' and m['attempts'] == 1 for m in claimed)
+    assert store.claim_messages(now=100.0 + LEASE - 1, limit=10, lease=LEASE) == []
+
+def test_expired_lease_is_reclaimed(store):
+    # The first worker died mid-delivery and never finished or retried the message
+    store.enqueue_messages([_message('a')])
+    first, = store.claim_messages(now=100.0, limit=10, lease=LEASE)
+    second, = store.claim_messages(now=100.0 + LEASE, limit=10, lease=LEASE)
+    assert second['id'] == first['id']
+    assert second['attempts'] == 2
+    assert second['payload'] == {'token': 'a'}
+
+def test_finished_messages_are_not_reclaimed(store):
+    store.enqueue_messages([_message('a')])
+    message, = store.claim_messages(now=100.0, limit=10, lease=LEASE)
+    store.finish_message(message['id'], 'sent', now=101.0)
+    assert store.claim_messages(now=100.0 + 10 * LEASE, limit=10, lease=LEASE) == []
+
+def test_retried_messages_wait_for_their_backoff(store):
+    store.enqueue_messages([_message('a')])
+    message, = store.claim_messages(now=100.0, limit=10, lease=LEASE)
+    store.retry_message(message['id'], 110.0, 'timeout')
+    assert store.claim_messages(now=109.0, limit=10, lease=LEASE) == []
+    retried, = store.claim_messages(now=110.0, limit=10, lease=LEASE)
+    assert retried['attempts'] == 2
+
+def test_concurrent_claims_never_share_a_message(store):
+    store.enqueue_messages([_message(str(i)) for i in range(100)])
+    claimed = []
+    lock = threading.Lock()
+
+    def claim():
+        while batch := store.claim_messages(now=100.0, limit=3, lease=LEASE):
+            with lock:
+                claimed.extend(m['id'] for m in batch)
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(set(claimed))
+    assert len(claimed) == 100
+
+@pytest.fixture
+def outbox_module():
+    pytest.importorskip('twilio')
+    from utils import outbox
+    return outbox
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("Timed out waiting for the outbox")
+        time.sleep(0.01)
+
+def test_failed_deliveries_are_retried(store, outbox_module, monkeypatch):
+    monkeypatch.setattr(outbox_module, 'BASE_DELAY', 0.01)
+    transport = outbox_module.StubTransport(fail_first=2)
+    outbox = outbox_module.Outbox(transport, store=store, workers=2, poll_interval=0.05)
+    try:
+        outbox.enqueue([{
+            'idempotency_key': 'a', 'username': 'alice', 'kind': 'email',
+            'recipient': 'alice@example.com', 'payload': {}
+        }])
+        _wait_for(lambda: transport.sent)
+    finally:
+        outbox.close()
+    assert len(transport.sent) == 1
+    status, = store.get_message_status('alice')
+    assert (status['status'], status['attempts']) == ('sent', 3)
+
+def test_a_crashed_workers_message_is_delivered_after_its_lease(store, outbox_module):
+    store.enqueue_messages([{**_message('a'), 'next_attempt_at': time.time()}])
+    store.claim_messages(now=time.time(), limit=10, lease=0.2)
+    transport = outbox_module.StubTransport()
+    outbox = outbox_module.Outbox(transport, store=store, workers=1, poll_interval=0.05)
+    try:
+        _wait_for(lambda: transport.sent)
+    finally:
+        outbox.close()
+    assert transport.sent == [('email', 'alice@example.com', {'token': 'a'})]
@@ -0,0 +1,109 @@
+import threading
+import pytest
+
+pytest.importorskip('streamlit')
+pytest.importorskip('yfinance')
+
+from utils import audit_log as audit_log_module
+from utils import portfolio as portfolio_module
+from utils import store as store_module
+from utils.audit_log import AuditLog, list_segments, read_segment
+from utils.event_log import ConcurrentModificationError
+from utils.portfolio import Portfolio
+
+@pytest.fixture
+def audit_dir(tmp_path):
+    return str(tmp_path / 'audit')
+
+@pytest.fixture(autouse=True)
+def backend(store, audit_dir, monkeypatch):
+    log = AuditLog(audit_dir)
+    monkeypatch.setattr(store_module, '_store', store)
+    monkeypatch.setattr(audit_log_module, '_audit_log', log)
+    store.create_account('alice', {'email': 'alice@example.com'}, 1000.0)
+    yield
+    log.close()
+
+def _audited(audit_dir):
+    return [record for path in list_segments(audit_dir) for record in read_segment(path)]
+
+def _buy(portfolio, quantity, price=10.0, symbol='AAPL'):
+    return portfolio._execute_market_order(symbol, quantity, True, price)
+
+def test_stale_session_retries_against_the_committed_state():
+    first, second = Portfolio('alice'), Portfolio('alice')
+    assert _buy(first, 10)
+    assert _buy(second, 5)
+    assert second.conflicts == 1
+    assert second.portfolio['positions'] == {'AAPL': 15}
+    assert Portfolio('alice').portfolio == second.portfolio
+
+def test_retry_revalidates_so_cash_cannot_be_spent_twice():
+    first, second = Portfolio('alice'), Portfolio('alice')
+    assert _buy(first, 80)
+    assert not _buy(second, 80)
+    assert second.portfolio['cash'] == pytest.approx(200.0)
+    assert Portfolio('alice').portfolio['positions'] == {'AAPL': 80}
+
+def test_concurrent_sessions_never_lose_or_overdraw(audit_dir):
+    filled = []
+    lock = threading.Lock()
+
+    def trade():
+        portfolio = Portfolio('alice')
+        for _ in range(20):
+            try:
+                if _buy(portfolio, 1, price=20.0):
+                    with lock:
+                        filled.append(1)
+            except ConcurrentModificationError:
+                # Surfaced to the user as "busy"; nothing was written
+                pass
+
+    threads = [threading.Thread(target=trade) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    state = Portfolio('alice').portfolio
+    # Cash covers at most 50 of the 160 attempted buys
+    assert 0 < len(filled) <= 50
+    assert state['positions'] == {'AAPL': len(filled)}
+    assert state['cash'] == pytest.approx(1000.0 - 20.0 * len(filled))
+    assert state['version'] == 2 + len(filled)
+    assert len(_audited(audit_dir)) == len(filled)
+
+def test_gives_up_after_repeated_conflicts(monkeypatch):
+    portfolio = Portfolio('alice')
+    attempts = []
+
+    def conflict(*args, **kwargs):
+        attempts.append(1)
+        raise ConcurrentModificationError('alice')
+
+    monkeypatch.setattr(portfolio.event_log, 'append', conflict)
+    with pytest.raises(ConcurrentModificationError):
+        _buy(portfolio, 1)
+    assert len(attempts) == portfolio_module.MAX_WRITE_ATTEMPTS
+
+def test_audited_fills_are_not_left_pending(store, audit_dir):
+    assert _buy(Portfolio('alice'), 1)
+    assert store.claim_audit_pending(float('inf')) == []
+    assert len(_audited(audit_dir)) == 1
+
+def test_audit_failure_keeps_the_fill_and_leaves_it_for_backfill(store, audit_dir, monkeypatch):
+    log = audit_log_module._audit_log
+
+    def fail(*args, **kwargs):
+        raise TimeoutError("Audit log commit timed out")
+
+    monkeypatch.setattr(log, 'record', fail)
+    portfolio = Portfolio('alice')
+    assert _buy(portfolio, 1)
+    assert portfolio.portfolio['positions'] == {'AAPL': 1}
+    assert _audited(audit_dir) == []
+
+    monkeypatch.undo()
+    assert audit_log_module.backfill_pending(log, store, before=float('inf')) == 1
+    assert [r['symbol'] for r in _audited(audit_dir)] == ['AAPL']
@@ -0,0 +1,70 @@
+import threading
+import pytest
+from utils.rate_limiter import RateLimiter
+
+def test_allows_a_burst_up_to_the_limit(store, clock):
+    limiter = RateLimiter('login', limit=5, period=60, sweep_probability=0, store=store)
+    assert [limiter.hit('alice') for _ in range(5)] == [None] * 5
+    assert limiter.hit('alice') == pytest.approx(12)
+
+def test_refills_one_slot_per_interval(store, clock):
+    limiter = RateLimiter('login', limit=5, period=60, sweep_probability=0, store=store)
+    for _ in range(5):
+        limiter.hit('alice')
+    clock.advance(6)
+    assert limiter.hit('alice') == pytest.approx(6)
+    clock.advance(6)
+    assert limiter.hit('alice') is None
+    assert limiter.hit('alice') == pytest.approx(12)
+
+def test_denied_hits_do_not_push_the_window_back(store, clock):
+    limiter = RateLimiter('login', limit=2, period=10, sweep_probability=0, store=store)
+    limiter.hit('alice')
+    limiter.hit('alice')
+    for _ in range(10):
+        assert limiter.hit('alice') is not None
+    clock.advance(5)
+    assert limiter.hit('alice') is None
+
+def test_keys_and_names_are_independent(store, clock):
+    login = RateLimiter('login', limit=1, period=60, sweep_probability=0, store=store)
+    signup = RateLimiter('signup', limit=1, period=60, sweep_probability=0, store=store)
+    assert login.hit('alice') is None
+    assert login.hit('alice') is not None
+    assert login.hit('bob') is None
+    assert signup.hit('alice') is None
+
+def test_limiters_over_one_store_share_the_budget(store, clock):
+    # Stands in for two processes enforcing the same limit
+    first = RateLimiter('login', limit=3, period=60, sweep_probability=0, store=store)
+    second = RateLimiter('login', limit=3, period=60, sweep_probability=0, store=store)
+    assert [first.hit('alice'), second.hit('alice'), first.hit('alice')] == [None] * 3
+    assert second.hit('alice') is not None
+
+def test_concurrent_hits_never_exceed_the_limit(store):
+    limiter = RateLimiter('login', limit=10, period=3600, sweep_probability=0, store=store)
+    results = []
+    lock = threading.Lock()
+
+    def hit():
+        for _ in range(10):
+            allowed = limiter.hit('alice') is None
+            with lock:
+                results.append(allowed)
+
+    threads = [threading.Thread(target=hit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results.count(True) == 10
+
+def test_expired_keys_are_swept_and_start_fresh(store, clock):
+    limiter = RateLimiter('login', limit=2, period=10, sweep_probability=0, store=store)
+    limiter.hit('alice')
+    limiter.hit('alice')
+    assert store.expire_rate_limits(clock.now) == 0
+    clock.advance(10)
+    assert store.expire_rate_limits(clock.now) == 1
+    assert limiter.hit('alice') is None
+    assert limiter.hit('alice') is None
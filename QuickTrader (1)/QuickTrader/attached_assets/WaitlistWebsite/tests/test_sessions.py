@@ -0,0 +1,74 @@
+import pytest
+from utils import sessions as sessions_module
+from utils.sessions import SessionStore, IDLE_TIMEOUT, ABSOLUTE_TIMEOUT, REVALIDATE_AFTER
+
+@pytest.fixture(autouse=True)
+def accounts(store):
+    store.create_accounts([
+        ('alice', {'email': 'alice@example.com'}, 0.0),
+        ('bob', {'email': 'bob@example.com'}, 0.0),
+    ])
+
+def test_create_and_validate(store):
+    sessions = SessionStore(store, sweep_probability=0)
+    token = sessions.create('alice')
+    assert sessions.validate(token) == 'alice'
+    assert sessions.validate('not-a-token') is None
+    assert sessions.count_active() == 1
+
+def test_only_the_token_digest_is_stored(store):
+    token = SessionStore(store, sweep_probability=0).create('alice')
+    assert store.get_session(token) is None
+    assert store.get_session(sessions_module._hash_token(token))['username'] == 'alice'
+
+def test_rotation_invalidates_the_old_token(store):
+    # What AuthManager does on every sign-in: revoke the current token, then issue a fresh one
+    sessions = SessionStore(store, sweep_probability=0)
+    old = sessions.create('alice')
+    sessions.revoke(old)
+    new = sessions.create('alice')
+    assert new != old
+    assert sessions.validate(old) is None
+    assert sessions.validate(new) == 'alice'
+
+def test_rotation_is_seen_by_other_processes(store, clock):
+    here = SessionStore(store, sweep_probability=0)
+    elsewhere = SessionStore(store, sweep_probability=0)
+    old = here.create('alice')
+    assert elsewhere.validate(old) == 'alice'
+    here.revoke(old)
+    here.create('alice')
+    clock.advance(REVALIDATE_AFTER + 1)
+    assert elsewhere.validate(old) is None
+
+def test_revoke_user_ends_every_session(store, clock):
+    here = SessionStore(store, sweep_probability=0)
+    elsewhere = SessionStore(store, sweep_probability=0)
+    tokens = [here.create('alice') for _ in range(3)]
+    bob = here.create('bob')
+    for token in tokens:
+        assert elsewhere.validate(token) == 'alice'
+
+    here.revoke_user('alice')
+    assert all(here.validate(token) is None for token in tokens)
+    clock.advance(REVALIDATE_AFTER + 1)
+    assert all(elsewhere.validate(token) is None for token in tokens)
+    assert elsewhere.validate(bob) == 'bob'
+
+def test_idle_sessions_expire(store, clock):
+    sessions = SessionStore(store, sweep_probability=0)
+    token = sessions.create('alice')
+    clock.advance(IDLE_TIMEOUT + 1)
+    assert sessions.validate(token) is None
+    assert sessions.count_active() == 0
+
+def test_activity_slides_expiry_up_to_the_absolute_limit(store, clock):
+    sessions = SessionStore(store, sweep_probability=0)
+    token = sessions.create('alice')
+    elapsed = 0
+    while elapsed + IDLE_TIMEOUT // 2 < ABSOLUTE_TIMEOUT:
+        clock.advance(IDLE_TIMEOUT // 2)
+        elapsed += IDLE_TIMEOUT // 2
+        assert sessions.validate(token) == 'alice'
+    clock.advance(ABSOLUTE_TIMEOUT - elapsed)
+    assert sessions.validate(token) is None
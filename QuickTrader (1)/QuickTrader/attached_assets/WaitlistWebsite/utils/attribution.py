@@ -0,0 +1,121 @@
+import sys
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from .store import get_store
+from .event_log import PortfolioEventLog
+from .history_store import get_history_store
+
+class AttributionEngine:
+    """Split each account's daily P/L into price moves and trading, per position.
+
+    For a day with closes ``p`` and previous closes ``p0``, a position held
+    overnight earns ``h0 * (p - p0)`` from the price move, and each fill earns
+    ``q * (p - fill_price)`` from trading. The two add up to the day's change
+    in value net of cash spent, and both are computed as (accounts x symbols)
+    matrices in a single pass.
+    """
+
+    def __init__(self, store=None):
+        self.store = store or get_store()
+
+    @staticmethod
+    def attribute(
+        prev_holdings: np.ndarray,
+        prev_close: np.ndarray,
+        close: np.ndarray,
+        traded_qty: np.ndarray,
+        traded_cost: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Price-move and trading P/L matrices for one day"""
+        price_pnl = prev_holdings * np.nan_to_num(close - prev_close)
+        trading_pnl = np.where(np.isfinite(close), traded_qty * close - traded_cost, 0.0)
+        return price_pnl, trading_pnl
+
+    def run(self, day: Optional[date] = None) -> int:
+        """Attribute ``day`` (default today) for every account; returns the rows stored"""
+        day = day or date.today()
+        start, end = day.isoformat(), (day + timedelta(days=1)).isoformat()
+
+        event_log = PortfolioEventLog(self.store)
+        usernames = self.store.get_accounts_with_event('opened')
+        positions = {u: state['positions'] for u in usernames if (state := event_log.load(u))}
+        # Fills since the start of the day, so holdings can be rolled back to last night
+        trades = pd.DataFrame(
+            self.store.get_transactions_since(start),
+            columns=['username', 'timestamp', 'symbol', 'type', 'quantity', 'price']
+        )
+        trades = trades[trades['username'].isin(positions.keys())]
+
+        symbols = sorted({s for held in positions.values() for s in held} | set(trades['symbol']))
+        if not symbols:
+            return 0
+        closes = get_history_store().get_close_matrix(symbols, pd.Timestamp(day) - pd.Timedelta(days=10))
+        closes = closes.loc[:pd.Timestamp(day)]
+        if len(closes) < 2 or closes.index[-1] != pd.Timestamp(day):
+            # Not a trading day, or no prices yet
+            return 0
+        close, prev_close = closes.iloc[-1].to_numpy(), closes.iloc[-2].to_numpy()
+
+        accounts = list(positions)
+        row_of = {u: i for i, u in enumerate(accounts)}
+        column_of = {s: j for j, s in enumerate(symbols)}
+        holdings = np.zeros((len(accounts), len(symbols)))
+        for u, held in positions.items():
+            for symbol, quantity in held.items():
+                holdings[row_of[u], column_of[symbol]] = quantity
+
+        traded_qty = np.zeros_like(holdings)
+        traded_cost = np.zeros_like(holdings)
+        if not trades.empty:
+            rows = trades['username'].map(row_of).to_numpy()
+            cols = trades['symbol'].map(column_of).to_numpy()
+            signed = np.where(trades['type'] == 'buy', 1, -1) * trades['quantity'].to_numpy()
+            # Everything since the start of the day is undone to get last night's holdings
+            np.subtract.at(holdings, (rows, cols), signed)
+            today = (trades['timestamp'] < end).to_numpy()
+            np.add.at(traded_qty, (rows[today], cols[today]), signed[today])
+            np.add.at(traded_cost, (rows[today], cols[today]), signed[today] * trades['price'].to_numpy()[today])
+
+        price_pnl, trading_pnl = self.attribute(holdings, prev_close, close, traded_qty, traded_cost)
+
+        # Store only non-zero cells, as {symbol: [price, trading]} per account
+        active = (np.round(price_pnl, 2) != 0) | (np.round(trading_pnl, 2) != 0)
+        split: Dict[int, Dict[str, List[float]]] = {}
+        for i, j in zip(*np.nonzero(active)):
+            split.setdefault(i, {})[symbols[j]] = [round(float(price_pnl[i, j]), 2), round(float(trading_pnl[i, j]), 2)]
+        rows = [
+            (accounts[i], round(float(price_pnl[i].sum()), 2), round(float(trading_pnl[i].sum()), 2), by_symbol)
+            for i, by_symbol in split.items()
+        ]
+        self.store.save_attribution(start, rows)
+        return len(rows)
+
+    @staticmethod
+    def summarize(records: List[Dict[str, Any]], sectors: Dict[str, str]) -> Dict[str, pd.DataFrame]:
+        """Daily totals plus position and sector breakdowns over stored records"""
+        daily = pd.DataFrame(
+            [(r['date'], r['price_pnl'], r['trading_pnl']) for r in records],
+            columns=['date', 'price_move', 'trading']
+        ).set_index('date')
+        daily['total'] = daily['price_move'] + daily['trading']
+
+        by_position = pd.DataFrame(
+            [(symbol, *split) for r in records for symbol, split in r['positions'].items()],
+            columns=['symbol', 'price_move', 'trading']
+        ).groupby('symbol').sum()
+        by_position['total'] = by_position['price_move'] + by_position['trading']
+        by_sector = by_position.groupby(by_position.index.map(lambda s: sectors.get(s, 'Unknown'))).sum()
+        by_sector.index.name = 'sector'
+
+        return {
+            'daily': daily,
+            'by_position': by_position.sort_values('total'),
+            'by_sector': by_sector.sort_values('total')
+        }
+
+if __name__ == '__main__':
+    # Nightly entry point: python -m utils.attribution [YYYY-MM-DD]
+    run_day = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    print(f"Stored attribution for {AttributionEngine().run(run_day)} accounts")
@@ -0,0 +1,248 @@
+import atexit
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional
+from .metrics import metrics
+from .store import get_store
+
+AUDIT_DIR = os.environ.get('VELASA_AUDIT_DIR', 'audit')
+# Fills still unconfirmed after this long are taken to have lost their audit append
+BACKFILL_AFTER = 60.0
+BACKFILL_INTERVAL = 5 * 60
+
+logger = logging.getLogger(__name__)
+
+# Frame: payload length, CRC32 of payload
+FRAME = struct.Struct('<II')
+# Payload: seq, unix time, side, quantity, price, entry price, username and symbol lengths
+RECORD = struct.Struct('<QdBIddBB')
+SIDES = {'buy': 0, 'sell': 1}
+SIDE_NAMES = {code: side for side, code in SIDES.items()}
+
+def encode_record(seq: int, username: str, fill: Dict[str, Any]) -> bytes:
+    user = username.encode()
+    symbol = fill['symbol'].encode()
+    payload = RECORD.pack(
+        seq,
+        datetime.fromisoformat(fill['timestamp']).timestamp(),
+        SIDES[fill['type']],
+        fill['quantity'],
+        fill['price'],
+        fill['entry_price'],
+        len(user),
+        len(symbol)
+    ) + user + symbol
+    return FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def read_segment(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the records of one segment, stopping at a torn or corrupt tail"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + FRAME.size <= len(data):
+        length, crc = FRAME.unpack_from(data, offset)
+        payload = data[offset + FRAME.size:offset + FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        seq, timestamp, side, quantity, price, entry_price, user_len, symbol_len = RECORD.unpack_from(payload)
+        strings = payload[RECORD.size:]
+        yield {
+            'seq': seq,
+            'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+            'username': strings[:user_len].decode(),
+            'symbol': strings[user_len:user_len + symbol_len].decode(),
+            'type': SIDE_NAMES[side],
+            'quantity': quantity,
+            'price': price,
+            'entry_price': entry_price,
+        }
+        offset += FRAME.size + length
+
+def list_segments(directory: str = AUDIT_DIR) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.log')]
+
+class _Batch:
+    def __init__(self):
+        self.records: List[bytes] = []
+        self.enqueued: List[float] = []
+        self.durable = threading.Event()
+        self.error: Optional[BaseException] = None
+
+class AuditLog:
+    """Append-only, fsynced log of fills, written with group commit.
+
+    Callers from any session add a record to the open batch and wait. A single
+    writer thread flushes the batch once its oldest record has waited
+    ``latency_budget`` seconds (or it reaches ``max_batch``), so one write and
+    one fsync cover every order that arrived in that window. Segments are
+    named by start time and process id, so each process only appends to its
+    own files, and roll over once they reach ``segment_bytes``.
+    """
+
+    def __init__(
+        self,
+        directory: str = AUDIT_DIR,
+        latency_budget: float = 0.002,
+        max_batch: int = 4096,
+        segment_bytes: int = 64 * 1024 * 1024
+    ):
+        self.directory = directory
+        self.latency_budget = latency_budget
+        self.max_batch = max_batch
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        self._seq = 0
+        self._batch = _Batch()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._file = None
+        self._open_segment()
+
+        self._commit_latency = metrics.histogram('audit.commit_latency_ms')
+        self._fsync_latency = metrics.histogram('audit.fsync_ms')
+        self._batch_size = metrics.histogram('audit.batch_size', low=1, high=100000)
+        self._records = metrics.counter('audit.records')
+
+        self._writer = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self._writer.start()
+
+    def _open_segment(self):
+        if self._file is not None:
+            self._file.close()
+        name = f"{time.time_ns():020d}-{os.getpid()}.log"
+        self._file = open(os.path.join(self.directory, name), 'ab', buffering=0)
+        self._segment_size = 0
+
+    def submit(self, username: str, fill: Dict[str, Any]) -> _Batch:
+        """Queue a fill for the next group commit without waiting for it"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Audit log is closed")
+            self._seq += 1
+            batch = self._batch
+            batch.records.append(encode_record(self._seq, username, fill))
+            batch.enqueued.append(time.perf_counter())
+            if len(batch.records) == 1 or len(batch.records) >= self.max_batch:
+                self._cond.notify()
+            return batch
+
+    def record(self, username: str, fill: Dict[str, Any], timeout: Optional[float] = 5.0):
+        """Append a fill and block until it is on disk"""
+        batch = self.submit(username, fill)
+        if not batch.durable.wait(timeout):
+            raise TimeoutError("Audit log commit timed out")
+        if batch.error is not None:
+            raise batch.error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._batch.records and not self._closed:
+                    self._cond.wait()
+                if not self._batch.records:
+                    return
+                # Hold the batch open until the oldest record's budget is spent
+                deadline = self._batch.enqueued[0] + self.latency_budget
+                while (
+                    len(self._batch.records) < self.max_batch
+                    and not self._closed
+                    and (remaining := deadline - time.perf_counter()) > 0
+                ):
+                    self._cond.wait(remaining)
+                batch, self._batch = self._batch, _Batch()
+            self._commit(batch)
+
+    def _commit(self, batch: _Batch):
+        data = b''.join(batch.records)
+        try:
+            if self._segment_size and self._segment_size + len(data) > self.segment_bytes:
+                self._open_segment()
+            started = time.perf_counter()
+            self._file.write(data)
+            os.fsync(self._file.fileno())
+            done = time.perf_counter()
+            self._segment_size += len(data)
+        except BaseException as e:
+            batch.error = e
+            batch.durable.set()
+            return
+
+        self._fsync_latency.observe((done - started) * 1000)
+        self._batch_size.observe(len(batch.records))
+        self._records.inc(len(batch.records))
+        for enqueued in batch.enqueued:
+            self._commit_latency.observe((done - enqueued) * 1000)
+        batch.durable.set()
+
+    def close(self):
+        """Flush anything queued and stop the writer"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._writer.join()
+        self._file.close()
+
+def backfill_pending(log: AuditLog, store=None, before: Optional[float] = None) -> int:
+    """Record fills committed without a confirmed audit entry, e.g. after a failed append or a crash.
+
+    Fills are claimed from the store before writing, so concurrent processes
+    never record the same one twice; if writing fails they are put back.
+    """
+    store = store or get_store()
+    fills = store.claim_audit_pending(time.time() - BACKFILL_AFTER if before is None else before)
+    if not fills:
+        return 0
+    try:
+        for batch in [log.submit(fill['username'], fill) for fill in fills]:
+            if not batch.durable.wait(30.0):
+                raise TimeoutError("Audit log commit timed out")
+            if batch.error is not None:
+                raise batch.error
+    except BaseException:
+        store.restore_audit_pending(fills)
+        raise
+    metrics.counter('audit.backfilled').inc(len(fills))
+    return len(fills)
+
+def _run_backfill(log: AuditLog, stopped: threading.Event):
+    while True:
+        try:
+            backfill_pending(log)
+        except Exception:
+            metrics.counter('audit.backfill_failed').inc()
+            logger.exception("Audit backfill failed; retrying in %ss", BACKFILL_INTERVAL)
+        if stopped.wait(BACKFILL_INTERVAL):
+            return
+
+_audit_log: Optional[AuditLog] = None
+_audit_log_lock = threading.Lock()
+
+def get_audit_log() -> AuditLog:
+    """Process-wide audit log, created on first use and flushed at exit.
+
+    A background thread backfills fills whose audit append never landed,
+    starting with whatever a previous run left behind.
+    """
+    global _audit_log
+    if _audit_log is None:
+        with _audit_log_lock:
+            if _audit_log is None:
+                _audit_log = AuditLog()
+                atexit.register(_audit_log.close)
+                stopped = threading.Event()
+                threading.Thread(
+                    target=_run_backfill, args=(_audit_log, stopped), name='audit-log-backfill', daemon=True
+                ).start()
+                # Registered last so it runs first, before the log closes
+                atexit.register(stopped.set)
+    return _audit_log
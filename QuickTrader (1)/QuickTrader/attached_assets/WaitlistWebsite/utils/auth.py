@@ -1,38 +1,133 @@
 import streamlit as st
-import hashlib
+import hmac
+import os
+import re
 import secrets
+import sqlite3
+import threading
 import time
 from typing import Dict, Optional, Tuple, List
-from datetime import datetime, timedelta
+from datetime import datetime
 from .verification import Verification
+from .store import get_store, hash_secret
+from .password_hasher import get_password_hasher, HasherOverloaded, LEGACY_ITERATIONS
+from .metrics import metrics
+from .rate_limiter import RateLimiter
+from .sessions import get_session_store
+from .outbox import get_outbox
+from .verification_store import get_verification_store, VERIFIED, NOT_FOUND, EXPIRED, LOCKED
+
+BUSY_MESSAGE = "Too many requests right now. Please try again in a moment."
+
+# Unknown users are checked against these so they cost the same hash as real ones
+DUMMY_SALT = secrets.token_hex(16)
+DUMMY_HASH = secrets.token_hex(32)
+# Reverse proxies in front of the app; each appends the address it saw to X-Forwarded-For.
+# Zero (a bare Streamlit server) ignores forwarding headers, which clients can then set freely
+TRUSTED_PROXY_HOPS = int(os.environ.get('VELASA_TRUSTED_PROXY_HOPS', 0))
+
+# How often the dummy hash's cost is re-read from the stored users
+DUMMY_COST_REFRESH = 10 * 60
+_dummy_cost = {'iterations': LEGACY_ITERATIONS, 'refreshed_at': float('-inf')}
+_dummy_refreshing = threading.Lock()
+
+def _refresh_dummy_cost(store):
+    try:
+        _dummy_cost['iterations'] = store.median_password_iterations(LEGACY_ITERATIONS) or LEGACY_ITERATIONS
+    except sqlite3.Error:
+        # Keep the previous cost; the next stale read tries again
+        _dummy_cost['refreshed_at'] = float('-inf')
+    finally:
+        _dummy_refreshing.release()
+
+def _dummy_iterations(store) -> int:
+    """Cost of the dummy hash: the median stored cost, so an unknown username
+    takes as long as a typical real one while old hashes are still being upgraded.
+
+    The median scans every user, so once stale it is recomputed on a background
+    thread and requests keep using the previous value meanwhile.
+    """
+    now = time.monotonic()
+    if now - _dummy_cost['refreshed_at'] > DUMMY_COST_REFRESH and _dummy_refreshing.acquire(blocking=False):
+        _dummy_cost['refreshed_at'] = now
+        threading.Thread(target=_refresh_dummy_cost, args=(store,), name='dummy-cost-refresh', daemon=True).start()
+    return _dummy_cost['iterations']
+
+# Marks the per-rerun session check as not yet done
+_UNCHECKED = object()
+
+def verification_messages(username: str, email: str, phone: str, email_token: str, phone_otp: str) -> List[Dict]:
+    """Outbox messages carrying a new user's email link and SMS code"""
+    round_id = hash_secret(email_token)[:16]
+    return [
+        {
+            'idempotency_key': f"{username}:email_verification:{round_id}",
+            'username': username,
+            'kind': 'email_verification',
+            'recipient': email,
+            'payload': {'link': f"https://velasa-trading.com/verify/email/{email_token}"}
+        },
+        {
+            'idempotency_key': f"{username}:sms_otp:{round_id}",
+            'username': username,
+            'kind': 'sms_otp',
+            'recipient': phone,
+            'payload': {'otp': phone_otp}
+        }
+    ]
 
 class AuthManager:
     def __init__(self):
-        if 'users' not in st.session_state:
-            st.session_state.users = {}
-        if 'current_user' not in st.session_state:
-            st.session_state.current_user = None
-        if 'login_attempts' not in st.session_state:
-            st.session_state.login_attempts = {}
-        if 'session_start' not in st.session_state:
-            st.session_state.session_start = None
-        if 'pending_verifications' not in st.session_state:
-            st.session_state.pending_verifications = {}
-
+        if 'session_token' not in st.session_state:
+            st.session_state.session_token = None
+
+        self.store = get_store()
+        self.sessions = get_session_store()
+        self.verifications = get_verification_store()
+        self.outbox = get_outbox()
+        # main.py builds one AuthManager per rerun, so the session is checked at most once per rerun
+        self._current_user = _UNCHECKED
+        self.session_expired = False
         self.verification = Verification()
+        # Shared across sessions and processes, so a new tab does not reset the count
+        self.user_limiter = RateLimiter('login_user', limit=5, period=15 * 60)
+        self.ip_limiter = RateLimiter('login_ip', limit=30, period=15 * 60)
 
     def _generate_salt(self) -> str:
         return secrets.token_hex(16)
 
-    def _hash_password(self, password: str, salt: str) -> str:
-        return hashlib.pbkdf2_hmac(
-            'sha256',
-            password.encode(),
-            salt.encode(),
-            100000  # Increased iterations for security
-        ).hex()
+    def _hash_password(self, password: str, salt: str, iterations: Optional[int] = None) -> str:
+        """PBKDF2 on the shared hashing pool; raises HasherOverloaded when it is saturated"""
+        return get_password_hasher().hash(password, salt, iterations)
+
+    def _new_password_fields(self, password: str) -> Dict:
+        """Salt, hash and cost to store for a password, at the current calibrated cost"""
+        salt = self._generate_salt()
+        iterations = get_password_hasher().iterations
+        return {
+            'salt': salt,
+            'password_hash': self._hash_password(password, salt, iterations),
+            'iterations': iterations
+        }
 
-    def _check_password_strength(self, password: str) -> tuple[bool, str]:
+    def _verify_credentials(self, username: str, password: str) -> Optional[Dict]:
+        """The user record if the password matches.
+
+        Unknown users and accounts without a password run the same PBKDF2 and
+        constant-time compare as a real check, so failures are
+        indistinguishable by timing and never park the thread.
+        """
+        user = self.store.get_user(username)
+        stored = user.get('password_hash') if user else None
+        if stored:
+            password_hash = self._hash_password(password, user['salt'], user.get('iterations', LEGACY_ITERATIONS))
+        else:
+            password_hash = self._hash_password(password, DUMMY_SALT, _dummy_iterations(self.store))
+        matches = hmac.compare_digest(password_hash, stored or DUMMY_HASH)
+        return user if matches and stored else None
+
+    @staticmethod
+    def _check_password_strength(password: str) -> tuple[bool, str]:
         if len(password) < 8:
             return False, "Password must be at least 8 characters long"
         if not any(c.isupper() for c in password):
@@ -45,21 +140,37 @@ class AuthManager:
             return False, "Password must contain at least one special character"
         return True, ""
 
-    def _check_rate_limit(self, username: str) -> tuple[bool, str]:
-        now = datetime.now()
-        attempts = st.session_state.login_attempts.get(username, [])
+    def _client_ip(self) -> Optional[str]:
+        """Client address as seen by the outermost trusted proxy, or the socket peer without one.
 
-        # Remove attempts older than 15 minutes
-        attempts = [attempt for attempt in attempts 
-                   if attempt > now - timedelta(minutes=15)]
+        Forwarding headers are only read when VELASA_TRUSTED_PROXY_HOPS is set,
+        and entries left of the outermost trusted proxy in X-Forwarded-For come
+        from the client and can be anything, so they are never used.
+        """
+        try:
+            headers = st.context.headers
+        except Exception:
+            headers = {}
+        if TRUSTED_PROXY_HOPS > 0:
+            forwarded = [hop.strip() for hop in (headers.get('X-Forwarded-For') or '').split(',') if hop.strip()]
+            if len(forwarded) >= TRUSTED_PROXY_HOPS:
+                return forwarded[-TRUSTED_PROXY_HOPS]
+            if TRUSTED_PROXY_HOPS == 1 and headers.get('X-Real-Ip'):
+                return headers.get('X-Real-Ip')
+        # Direct connection; not available on older Streamlit versions
+        return getattr(st.context, 'ip_address', None)
 
-        if len(attempts) >= 5:
+    def _check_rate_limit(self, username: str) -> tuple[bool, str]:
+        """Count a login attempt against both the client IP and the username"""
+        client_ip = self._client_ip()
+        if client_ip and self.ip_limiter.hit(client_ip) is not None:
+            return False, "Too many login attempts. Please try again later."
+        if self.user_limiter.hit(username.lower()) is not None:
             return False, "Too many login attempts. Please try again later."
-
-        st.session_state.login_attempts[username] = attempts
         return True, ""
 
-    def _validate_input(self, username: str, password: str, email: str = "", phone: str = "") -> tuple[bool, str]:
+    @staticmethod
+    def _validate_input(username: str, password: str, email: str = "", phone: str = "") -> tuple[bool, str]:
         if not username or not password:
             return False, "Username and password are required"
         if len(username) < 3 or len(username) > 50:
@@ -83,172 +194,198 @@ class AuthManager:
         if not password_valid:
             return False, password_msg
 
-        if username in st.session_state.users:
+        if self.store.user_exists(username):
             return False, "Username already exists"
+        if self.store.find_user_by_email(email):
+            return False, "An account with this email already exists"
 
         # Generate verification tokens
         email_token = secrets.token_urlsafe(32)
         phone_otp = self.verification._generate_otp()
 
-        # Store pending verification
-        st.session_state.pending_verifications[username] = {
-            'email_token': email_token,
-            'phone_otp': phone_otp,
-            'email': email,
-            'phone': phone,
-            'expires_at': datetime.now() + timedelta(hours=24)
-        }
-
         # Generate salt and hash password
-        salt = self._generate_salt()
-        password_hash = self._hash_password(password, salt)
-
-        # Send verification email and SMS
-        verification_link = f"https://velasa-trading.com/verify/email/{email_token}"
-        email_success, email_msg = self.verification.send_email_verification(email, verification_link)
-        sms_success, otp, sms_msg = self.verification.send_sms_otp(phone)
+        try:
+            password_fields = self._new_password_fields(password)
+        except HasherOverloaded:
+            return False, BUSY_MESSAGE
 
-        if not email_success:
-            return False, f"Failed to send verification email: {email_msg}"
-        if not sms_success:
-            return False, f"Failed to send verification SMS: {sms_msg}"
-
-        st.session_state.users[username] = {
-            'password_hash': password_hash,
-            'salt': salt,
+        created = self.store.create_account(username, {
+            **password_fields,
             'email': email,
             'phone': phone,
             'email_verified': False,
             'phone_verified': False,
-            'portfolio': {'cash': 100000, 'positions': {}},
             'created_at': datetime.now().isoformat(),
             'last_login': None
-        }
+        }, cash=100000)
+        if not created:
+            return False, "Username or email already exists"
+
+        self.verifications.create(username, email, phone, email_token, phone_otp)
+        # Delivered in the background; the same OTP that was stored is the one sent
+        self.outbox.enqueue(verification_messages(username, email, phone, email_token, phone_otp))
         return True, "Registration initiated. Please check your email and phone for verification codes."
 
+    def get_verification_delivery(self, username: str) -> Dict[str, str]:
+        """Delivery status ('pending', 'sending', 'sent' or 'failed') of each verification message"""
+        return self.outbox.status(username)
+
     def verify_email(self, token: str) -> tuple[bool, str]:
-        for username, verification in st.session_state.pending_verifications.items():
-            if verification['email_token'] == token:
-                if datetime.now() > verification['expires_at']:
-                    return False, "Verification link has expired"
-                st.session_state.users[username]['email_verified'] = True
-                del st.session_state.pending_verifications[username] #remove after verification
-                return True, "Email verified successfully"
-        return False, "Invalid verification token"
+        status, _ = self.verifications.verify_email(token)
+        if status == EXPIRED:
+            return False, "Verification link has expired"
+        if status != VERIFIED:
+            return False, "Invalid verification token"
+        return True, "Email verified successfully"
 
     def verify_phone(self, username: str, otp: str) -> tuple[bool, str]:
-        if username not in st.session_state.pending_verifications:
+        status = self.verifications.verify_phone(username, otp)
+        if status == NOT_FOUND:
             return False, "No pending verification found"
-        if st.session_state.pending_verifications[username]['phone_otp'] != otp:
-            return False, "Invalid OTP"
-        if datetime.now() > st.session_state.pending_verifications[username]['expires_at']:
+        if status == EXPIRED:
             return False, "OTP has expired"
-        st.session_state.users[username]['phone_verified'] = True
-        del st.session_state.pending_verifications[username] #remove after verification
+        if status == LOCKED:
+            return False, "Too many incorrect codes. Please request a new one."
+        if status != VERIFIED:
+            return False, "Invalid OTP"
         return True, "Phone number verified successfully"
 
-    def google_sign_in(self, email: str) -> tuple[bool, str]:
+    def resend_phone_otp(self, username: str) -> tuple[bool, str]:
+        """Send a new SMS code, replacing the old one and its used attempts"""
+        phone_otp = self.verification._generate_otp()
+        phone = self.verifications.resend_phone_otp(username, phone_otp)
+        if phone is None:
+            return False, "No new code can be sent. Please contact support."
+        self.outbox.enqueue([{
+            'idempotency_key': f"{username}:sms_otp:{secrets.token_hex(8)}",
+            'username': username,
+            'kind': 'sms_otp',
+            'recipient': phone,
+            'payload': {'otp': phone_otp}
+        }])
+        return True, "A new verification code has been sent"
+
+    def google_sign_in(self, email: str, google_sub: Optional[str] = None) -> tuple[bool, str]:
         """
-        Simulated Google Sign In that creates or logs in a user
+        Simulated Google Sign In that creates or logs in a user.
+
+        Users are found by Google subject id (the email stands in for it in
+        the simulation), never by guessing usernames.
         """
         if not email or not '@' in email:
             return False, "Invalid email address"
-
-        # Generate username from email
-        username = email.split('@')[0]
-        base_username = username
-        counter = 1
-
-        # Ensure unique username
-        while username in st.session_state.users:
-            if st.session_state.users[username].get('google_user'):
-                # Existing Google user - log them in
-                st.session_state.current_user = username
-                st.session_state.session_start = datetime.now()
-                return True, "Welcome back!"
-            username = f"{base_username}{counter}"
-            counter += 1
-
-        # Create new user
-        st.session_state.users[username] = {
-            'email': email,
-            'google_user': True,
-            'email_verified': True,
-            'portfolio': {'cash': 100000, 'positions': {}},
-            'created_at': datetime.now().isoformat(),
-            'last_login': datetime.now().isoformat()
-        }
-
-        st.session_state.current_user = username
-        st.session_state.session_start = datetime.now()
-        return True, f"Welcome to Velasa Trading!"
+        google_sub = google_sub or email.lower()
+
+        existing = self.store.find_user_by_google_sub(google_sub)
+        if existing is None and self.store.find_user_by_email(email):
+            return False, "An account with this email already exists. Log in and link Google from your profile."
+
+        if existing is None:
+            base_username = re.sub(r'[^A-Za-z0-9]', '', email.split('@')[0])[:40] or "user"
+            record = {
+                'email': email,
+                'google_user': True,
+                'google_sub': google_sub,
+                'email_verified': True,
+                'created_at': datetime.now().isoformat(),
+                'last_login': datetime.now().isoformat()
+            }
+            # A random suffix makes a second collision practically impossible
+            for username in [base_username] + [f"{base_username}{secrets.token_hex(3)}" for _ in range(3)]:
+                if self.store.create_account(username, record, cash=100000):
+                    self._start_session(username)
+                    return True, "Welcome to Velasa Trading!"
+                # Lost a race with a concurrent sign-in for the same Google account
+                existing = self.store.find_user_by_google_sub(google_sub)
+                if existing is not None:
+                    break
+            else:
+                return False, "Could not create account, please try again"
+
+        username = existing[0]
+        self.store.update_user(username, {'last_login': datetime.now().isoformat()})
+        self._start_session(username)
+        return True, "Welcome back!"
 
     def login(self, username: str, password: str) -> tuple[bool, str]:
+        started = time.perf_counter()
+        success, message = self._login(username, password)
+        metrics.histogram('auth.login_ms').observe((time.perf_counter() - started) * 1000)
+        return success, message
+
+    def _login(self, username: str, password: str) -> tuple[bool, str]:
         # Input validation
         input_valid, input_msg = self._validate_input(username, password)
         if not input_valid:
             return False, input_msg
 
-        # Rate limiting
+        # Rate limiting; every attempt counts, successful or not
         rate_limit_ok, rate_limit_msg = self._check_rate_limit(username)
         if not rate_limit_ok:
             return False, rate_limit_msg
 
-        # Record login attempt
-        st.session_state.login_attempts.setdefault(username, []).append(datetime.now())
-
-        if username not in st.session_state.users:
-            time.sleep(1)  # Prevent timing attacks
+        try:
+            user = self._verify_credentials(username, password)
+        except HasherOverloaded:
+            return False, BUSY_MESSAGE
+        if user is None:
             return False, "Invalid credentials"
 
-        user = st.session_state.users[username]
-
         # Check verification status
         if not user.get('email_verified'):
             return False, "Please verify your email address first"
         if not user.get('phone_verified'):
             return False, "Please verify your phone number first"
 
-        salt = user['salt']
-        password_hash = self._hash_password(password, salt)
-
-        if password_hash == user['password_hash']:
-            st.session_state.current_user = username
-            st.session_state.session_start = datetime.now()
-            st.session_state.users[username]['last_login'] = datetime.now().isoformat()
-            return True, "Login successful"
-
-        return False, "Invalid credentials"
+        updates = {'last_login': datetime.now().isoformat()}
+        if get_password_hasher().needs_rehash(user.get('iterations', LEGACY_ITERATIONS)):
+            # Re-hash at the current cost while the plaintext is at hand
+            try:
+                updates.update(self._new_password_fields(password))
+            except HasherOverloaded:
+                pass
+
+        self._start_session(username)
+        self.store.update_user(username, updates)
+        return True, "Login successful"
+
+    def _start_session(self, username: str):
+        if st.session_state.session_token:
+            self.sessions.revoke(st.session_state.session_token)
+        st.session_state.session_token = self.sessions.create(username)
+        self._current_user = username
+        self.session_expired = False
 
     def logout(self):
-        st.session_state.current_user = None
-        st.session_state.session_start = None
+        if st.session_state.session_token:
+            self.sessions.revoke(st.session_state.session_token)
+        st.session_state.session_token = None
+        self._current_user = None
 
     def get_current_user(self) -> Optional[str]:
-        # Check session expiration (2 hours)
-        if (st.session_state.session_start and 
-            datetime.now() - st.session_state.session_start > timedelta(hours=2)):
-            self.logout()
-            return None
-        return st.session_state.current_user
+        if self._current_user is _UNCHECKED:
+            token = st.session_state.session_token
+            self._current_user = self.sessions.validate(token) if token else None
+            if token and self._current_user is None:
+                # Expired idle, hit the absolute limit, or revoked elsewhere
+                st.session_state.session_token = None
+                self.session_expired = True
+        return self._current_user
 
     def check_session_valid(self) -> bool:
-        if not st.session_state.current_user or not st.session_state.session_start:
-            return False
-        if datetime.now() - st.session_state.session_start > timedelta(hours=2):
-            self.logout()
-            return False
-        return True
+        return self.get_current_user() is not None
 
     def change_password(self, username: str, current_password: str, new_password: str) -> tuple[bool, str]:
         """Change user's password"""
-        if username not in st.session_state.users:
+        if not self.store.user_exists(username):
             return False, "User not found"
 
-        user = st.session_state.users[username]
-        current_hash = self._hash_password(current_password, user['salt'])
+        try:
+            user = self._verify_credentials(username, current_password)
+        except HasherOverloaded:
+            return False, BUSY_MESSAGE
 
-        if current_hash != user['password_hash']:
+        if user is None:
             return False, "Current password is incorrect"
 
         # Check password strength
@@ -257,10 +394,14 @@ class AuthManager:
             return False, message
 
         # Update password
-        new_salt = self._generate_salt()
-        new_hash = self._hash_password(new_password, new_salt)
-        user['salt'] = new_salt
-        user['password_hash'] = new_hash
+        try:
+            self.store.update_user(username, self._new_password_fields(new_password))
+        except HasherOverloaded:
+            return False, BUSY_MESSAGE
+
+        # Sign out every other device; this one gets a fresh session
+        self.sessions.revoke_user(username)
+        self._start_session(username)
 
         return True, "Password updated successfully"
 
@@ -269,15 +410,21 @@ class AuthManager:
         if not google_email or '@' not in google_email:
             return False, "Invalid email address"
 
-        user = st.session_state.users.get(username)
+        user = self.store.get_user(username)
         if not user:
             return False, "User not found"
 
         if user.get('google_user'):
             return False, "Account already linked with Google"
 
-        user['google_email'] = google_email
-        user['google_user'] = True
+        try:
+            self.store.update_user(username, {
+                'google_email': google_email,
+                'google_user': True,
+                'google_sub': google_email.lower()
+            })
+        except sqlite3.IntegrityError:
+            return False, "This Google account is already linked to another user"
 
         return True, "Google account linked successfully"
 
@@ -288,51 +435,39 @@ class AuthManager:
         initial_deposit: float
     ) -> tuple[bool, str]:
         """Create an additional trading account for existing user"""
-        if username not in st.session_state.users:
+        if not self.store.user_exists(username):
             return False, "User not found"
 
         # Generate new account ID
-        account_count = len([
-            u for u in st.session_state.users 
-            if u.startswith(f"{username}_account")
-        ])
+        account_count = len(self.store.get_linked_accounts(username))
         new_account_id = f"{username}_account{account_count + 1}"
 
         # Create new account
-        st.session_state.users[new_account_id] = {
+        created = self.store.create_account(new_account_id, {
             'parent_account': username,
             'account_type': account_type,
-            'portfolio': {
-                'cash': initial_deposit,
-                'positions': {},
-                'transactions': []
-            },
             'created_at': datetime.now().isoformat()
-        }
+        }, cash=initial_deposit)
+        if not created:
+            return False, "Could not create account, please try again"
 
         return True, f"Additional account created successfully: {new_account_id}"
 
     def delete_account(self, username: str, password: str) -> tuple[bool, str]:
         """Delete user account and all associated data"""
-        if username not in st.session_state.users:
+        if not self.store.user_exists(username):
             return False, "User not found"
 
-        user = st.session_state.users[username]
-        password_hash = self._hash_password(password, user['salt'])
+        try:
+            user = self._verify_credentials(username, password)
+        except HasherOverloaded:
+            return False, BUSY_MESSAGE
 
-        if password_hash != user['password_hash']:
+        if user is None:
             return False, "Incorrect password"
 
         # Delete main account and all linked accounts
-        accounts_to_delete = [
-            acc_id for acc_id in st.session_state.users
-            if acc_id == username or 
-            (isinstance(st.session_state.users[acc_id], dict) and 
-             st.session_state.users[acc_id].get('parent_account') == username)
-        ]
-
-        for account_id in accounts_to_delete:
-            del st.session_state.users[account_id]
+        self.store.delete_users([username] + self.store.get_linked_accounts(username))
 
         # Clear current session
         self.logout()
@@ -341,8 +476,8 @@ class AuthManager:
 
     def get_linked_accounts(self, username: str) -> List[str]:
         """Get all accounts linked to the main account"""
-        return [
-            acc_id for acc_id in st.session_state.users
-            if isinstance(st.session_state.users[acc_id], dict) and 
-            st.session_state.users[acc_id].get('parent_account') == username
-        ]
\ No newline at end of file
+        return self.store.get_linked_accounts(username)
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        """Get the stored profile for a user"""
+        return self.store.get_user(username)
\ No newline at end of file
@@ -0,0 +1,122 @@
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Callable, List, Optional
+from .rebalancer import Rebalancer
+from .risk_metrics import RiskMetrics
+
+def sma_crossover_targets(closes: pd.DataFrame, fast: int = 20, slow: int = 50) -> pd.DataFrame:
+    """Equal-weight sleeve per symbol, invested while the fast MA is above the slow MA"""
+    signal = closes.rolling(fast).mean() > closes.rolling(slow).mean()
+    return signal.astype(float) / closes.shape[1]
+
+def fixed_weight_targets(closes: pd.DataFrame, weights: Dict[str, float], every: int = 21) -> pd.DataFrame:
+    """Constant target weights, re-applied every ``every`` bars"""
+    targets = pd.DataFrame(np.nan, index=closes.index, columns=closes.columns)
+    targets.iloc[::every] = [weights.get(s, 0.0) for s in closes.columns]
+    return targets
+
+def apply_trailing_stop(closes: pd.DataFrame, targets: pd.DataFrame, stop: float = 0.1) -> pd.DataFrame:
+    """Flatten a position once price falls ``stop`` below its high since entry, until the signal resets"""
+    invested = targets.fillna(0) > 0
+    # Each contiguous run of the same signal gets its own segment id per column
+    segments = (invested != invested.shift()).cumsum()
+    stopped = pd.DataFrame(False, index=closes.index, columns=closes.columns)
+    for symbol in closes.columns:
+        peak = closes[symbol].where(invested[symbol]).groupby(segments[symbol]).cummax()
+        hit = (closes[symbol] < peak * (1 - stop)) & invested[symbol]
+        stopped[symbol] = hit.groupby(segments[symbol]).cummax()
+    return targets.mask(stopped, 0.0)
+
+class Backtester:
+    """Replay target-weight strategies over a (dates x symbols) close matrix.
+
+    Orders are sized with the same integer-share, cash-constrained rules as
+    live rebalancing. Each step is vectorized across symbols and only bars
+    where some target changes are visited; holdings between them are forward
+    filled, so long backtests cost one pass over the rebalance dates.
+    """
+
+    def __init__(self, initial_cash: float = 100000, fee_rate: float = 0.0):
+        self.initial_cash = initial_cash
+        self.fee_rate = fee_rate
+
+    def run(self, closes: pd.DataFrame, targets: pd.DataFrame) -> Dict[str, Any]:
+        prices = closes.to_numpy(dtype=float)
+        # Signals use data up to the close, so orders fill on the next bar
+        weights = targets.reindex_like(closes).shift(1).to_numpy(dtype=float)
+        n_bars, n_symbols = prices.shape
+
+        tradable = np.isfinite(prices)
+        safe_prices = np.where(tradable, prices, 1.0)
+        defined = np.isfinite(weights)
+        previous = np.vstack([np.full((1, n_symbols), np.nan), weights[:-1]])
+        changed = defined & ~((weights == previous) | (np.isnan(previous) & (weights == 0)))
+        event_bars = np.nonzero(changed.any(axis=1))[0]
+
+        quantities = np.zeros(n_symbols)
+        cash = self.initial_cash
+        holdings = np.full((n_bars, n_symbols), np.nan)
+        cash_path = np.full(n_bars, np.nan)
+        holdings[0], cash_path[0] = quantities, cash
+        trade_count, fees_paid = 0, 0.0
+
+        for bar in event_bars:
+            mask = changed[bar] & tradable[bar]
+            deltas = Rebalancer.solve_deltas(
+                quantities[None], np.array([cash / (1 + self.fee_rate)]), safe_prices[bar],
+                np.nan_to_num(weights[bar])[None], 0.0, mask[None]
+            )[0]
+            notional = deltas * safe_prices[bar]
+            fees = self.fee_rate * np.abs(notional).sum()
+            quantities = quantities + deltas
+            cash -= notional.sum() + fees
+            fees_paid += fees
+            trade_count += int(np.count_nonzero(deltas))
+            holdings[bar], cash_path[bar] = quantities, cash
+
+        holdings = pd.DataFrame(holdings).ffill().to_numpy()
+        cash_path = pd.Series(cash_path).ffill().to_numpy()
+        nav = pd.Series(
+            cash_path + np.nansum(holdings * prices, axis=1),
+            index=closes.index,
+            name='value'
+        )
+
+        metrics = RiskMetrics().compute(nav)
+        metrics.pop('rolling', None)
+        return {
+            'nav': nav,
+            'total_return': float(nav.iloc[-1] / self.initial_cash - 1) * 100,
+            'trade_count': trade_count,
+            'fees': fees_paid,
+            'final_positions': dict(zip(closes.columns, quantities.astype(int))),
+            **metrics
+        }
+
+# Per-process state for sweep workers, set once by the initializer
+_sweep_state: Dict[str, Any] = {}
+
+def _init_sweep(closes: pd.DataFrame, strategy: Callable, backtester: Backtester):
+    _sweep_state.update(closes=closes, strategy=strategy, backtester=backtester)
+
+def _run_sweep_point(params: Dict[str, Any]) -> Dict[str, Any]:
+    closes = _sweep_state['closes']
+    result = _sweep_state['backtester'].run(closes, _sweep_state['strategy'](closes, **params))
+    result.pop('nav')
+    return {**params, **result}
+
+def parameter_sweep(
+    closes: pd.DataFrame,
+    strategy: Callable[..., pd.DataFrame],
+    grid: Dict[str, List[Any]],
+    backtester: Optional[Backtester] = None,
+    max_workers: Optional[int] = None
+) -> pd.DataFrame:
+    """Backtest every parameter combination in ``grid`` across a process pool"""
+    backtester = backtester or Backtester()
+    points = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    with ProcessPoolExecutor(max_workers, initializer=_init_sweep, initargs=(closes, strategy, backtester)) as pool:
+        results = list(pool.map(_run_sweep_point, points))
+    return pd.DataFrame(results)
@@ -0,0 +1,209 @@
+"""Load benchmarks for the trading backend.
+
+Run from the app directory, e.g. ``python -m utils.benchmarks contention``.
+Each benchmark works on a throwaway database and audit log, never on
+velasa.db or the real audit directory.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Iterator, List
+from . import store as store_module
+from . import audit_log as audit_log_module
+from .store import Store
+from .portfolio import Portfolio
+from .event_log import ConcurrentModificationError
+from .audit_log import AuditLog, list_segments, read_segment
+from .metrics import metrics
+from .auth import AuthManager
+from .password_hasher import HasherOverloaded
+
+@contextmanager
+def _temp_backend(directory: str) -> Iterator[Store]:
+    """Point every Portfolio in this process at a fresh database and audit log, restoring the real ones after"""
+    saved = store_module._store, audit_log_module._audit_log
+    store_module._store = Store(os.path.join(directory, 'bench.db'), pool_size=16)
+    audit_log_module._audit_log = AuditLog(os.path.join(directory, 'audit'))
+    try:
+        yield store_module._store
+    finally:
+        audit_log_module._audit_log.close()
+        store_module._store, audit_log_module._audit_log = saved
+
+def _run_threads(n_threads: int, worker: Callable[[int], None]) -> float:
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def order_contention(
+    n_accounts: int = 1,
+    n_threads: int = 8,
+    orders_per_thread: int = 50,
+    price: float = 100.0,
+    cash: float = 100000
+) -> Dict[str, Any]:
+    """Fire concurrent buys at a few accounts and check nothing overdraws.
+
+    Thread ``i`` trades account ``i % n_accounts`` through its own Portfolio,
+    like a separate browser session, so threads sharing an account race on
+    its event stream while the others run independently. Cash is sized so
+    only some orders can fill; the rest must be rejected, never double spent.
+    """
+    with tempfile.TemporaryDirectory() as directory, _temp_backend(directory) as store:
+        usernames = [f"bench{i}" for i in range(n_accounts)]
+        for username in usernames:
+            store.create_account(username, {'email': f"{username}@example.com"}, cash)
+
+        fills = [0] * n_threads
+        aborted = [0] * n_threads
+        conflicts = [0] * n_threads
+
+        def worker(index: int):
+            portfolio = Portfolio(usernames[index % n_accounts])
+            for _ in range(orders_per_thread):
+                try:
+                    fills[index] += portfolio._execute_market_order('BENCH', 1, True, price)
+                except ConcurrentModificationError:
+                    aborted[index] += 1
+            conflicts[index] = portfolio.conflicts
+
+        elapsed = _run_threads(n_threads, worker)
+
+        final = [Portfolio(username).portfolio for username in usernames]
+        attempted = n_threads * orders_per_thread
+        filled = sum(fills)
+        # Every fill must be reflected exactly once, and no account may go negative
+        consistent = all(
+            state['cash'] >= 0 and abs(cash - state['cash'] - state['positions'].get('BENCH', 0) * price) < 1e-6
+            for state in final
+        ) and sum(state['positions'].get('BENCH', 0) for state in final) == filled
+
+        return {
+            'accounts': n_accounts,
+            'threads': n_threads,
+            'orders': attempted,
+            'filled': filled,
+            'rejected': attempted - filled - sum(aborted),
+            'aborted': sum(aborted),
+            'conflicts': sum(conflicts),
+            'orders_per_sec': attempted / elapsed,
+            'consistent': consistent,
+        }
+
+def audit_throughput(
+    n_sessions: int = 128,
+    orders_per_session: int = 500,
+    latency_budget: float = 0.002
+) -> Dict[str, Any]:
+    """Many sessions logging fills at once, each waiting for its group commit"""
+    fill = {
+        'timestamp': '2024-01-02T15:30:00', 'symbol': 'BENCH', 'type': 'buy',
+        'quantity': 10, 'price': 100.0, 'entry_price': 100.0
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        log = AuditLog(directory, latency_budget=latency_budget, segment_bytes=4 * 1024 * 1024)
+        metrics.counter('audit.records').reset()
+
+        def worker(index: int):
+            for _ in range(orders_per_session):
+                log.record(f"bench{index}", fill)
+
+        elapsed = _run_threads(n_sessions, worker)
+        log.close()
+
+        segments = list_segments(directory)
+        recovered = sum(1 for path in segments for _ in read_segment(path))
+        snapshot = metrics.snapshot()
+        return {
+            'sessions': n_sessions,
+            'records': n_sessions * orders_per_session,
+            'recovered': recovered,
+            'segments': len(segments),
+            'orders_per_sec': n_sessions * orders_per_session / elapsed,
+            'commit_latency_ms': snapshot['audit.commit_latency_ms'],
+            'batch_size': snapshot['audit.batch_size'],
+        }
+
+def login_flood(n_threads: int = 32, attempts_per_thread: int = 20) -> Dict[str, Any]:
+    """Bad-credential flood: half unknown usernames, half wrong passwords for a real user"""
+    with tempfile.TemporaryDirectory() as directory, _temp_backend(directory) as store:
+        # Skip the session-state setup in __init__, which needs a Streamlit script run
+        auth = AuthManager.__new__(AuthManager)
+        auth.store = store
+        store.create_account('flood', auth._new_password_fields('Correct1!'), 0)
+
+        latencies: Dict[str, List[float]] = {'unknown_user': [], 'wrong_password': []}
+        rejected = [0] * n_threads
+
+        def worker(index: int):
+            for n in range(attempts_per_thread):
+                kind = 'unknown_user' if n % 2 else 'wrong_password'
+                username = f"nobody{index}x{n}" if kind == 'unknown_user' else 'flood'
+                started = time.perf_counter()
+                try:
+                    assert auth._verify_credentials(username, 'Wrong1!') is None
+                except HasherOverloaded:
+                    rejected[index] += 1
+                    continue
+                latencies[kind].append(time.perf_counter() - started)
+
+        elapsed = _run_threads(n_threads, worker)
+        attempts = n_threads * attempts_per_thread
+        return {
+            'threads': n_threads,
+            'attempts': attempts,
+            'rejected': sum(rejected),
+            'attempts_per_sec': attempts / elapsed,
+            **{f"{kind}_ms": 1000 * sum(values) / max(len(values), 1) for kind, values in latencies.items()},
+            # What time.sleep(1) per unknown user alone would have cost this pool
+            'sleep_floor_sec': (attempts // 2) / n_threads,
+            'elapsed_sec': elapsed,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('benchmark', choices=['contention', 'audit', 'login-flood'])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=50, help="orders (or login attempts) per thread")
+    parser.add_argument('--latency-budget', type=float, default=0.002, help="audit group commit window (s)")
+    args = parser.parse_args()
+
+    if args.benchmark == 'contention':
+        # Same account (worst case), a few hot accounts, then one account per thread
+        for n_accounts in sorted({1, max(1, args.threads // 4), args.threads}):
+            # Cash for roughly half the orders each account receives
+            per_account = -(-args.threads // n_accounts) * args.orders
+            result = order_contention(n_accounts, args.threads, args.orders, cash=100.0 * (per_account // 2))
+            print(
+                f"accounts={result['accounts']:>3} threads={result['threads']:>3} "
+                f"filled={result['filled']:>5}/{result['orders']:<5} conflicts={result['conflicts']:>5} "
+                f"aborted={result['aborted']:>4} "
+                f"{result['orders_per_sec']:>8.0f} orders/s consistent={result['consistent']}"
+            )
+    elif args.benchmark == 'audit':
+        result = audit_throughput(args.threads, args.orders, args.latency_budget)
+        latency, batch = result['commit_latency_ms'], result['batch_size']
+        print(
+            f"sessions={result['sessions']} records={result['records']} recovered={result['recovered']} "
+            f"segments={result['segments']} {result['orders_per_sec']:.0f} orders/s"
+        )
+        print(f"commit latency ms: p50={latency['p50']:.2f} p90={latency['p90']:.2f} p99={latency['p99']:.2f}")
+        print(f"batch size: mean={batch['mean']:.0f} p50={batch['p50']:.0f} p99={batch['p99']:.0f}")
+    elif args.benchmark == 'login-flood':
+        result = login_flood(args.threads, args.orders)
+        print(
+            f"threads={result['threads']} attempts={result['attempts']} rejected={result['rejected']} "
+            f"{result['attempts_per_sec']:.0f} attempts/s in {result['elapsed_sec']:.1f}s "
+            f"(sleep-based floor {result['sleep_floor_sec']:.1f}s)"
+        )
+        print(f"mean latency ms: unknown user={result['unknown_user_ms']:.1f} wrong password={result['wrong_password_ms']:.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class LRUCache:
+    """Small thread-safe LRU mapping shared across Streamlit sessions"""
+
+    def __init__(self, max_size: int = 64):
+        self.max_size = max_size
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+def hash_key(*parts: Any) -> str:
+    """Stable digest of arrays, strings and numbers used as a memoization key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.tobytes() if hasattr(part, 'tobytes') else repr(part).encode())
+        digest.update(b'|')
+    return digest.hexdigest()
@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+# Days of actual returns a symbol needs before its estimates are used
+MIN_OBSERVATIONS = 20
+
+class CovarianceService:
+    """Incrementally maintained return covariance for a symbol universe.
+
+    Keeps an expanding sample estimate (Welford) and an exponentially weighted
+    one side by side; each new day of returns is an O(n^2) update instead of a
+    full recompute over the history. Missing returns are masked out rather
+    than read as zero: a symbol's mean and each pair's co-moment only move on
+    days the returns were observed.
+    """
+
+    def __init__(self, halflife: int = 63):
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.symbols: List[str] = []
+        self._index: Dict[str, int] = {}
+        self.count = 0
+        # Days with a real return per symbol, and per pair for the sample covariance
+        self.observations = np.zeros(0, dtype=int)
+        self.pair_counts = np.zeros((0, 0), dtype=int)
+        self.mean = np.zeros(0)
+        self.comoment = np.zeros((0, 0))
+        self.ewma_mean = np.zeros(0)
+        self.ewma_cov = np.zeros((0, 0))
+        self.last_date: Optional[pd.Timestamp] = None
+
+    def fit(self, returns: pd.DataFrame):
+        """Rebuild all state from a (dates x symbols) returns matrix.
+
+        Gives the same state as calling ``update`` on each row from empty,
+        computed in bulk.
+        """
+        observed = returns.notna().to_numpy()
+        x = np.where(observed, returns.to_numpy(dtype=float), 0.0)
+        mask = observed.astype(float)
+        self.symbols = list(returns.columns)
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+        self.count = len(x)
+        self.last_date = returns.index[-1] if len(returns) else None
+
+        # Welford from empty: each observation moves its symbol's running mean,
+        # and contributes with the (n - 1) / n factor of the update it would have had
+        counts = np.cumsum(observed, axis=0)
+        running_mean = np.cumsum(x, axis=0) / np.maximum(counts, 1)
+        previous_mean = np.vstack([np.zeros((1, x.shape[1])), running_mean[:-1]])
+        scale = np.sqrt(np.where(observed, (counts - 1) / np.maximum(counts, 1), 0.0))
+        scaled = np.where(observed, x - previous_mean, 0.0) * scale
+        self.observations = observed.sum(axis=0)
+        self.pair_counts = (mask.T @ mask).astype(int)
+        self.mean = running_mean[-1] if len(x) else np.zeros(x.shape[1])
+        self.comoment = scaled.T @ scaled
+
+        # The EWMA recursion starts from zero; each symbol's mean advances only when observed
+        ewma_mean = np.zeros(x.shape[1])
+        deviations = np.zeros_like(x)
+        for t in range(len(x)):
+            deviations[t] = np.where(observed[t], x[t] - ewma_mean, 0.0)
+            ewma_mean += self.alpha * deviations[t]
+        self.ewma_mean = ewma_mean
+
+        if (observed[1:] >= observed[:-1]).all():
+            # Once each symbol's history has started it never skips a day, so every
+            # pair decays on the same days and row t carries weight alpha * (1 - alpha)^(n - t)
+            weights = self.alpha * (1 - self.alpha) ** np.arange(len(x), 0, -1)
+            self.ewma_cov = (deviations * weights[:, None]).T @ deviations
+        else:
+            self.ewma_cov = np.zeros((x.shape[1], x.shape[1]))
+            for t in range(len(x)):
+                self._update_ewma_cov(deviations[t], np.outer(mask[t], mask[t]))
+
+    def _update_ewma_cov(self, delta: np.ndarray, both: np.ndarray):
+        # Pairs not observed together today neither decay nor accumulate
+        self.ewma_cov += both * self.alpha * ((1 - self.alpha) * np.outer(delta, delta) - self.ewma_cov)
+
+    def update(self, row: np.ndarray, as_of: pd.Timestamp):
+        """Fold one new day of returns into both estimates"""
+        row = np.asarray(row, dtype=float)
+        observed = np.isfinite(row)
+        mask = observed.astype(float)
+        self.count += 1
+        self.observations += observed
+        self.pair_counts += np.outer(observed, observed)
+
+        n = np.maximum(self.observations, 1)
+        delta = np.where(observed, row - self.mean, 0.0)
+        self.mean += delta / n
+        scaled = delta * np.sqrt((n - 1) / n) * mask
+        self.comoment += np.outer(scaled, scaled)
+
+        delta = np.where(observed, row - self.ewma_mean, 0.0)
+        self.ewma_mean += self.alpha * delta
+        self._update_ewma_cov(delta, np.outer(mask, mask))
+        self.last_date = as_of
+
+    def update_from(self, returns: pd.DataFrame):
+        """Apply every row of ``returns`` newer than the last update"""
+        if self.last_date is not None:
+            returns = returns.loc[returns.index > self.last_date]
+        for as_of, row in zip(returns.index, returns[self.symbols].to_numpy()):
+            self.update(row, as_of)
+
+    def knows(self, symbols: List[str]) -> bool:
+        """Whether every symbol is in the fitted universe"""
+        return all(s in self._index for s in symbols)
+
+    def covers(self, symbols: List[str], min_observations: int = MIN_OBSERVATIONS) -> bool:
+        """Whether every symbol has enough real history for its estimates to mean anything"""
+        return self.knows(symbols) and bool((self.observed(symbols) >= min_observations).all())
+
+    def observed(self, symbols: List[str]) -> np.ndarray:
+        """Days with a real return per symbol"""
+        return self.observations[[self._index[s] for s in symbols]]
+
+    def snapshot(self, symbols: List[str]) -> 'CovarianceService':
+        """Independent copy restricted to ``symbols``, which later fits and updates cannot change.
+
+        Only the requested rows and columns are copied; symbols outside the
+        universe are left out, so ``covers`` on the copy reports them.
+        """
+        known = [s for s in dict.fromkeys(symbols) if s in self._index]
+        idx = [self._index[s] for s in known]
+        pairs = np.ix_(idx, idx)
+        snapshot = CovarianceService.__new__(CovarianceService)
+        snapshot.alpha = self.alpha
+        snapshot.symbols = known
+        snapshot._index = {s: i for i, s in enumerate(known)}
+        snapshot.count = self.count
+        snapshot.observations = self.observations[idx]
+        snapshot.pair_counts = self.pair_counts[pairs]
+        snapshot.mean = self.mean[idx]
+        snapshot.comoment = self.comoment[pairs]
+        snapshot.ewma_mean = self.ewma_mean[idx]
+        snapshot.ewma_cov = self.ewma_cov[pairs]
+        snapshot.last_date = self.last_date
+        return snapshot
+
+    def expected_returns(self, symbols: List[str]) -> np.ndarray:
+        """Mean daily return per symbol over the days it was observed"""
+        return self.mean[[self._index[s] for s in symbols]]
+
+    def covariance(self, symbols: List[str], kind: str = 'ewma') -> pd.DataFrame:
+        """Daily return covariance sub-matrix for ``symbols``"""
+        idx = np.ix_(*[[self._index[s] for s in symbols]] * 2)
+        if kind == 'ewma':
+            sub = self.ewma_cov[idx]
+        else:
+            # Each pair is normalized by the days both were observed
+            sub = self.comoment[idx] / np.maximum(self.pair_counts[idx] - 1, 1)
+        return pd.DataFrame(sub, index=symbols, columns=symbols)
+
+    def correlation(self, symbols: List[str], kind: str = 'ewma') -> pd.DataFrame:
+        cov = self.covariance(symbols, kind)
+        std = np.sqrt(np.diag(cov.to_numpy()))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov.to_numpy() / np.outer(std, std)
+        np.fill_diagonal(corr, 1.0)
+        return pd.DataFrame(np.nan_to_num(corr), index=symbols, columns=symbols)
@@ -0,0 +1,118 @@
+import copy
+import sqlite3
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+SNAPSHOT_INTERVAL = 100
+
+Event = Tuple[str, Dict[str, Any]]
+
+class ConcurrentModificationError(Exception):
+    """Another writer appended to the account since its state was loaded"""
+
+def empty_state() -> Dict[str, Any]:
+    return {
+        'cash': 0.0,
+        'positions': {},
+        'pending_orders': [],
+        'target_weights': {},
+        'version': 0,
+        'created_at': None
+    }
+
+def apply_event(state: Dict[str, Any], event_type: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold one event into portfolio state in place"""
+    if event_type == 'opened':
+        state['created_at'] = payload['created_at']
+    elif event_type == 'deposit':
+        state['cash'] += payload['amount']
+    elif event_type == 'fill':
+        signed = payload['quantity'] if payload['side'] == 'buy' else -payload['quantity']
+        state['cash'] -= signed * payload['price']
+        quantity = state['positions'].get(payload['symbol'], 0) + signed
+        if quantity:
+            state['positions'][payload['symbol']] = quantity
+        else:
+            state['positions'].pop(payload['symbol'], None)
+    elif event_type == 'fee':
+        state['cash'] -= payload['amount']
+    elif event_type == 'order_placed':
+        state['pending_orders'].append(payload['order'])
+    elif event_type == 'order_cancelled':
+        state['pending_orders'] = [
+            o for o in state['pending_orders'] if o.get('order_id') != payload['order_id']
+        ]
+    elif event_type == 'targets_set':
+        state['target_weights'] = payload['target_weights']
+    else:
+        raise ValueError(f"Unknown portfolio event: {event_type}")
+    state['version'] += 1
+    return state
+
+class PortfolioEventLog:
+    """Append-only portfolio history with periodic snapshots.
+
+    Current state is the latest snapshot plus a replay of at most
+    SNAPSHOT_INTERVAL events, and state as of any timestamp is the nearest
+    earlier snapshot plus the events up to that instant.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def _replay(self, snapshot: Optional[Dict[str, Any]], events: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if snapshot is None and not events:
+            return None
+        state = snapshot['state'] if snapshot else empty_state()
+        for event in events:
+            apply_event(state, event['event_type'], event['payload'])
+        return state
+
+    def load(self, username: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.store.get_latest_snapshot(username)
+        events = self.store.get_events(username, after_seq=snapshot['seq'] if snapshot else 0)
+        return self._replay(snapshot, events)
+
+    def catch_up(self, username: str, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Bring a possibly stale state up to date by replaying only the newer events"""
+        events = self.store.get_events(username, after_seq=state['version'])
+        return self._replay({'state': copy.deepcopy(state)}, events)
+
+    def state_as_of(self, username: str, as_of: datetime) -> Optional[Dict[str, Any]]:
+        timestamp = as_of.isoformat()
+        snapshot = self.store.get_latest_snapshot(username, as_of=timestamp)
+        events = self.store.get_events(
+            username, after_seq=snapshot['seq'] if snapshot else 0, as_of=timestamp
+        )
+        return self._replay(snapshot, events)
+
+    def append(
+        self,
+        username: str,
+        state: Dict[str, Any],
+        events: List[Event],
+        transaction: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Apply ``events`` to ``state`` and persist them, returning the new state.
+
+        The account version is the sequence number of its last event, so the
+        insert doubles as a compare-and-swap: it only succeeds if no one else
+        appended after ``state['version']``. On conflict the caller's state is
+        left untouched and ConcurrentModificationError is raised.
+        """
+        new_state = copy.deepcopy(state)
+        for event_type, payload in events:
+            apply_event(new_state, event_type, payload)
+
+        # Snapshot whenever this batch crosses an interval boundary
+        snapshot = None
+        if new_state['version'] // SNAPSHOT_INTERVAL > state['version'] // SNAPSHOT_INTERVAL:
+            snapshot = new_state
+
+        try:
+            self.store.append_events(username, state['version'], events, transaction, snapshot)
+        except sqlite3.IntegrityError as e:
+            if 'portfolio_events' not in str(e):
+                raise
+            raise ConcurrentModificationError(f"{username} changed after version {state['version']}") from e
+        return new_state
@@ -0,0 +1,82 @@
+import csv
+import os
+import tempfile
+from typing import Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+EXPORT_COLUMNS = ['timestamp', 'symbol', 'type', 'quantity', 'price', 'entry_price', 'profit_loss']
+EXPORT_FORMATS = ['csv', 'parquet'] if pq is not None else ['csv']
+# Streamlit serves downloads from memory, so larger exports are refused instead of loaded
+MAX_DOWNLOAD_BYTES = 50 * 1024 * 1024
+
+def iter_export_rows(
+    store,
+    username: str,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    symbols: Optional[List[str]] = None,
+    batch_size: int = 5000
+) -> Iterator[List[tuple]]:
+    """Filtered ledger batches with realized P/L, one batch in memory at a time"""
+    for rows in store.iter_transactions(username, start, end, symbols, batch_size):
+        yield [
+            (
+                row['timestamp'], row['symbol'], row['type'], row['quantity'], row['price'], row['entry_price'],
+                (row['price'] - row['entry_price']) * row['quantity'] if row['type'] == 'sell' else 0.0
+            )
+            for row in rows
+        ]
+
+def write_csv(batches: Iterator[List[tuple]], path: str):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for batch in batches:
+            writer.writerows(batch)
+
+def write_parquet(batches: Iterator[List[tuple]], path: str):
+    """Write each batch as its own row group"""
+    if pq is None:
+        raise RuntimeError("Parquet export requires pyarrow")
+    schema = pa.schema([
+        ('timestamp', pa.string()),
+        ('symbol', pa.string()),
+        ('type', pa.string()),
+        ('quantity', pa.int64()),
+        ('price', pa.float64()),
+        ('entry_price', pa.float64()),
+        ('profit_loss', pa.float64()),
+    ])
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema
+            ))
+
+def export_transactions(
+    store,
+    username: str,
+    fmt: str = 'csv',
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    symbols: Optional[List[str]] = None
+) -> str:
+    """Stream the filtered ledger to a temporary file and return its path"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    fd, path = tempfile.mkstemp(prefix=f"{username}-transactions-", suffix=f".{fmt}")
+    os.close(fd)
+    batches = iter_export_rows(store, username, start, end, symbols)
+    try:
+        (write_parquet if fmt == 'parquet' else write_csv)(batches, path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
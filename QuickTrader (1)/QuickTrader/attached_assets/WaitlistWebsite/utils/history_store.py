@@ -0,0 +1,93 @@
+import streamlit as st
+import yfinance as yf
+import pandas as pd
+import threading
+from datetime import date
+from typing import List, Optional
+from .covariance import CovarianceService
+
+BENCHMARK_SYMBOL = 'SPY'
+
+class HistoryStore:
+    """Process-wide cache of daily closes as a (dates x symbols) matrix"""
+
+    def __init__(self, period: str = '10y'):
+        self.period = period
+        self._closes = pd.DataFrame()
+        self._as_of: Optional[date] = None
+        self._lock = threading.Lock()
+        self.covariance = CovarianceService()
+        self._covariance_lock = threading.Lock()
+
+    def _download(self, symbols: List[str], period: str) -> pd.DataFrame:
+        try:
+            closes = yf.download(symbols, period=period, progress=False, auto_adjust=True)['Close']
+        except Exception:
+            return pd.DataFrame()
+        if isinstance(closes, pd.Series):
+            closes = closes.to_frame(symbols[0])
+        closes.index = pd.to_datetime(closes.index).tz_localize(None).normalize()
+        return closes
+
+    def _refresh(self):
+        """Append the latest sessions for every cached symbol once per day"""
+        if self._as_of == date.today() or self._closes.empty:
+            self._as_of = date.today()
+            return
+        recent = self._download(list(self._closes.columns), '5d')
+        if not recent.empty:
+            self._closes = recent.combine_first(self._closes).sort_index()
+        self._as_of = date.today()
+
+    def get_close_matrix(self, symbols: List[str], start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Daily closes for the given symbols, downloading only what is missing"""
+        symbols = sorted(set(symbols))
+        with self._lock:
+            self._refresh()
+            missing = [s for s in symbols if s not in self._closes.columns]
+            if missing:
+                fetched = self._download(missing, self.period)
+                if not fetched.empty:
+                    self._closes = self._closes.join(fetched, how='outer').sort_index()
+            closes = self._closes.reindex(columns=symbols)
+
+        if start is not None:
+            closes = closes.loc[pd.Timestamp(start).normalize():]
+        return closes.ffill()
+
+    def get_returns_matrix(self, symbols: List[str], start: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """Daily simple returns for the given symbols"""
+        return self.get_close_matrix(symbols, start).pct_change().iloc[1:]
+
+    def get_covariance_service(self, symbols: List[str]) -> CovarianceService:
+        """Snapshot of the covariance state for ``symbols``, brought up to the latest session.
+
+        The shared state is only touched under the lock; callers get a copy, so
+        a concurrent refit cannot change it while they read. Check ``covers``
+        before use, since symbols without enough history stay uncovered.
+        """
+        with self._covariance_lock:
+            service = self.covariance
+            if service.covers(symbols) and service.last_date == self.market_date and self._as_of == date.today():
+                return service.snapshot(symbols)
+
+            universe = sorted(set(service.symbols) | set(symbols))
+            returns = self.get_returns_matrix(universe)
+            incremental = service.knows(symbols) and service.last_date is not None
+            if incremental and not service.covers(symbols):
+                # History missing at the last fit, e.g. after a failed download, only counts after a rebuild
+                incremental = bool((returns[symbols].notna().sum().to_numpy() <= service.observed(symbols)).all())
+            if incremental:
+                service.update_from(returns)
+            else:
+                # A new symbol widens the universe, so rebuild once from full history
+                service.fit(returns)
+            return service.snapshot(symbols)
+
+    @property
+    def market_date(self) -> Optional[pd.Timestamp]:
+        return None if self._closes.empty else self._closes.index[-1]
+
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    return HistoryStore()
@@ -0,0 +1,91 @@
+import bisect
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from .cache import LRUCache
+
+CHECKPOINT_INTERVAL = 64
+
+class LedgerIndex:
+    """Time index over an account's cash and position changes.
+
+    Entries are kept in event order with their timestamps, a running cash
+    balance and a copy of all positions every CHECKPOINT_INTERVAL entries.
+    Holdings as of an instant are one bisect plus at most one interval of
+    deltas on top of the nearest checkpoint.
+    """
+
+    _indexes = LRUCache(max_size=256)
+
+    def __init__(self):
+        self.seq = 0
+        self.timestamps: List[str] = []
+        self.cash: List[float] = []
+        self._changes: List[Tuple[str, int]] = []
+        self._checkpoints: List[Dict[str, int]] = [{}]
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_account(cls, store, username: str, created_at: Optional[str]) -> 'LedgerIndex':
+        """Shared index for ``username``, extended with any events since it was last used.
+
+        Indexes are keyed by the account's creation time as well, so a deleted
+        and re-registered username never picks up the old account's index.
+        """
+        key = (username, created_at)
+        index = cls._indexes.get(key)
+        if index is None:
+            index = cls()
+            cls._indexes.set(key, index)
+        with index._lock:
+            events = store.get_events(username, after_seq=index.seq)
+            if index.seq == 0 and (not events or events[0]['seq'] > 1):
+                # Accounts migrated from the old portfolios table begin at a snapshot
+                snapshot = store.get_latest_snapshot(username, as_of=events[0]['timestamp'] if events else None)
+                if snapshot is not None:
+                    index.seed(snapshot['state'])
+            index.extend(events)
+        return index
+
+    def seed(self, state: Dict[str, Any]):
+        """Start from a snapshot whose history is unknown, dated at account creation"""
+        timestamp = state['created_at'] or ''
+        self._add(timestamp, state['cash'])
+        for symbol, quantity in state['positions'].items():
+            self._add(timestamp, 0.0, symbol, quantity)
+        self.seq = state['version']
+
+    def _add(self, timestamp: str, cash_delta: float, symbol: str = '', quantity: int = 0):
+        self.timestamps.append(timestamp)
+        self.cash.append((self.cash[-1] if self.cash else 0.0) + cash_delta)
+        self._changes.append((symbol, quantity))
+        if quantity:
+            self._positions[symbol] = self._positions.get(symbol, 0) + quantity
+        if len(self._changes) % CHECKPOINT_INTERVAL == 0:
+            self._checkpoints.append({s: q for s, q in self._positions.items() if q})
+
+    def extend(self, events: List[Dict[str, Any]]):
+        """Index events in sequence order; events that move no cash or shares are skipped"""
+        for event in events:
+            self.seq = event['seq']
+            payload = event['payload']
+            if event['event_type'] == 'deposit':
+                self._add(event['timestamp'], payload['amount'])
+            elif event['event_type'] == 'fee':
+                self._add(event['timestamp'], -payload['amount'])
+            elif event['event_type'] == 'fill':
+                signed = payload['quantity'] if payload['side'] == 'buy' else -payload['quantity']
+                self._add(event['timestamp'], -signed * payload['price'], payload['symbol'], signed)
+
+    def holdings_as_of(self, timestamp: str) -> Tuple[float, Dict[str, int]]:
+        """Cash and positions after every entry at or before ``timestamp`` (ISO format)"""
+        with self._lock:
+            count = bisect.bisect_right(self.timestamps, timestamp)
+            if count == 0:
+                return 0.0, {}
+            checkpoint = count // CHECKPOINT_INTERVAL
+            positions = dict(self._checkpoints[checkpoint])
+            for symbol, quantity in self._changes[checkpoint * CHECKPOINT_INTERVAL:count]:
+                if quantity:
+                    positions[symbol] = positions.get(symbol, 0) + quantity
+            return self.cash[count - 1], {s: q for s, q in positions.items() if q}
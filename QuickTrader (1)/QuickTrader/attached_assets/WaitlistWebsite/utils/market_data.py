@@ -1,6 +1,12 @@
+import streamlit as st
 import yfinance as yf
 import pandas as pd
+from typing import Dict, List
 from datetime import datetime, timedelta
+from .store import get_store
+
+# Sector and name change rarely, so cached fundamentals are reused for a week
+FUNDAMENTALS_TTL = timedelta(days=7)
 
 class MarketData:
     @staticmethod
@@ -35,3 +41,33 @@ class MarketData:
             return stock.info.get('currentPrice', 0)
         except:
             return 0
+
+    @staticmethod
+    def get_current_prices(symbols: List[str]) -> Dict[str, float]:
+        """Get the latest close for many symbols with a single download"""
+        symbols = sorted(set(symbols))
+        if not symbols:
+            return {}
+        try:
+            closes = yf.download(symbols, period='5d', progress=False)['Close']
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(symbols[0])
+            latest = closes.ffill().iloc[-1]
+            return {s: float(latest[s]) for s in symbols if s in latest and pd.notna(latest[s])}
+        except:
+            return {s: MarketData.get_current_price(s) for s in symbols}
+
+    @staticmethod
+    def get_sectors(symbols: List[str]) -> Dict[str, str]:
+        """Sector per symbol from the shared fundamentals cache, fetching only stale or missing ones"""
+        symbols = sorted(set(symbols))
+        store = get_store()
+        cached = store.get_fundamentals(symbols, (datetime.now() - FUNDAMENTALS_TTL).isoformat())
+        fetched = {s: MarketData.get_stock_info(s) for s in symbols if s not in cached}
+        fetched = {s: info for s, info in fetched.items() if info}
+        if fetched:
+            store.save_fundamentals(fetched)
+        return {
+            s: (cached.get(s) or fetched.get(s) or {}).get('sector') or 'Unknown'
+            for s in symbols
+        }
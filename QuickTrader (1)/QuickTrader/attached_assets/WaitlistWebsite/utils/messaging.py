@@ -0,0 +1,116 @@
+import atexit
+import os
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import Message
+from typing import Iterator, Optional
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
+# Idle SMTP connections older than this are probed with NOOP before reuse
+SMTP_IDLE_CHECK = 30.0
+
+_twilio_client: Optional[Client] = None
+_twilio_lock = threading.Lock()
+
+def get_twilio_client() -> Client:
+    """Process-wide Twilio client whose HTTP session keeps connections alive between sends"""
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_lock:
+            if _twilio_client is None:
+                _twilio_client = Client(
+                    os.environ['TWILIO_ACCOUNT_SID'],
+                    os.environ['TWILIO_AUTH_TOKEN'],
+                    http_client=TwilioHttpClient(pool_connections=True, max_retries=3)
+                )
+    return _twilio_client
+
+class SMTPPool:
+    """Logged-in SMTP connections reused across messages.
+
+    Each connection pays for its TLS handshake and login once. A connection
+    the server has dropped is replaced and the message sent again, once.
+    """
+
+    def __init__(self, username: str, password: str, host: str = SMTP_HOST, port: int = SMTP_PORT, size: int = 4):
+        self.username = username
+        self.password = password
+        self.host = host
+        self.port = port
+        self._idle: 'queue.LifoQueue[tuple[smtplib.SMTP, float]]' = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.starttls()
+        server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - idle_since < SMTP_IDLE_CHECK:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(server)
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except BaseException:
+                self._discard(server)
+                raise
+            self._idle.put((server, time.monotonic()))
+
+    def send_message(self, msg: Message):
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The pooled connection went stale mid-send; the retry gets a fresh one
+            with self.connection() as server:
+                server.send_message(msg)
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(server)
+
+_smtp_pool: Optional[SMTPPool] = None
+_smtp_lock = threading.Lock()
+
+def get_smtp_pool() -> SMTPPool:
+    """Process-wide SMTP pool for the configured account, closed at exit"""
+    global _smtp_pool
+    if _smtp_pool is None:
+        with _smtp_lock:
+            if _smtp_pool is None:
+                _smtp_pool = SMTPPool(os.environ['SMTP_USERNAME'], os.environ['SMTP_PASSWORD'])
+                atexit.register(_smtp_pool.close)
+    return _smtp_pool
@@ -0,0 +1,98 @@
+import bisect
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+def _log_buckets(low: float, high: float, per_decade: int = 10) -> List[float]:
+    bounds, bound = [], low
+    while bound < high:
+        bounds.append(bound)
+        bound *= 10 ** (1 / per_decade)
+    return bounds + [high]
+
+class Histogram:
+    """Fixed log-spaced buckets, cheap enough to observe on every request"""
+
+    def __init__(self, low: float = 0.01, high: float = 10000.0):
+        self.bounds = _log_buckets(low, high)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, n: int = 1):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += n
+            self.total += value * n
+            self.count += n
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (q in 0..100)"""
+        with self._lock:
+            counts, count = list(self.counts), self.count
+        if not count:
+            return 0.0
+        rank, seen = q / 100 * count, 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max_bucket': self.percentile(100),
+        }
+
+class Counter:
+    """Monotonic count with its average rate since creation or the last reset"""
+
+    def __init__(self):
+        self.value = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def inc(self, n: int = 1):
+        with self._lock:
+            self.value += n
+
+    def reset(self):
+        with self._lock:
+            self.value = 0
+            self.started = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {'count': self.value, 'per_sec': self.value / elapsed if elapsed > 0 else 0.0}
+
+class MetricsRegistry:
+    """Named counters and histograms shared by the whole process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, name: str, factory):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, factory())
+        return metric
+
+    def histogram(self, name: str, low: Optional[float] = None, high: Optional[float] = None) -> Histogram:
+        bounds = {k: v for k, v in (('low', low), ('high', high)) if v is not None}
+        return self._get(name, lambda: Histogram(**bounds))
+
+    def counter(self, name: str) -> Counter:
+        return self._get(name, Counter)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+metrics = MetricsRegistry()
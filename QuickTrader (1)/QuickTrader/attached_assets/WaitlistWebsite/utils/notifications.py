@@ -2,6 +2,7 @@ import streamlit as st
 from datetime import datetime
 from typing import List, Dict, Optional
 from .verification import Verification
+from .store import get_store
 
 class NotificationManager:
     def __init__(self):
@@ -34,18 +35,19 @@ class NotificationManager:
         st.session_state.notifications[username].append(notification)
 
         # Send external notifications if requested
-        if send_email and username in st.session_state.users:
-            user_email = st.session_state.users[username].get('email')
+        user = get_store().get_user(username) if (send_email or send_sms) else None
+        if send_email and user:
+            user_email = user.get('email')
             if user_email:
                 self.verification.send_email_verification(
                     user_email,
                     f"Velasa Trading Notification: {message}"
                 )
 
-        if send_sms and username in st.session_state.users:
-            user_phone = st.session_state.users[username].get('phone')
+        if send_sms and user:
+            user_phone = user.get('phone')
             if user_phone:
-                self.verification.send_sms_otp(
+                self.verification.send_sms(
                     user_phone,
                     f"Velasa Trading: {message}"
                 )
@@ -0,0 +1,162 @@
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from .store import get_store
+from .metrics import metrics
+from .verification import Verification
+
+# Delivery is retried with exponential backoff until this many attempts have failed
+MAX_ATTEMPTS = 6
+BASE_DELAY = 2.0
+MAX_DELAY = 10 * 60
+# How long a worker may hold a message before another may claim it
+LEASE = 60.0
+
+logger = logging.getLogger(__name__)
+
+class StubTransport:
+    """Records messages instead of sending them, for local runs and tests.
+
+    The first ``fail_first`` deliveries of every message fail, to exercise
+    retries.
+    """
+
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.sent: List[Tuple[str, str, Dict]] = []
+        self._failures: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def deliver(self, kind: str, recipient: str, payload: Dict) -> Tuple[bool, str]:
+        with self._lock:
+            failures = self._failures.get((kind, recipient), 0)
+            if failures < self.fail_first:
+                self._failures[(kind, recipient)] = failures + 1
+                return False, "Simulated delivery failure"
+            self.sent.append((kind, recipient, payload))
+        return True, "Delivered to stub transport"
+
+class Outbox:
+    """Durable queue of outbound email and SMS, delivered by background workers.
+
+    Messages are committed to the store before the request that produced
+    them returns, then leased to a small worker pool. A failed delivery is
+    rescheduled with jittered exponential backoff, and each message carries an
+    idempotency key so retried requests do not queue it twice. A worker
+    dying between sending and recording success means a message may be sent
+    twice, never lost.
+    """
+
+    def __init__(self, transport, store=None, workers: int = 4, batch_size: int = 8, poll_interval: float = 1.0):
+        self.transport = transport
+        self.store = store or get_store()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Condition()
+        # Soonest retry scheduled by this process, so idle workers wake in time for it
+        self._next_retry = float('inf')
+        self._closed = False
+
+        self._latency = metrics.histogram('outbox.delivery_ms')
+        self._sent = metrics.counter('outbox.sent')
+        self._retried = metrics.counter('outbox.retried')
+        self._failed = metrics.counter('outbox.failed')
+        self._errors = metrics.counter('outbox.worker_errors')
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f'outbox-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(self, messages: List[Dict[str, Any]]) -> int:
+        """Queue messages with ``idempotency_key``, ``kind``, ``recipient``, ``payload`` and ``username``"""
+        now = time.time()
+        queued = self.store.enqueue_messages([
+            {'username': None, **message, 'next_attempt_at': now, 'created_at': now}
+            for message in messages
+        ])
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return queued
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(BASE_DELAY * 2 ** (attempts - 1), MAX_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, message: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            success, error = self.transport.deliver(message['kind'], message['recipient'], message['payload'])
+        except Exception as e:
+            success, error = False, str(e)
+        self._latency.observe((time.perf_counter() - started) * 1000)
+
+        if success:
+            self.store.finish_message(message['id'], 'sent', now=time.time())
+            self._sent.inc()
+        elif message['attempts'] >= MAX_ATTEMPTS:
+            self.store.finish_message(message['id'], 'failed', error)
+            self._failed.inc()
+        else:
+            next_attempt_at = time.time() + self._backoff(message['attempts'])
+            self.store.retry_message(message['id'], next_attempt_at, error)
+            self._retried.inc()
+            with self._wakeup:
+                self._next_retry = min(self._next_retry, next_attempt_at)
+
+    def _run(self):
+        while not self._closed:
+            try:
+                messages = self.store.claim_messages(time.time(), self.batch_size, LEASE)
+                for message in messages:
+                    self._deliver(message)
+            except Exception:
+                # e.g. the database is locked; unfinished messages are reclaimed once their lease ends
+                self._errors.inc()
+                logger.exception("Outbox worker error, backing off")
+                with self._wakeup:
+                    if not self._closed:
+                        self._wakeup.wait(self.poll_interval)
+                continue
+            if not messages:
+                # Woken early by enqueue; the timeout picks up retries and other processes' messages
+                with self._wakeup:
+                    if not self._closed:
+                        self._wakeup.wait(min(self.poll_interval, max(self._next_retry - time.time(), 0)))
+                    if self._next_retry <= time.time():
+                        self._next_retry = float('inf')
+
+    def status(self, username: str) -> Dict[str, str]:
+        """Latest delivery status of each kind of message sent to ``username``"""
+        return {row['kind']: row['status'] for row in self.store.get_message_status(username)}
+
+    def close(self):
+        """Stop the workers once their current messages are done; queued ones wait for the next start"""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+_outbox: Optional[Outbox] = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> Outbox:
+    """Process-wide outbox; VELASA_OUTBOX_TRANSPORT=stub records messages instead of sending them"""
+    global _outbox
+    if _outbox is None:
+        with _outbox_lock:
+            if _outbox is None:
+                if os.environ.get('VELASA_OUTBOX_TRANSPORT') == 'stub':
+                    transport = StubTransport()
+                else:
+                    transport = Verification()
+                _outbox = Outbox(transport)
+                atexit.register(_outbox.close)
+    return _outbox
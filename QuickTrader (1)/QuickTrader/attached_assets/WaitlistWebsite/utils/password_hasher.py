@@ -0,0 +1,115 @@
+import hashlib
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Optional
+from .metrics import metrics
+
+# Cost of every hash written before calibration; users without an 'iterations' field have it
+LEGACY_ITERATIONS = 100000
+# Calibration never goes below this, however slow the host
+MIN_ITERATIONS = 50000
+TARGET_HASH_MS = float(os.environ.get('VELASA_HASH_TARGET_MS', 50))
+# Stored costs this close to the calibrated one are left alone, so processes that
+# calibrate slightly differently do not keep re-hashing the same users
+REHASH_TOLERANCE = 0.25
+
+def calibrate_iterations(target_ms: float = TARGET_HASH_MS, probe_iterations: int = 20000, rounds: int = 5) -> int:
+    """PBKDF2-SHA256 iteration count that takes about ``target_ms`` on this host"""
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hashlib.pbkdf2_hmac('sha256', b'calibration', b'calibration-salt', probe_iterations)
+        timings.append(time.perf_counter() - started)
+    per_iteration_ms = statistics.median(timings) * 1000 / probe_iterations
+    iterations = int(target_ms / per_iteration_ms) // 10000 * 10000
+    return max(iterations, MIN_ITERATIONS)
+
+def derive_key(password: str, salt: str, iterations: int) -> str:
+    """Hex PBKDF2-SHA256 digest; module level so bulk provisioning can run it in worker processes"""
+    return hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations).hex()
+
+class HasherOverloaded(Exception):
+    """Raised instead of queueing when the hashing pool is full, or a queued hash times out"""
+
+class PasswordHasher:
+    """PBKDF2 on a small dedicated pool instead of the script thread.
+
+    hashlib releases the GIL while deriving keys, so a thread pool runs hashes
+    in parallel without blocking page renders in other sessions; capping the
+    workers leaves the remaining cores for everything else. At most
+    ``max_workers + max_queue`` hashes are admitted, and callers beyond that
+    are rejected immediately instead of piling up behind a login spike.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_queue: int = 32,
+        timeout: float = 10.0,
+        iterations: Optional[int] = None
+    ):
+        # New hashes use a cost measured on this host at startup
+        self.iterations = iterations or calibrate_iterations()
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 2) // 2)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(self.max_workers + max_queue)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+        self._queue_depth = metrics.histogram('auth.hash_queue_depth', low=1, high=10000)
+        self._wait = metrics.histogram('auth.hash_wait_ms')
+        self._duration = metrics.histogram('auth.hash_ms')
+        self._rejected = metrics.counter('auth.hash_rejected')
+        self._timeouts = metrics.counter('auth.hash_timeouts')
+
+    def _derive(self, password: str, salt: str, iterations: int, enqueued: float) -> str:
+        started = time.perf_counter()
+        self._wait.observe((started - enqueued) * 1000)
+        try:
+            return derive_key(password, salt, iterations)
+        finally:
+            self._duration.observe((time.perf_counter() - started) * 1000)
+
+    def _release(self, _future):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def needs_rehash(self, iterations: int) -> bool:
+        return abs(iterations - self.iterations) > REHASH_TOLERANCE * self.iterations
+
+    def hash(self, password: str, salt: str, iterations: Optional[int] = None) -> str:
+        """Hex PBKDF2 digest, at the calibrated cost unless ``iterations`` is given"""
+        iterations = iterations or self.iterations
+        if not self._slots.acquire(blocking=False):
+            self._rejected.inc()
+            raise HasherOverloaded("Password hashing queue is full")
+        with self._lock:
+            self._pending += 1
+            self._queue_depth.observe(self._pending)
+        future = self._pool.submit(self._derive, password, salt, iterations, time.perf_counter())
+        future.add_done_callback(self._release)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # A hash still waiting for a worker gives its slot back; one already running finishes unobserved
+            future.cancel()
+            self._timeouts.inc()
+            raise HasherOverloaded("Password hashing timed out") from None
+
+_hasher: Optional[PasswordHasher] = None
+_hasher_lock = threading.Lock()
+
+def get_password_hasher() -> PasswordHasher:
+    """Process-wide hashing pool shared by every session"""
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+from .cache import LRUCache
+
+class PnLAttribution:
+    """Realized and unrealized P/L over a columnar ledger.
+
+    Cost basis follows the ledger's own rule: a sale's entry price is the
+    average of every earlier buy of that symbol. All series are built from
+    grouped cumulative sums, with no per-row Python.
+    """
+
+    _cache = LRUCache(max_size=128)
+
+    @staticmethod
+    def trade_pnl(ledger: pd.DataFrame) -> pd.DataFrame:
+        """Per-trade realized P/L and its running total, oldest trade first"""
+        trades = ledger.sort_values('timestamp', kind='stable').reset_index(drop=True)
+        is_sell = (trades['type'] == 'sell').to_numpy()
+        trades['profit_loss'] = np.where(
+            is_sell, (trades['price'] - trades['entry_price']) * trades['quantity'], 0.0
+        )
+        trades['cumulative_pl'] = trades['profit_loss'].cumsum()
+        return trades
+
+    @staticmethod
+    def daily_pnl(trades: pd.DataFrame, closes: pd.DataFrame) -> pd.DataFrame:
+        """Realized, unrealized and total P/L at each close in ``closes``"""
+        is_buy = (trades['type'] == 'buy').to_numpy()
+        quantity = trades['quantity'].to_numpy(dtype=float)
+        by_symbol = trades.assign(
+            signed=np.where(is_buy, quantity, -quantity),
+            buy_qty=np.where(is_buy, quantity, 0.0),
+            buy_cost=np.where(is_buy, quantity * trades['price'].to_numpy(), 0.0)
+        ).groupby('symbol')[['signed', 'buy_qty', 'buy_cost']].cumsum()
+
+        dates = pd.to_datetime(trades['timestamp']).dt.normalize()
+        # State of each symbol after its last trade of the day, placed on the next close
+        state = pd.DataFrame({
+            'date': closes.index[np.minimum(closes.index.searchsorted(dates), len(closes) - 1)],
+            'symbol': trades['symbol'],
+            'holdings': by_symbol['signed'],
+            'avg_cost': by_symbol['buy_cost'] / by_symbol['buy_qty'].where(by_symbol['buy_qty'] > 0)
+        }).groupby(['date', 'symbol']).last()
+
+        holdings = state['holdings'].unstack().reindex(index=closes.index, columns=closes.columns).ffill().fillna(0)
+        avg_cost = state['avg_cost'].unstack().reindex(index=closes.index, columns=closes.columns).ffill().fillna(0)
+        unrealized = (holdings * (closes - avg_cost)).fillna(0).sum(axis=1)
+
+        realized = trades['profit_loss'].groupby(
+            closes.index[np.minimum(closes.index.searchsorted(dates), len(closes) - 1)]
+        ).sum().reindex(closes.index, fill_value=0.0).cumsum()
+
+        return pd.DataFrame({
+            'realized': realized,
+            'unrealized': unrealized,
+            'total': realized + unrealized
+        })
+
+    def get_cached(self, cache_key: Any) -> Optional[Dict[str, Any]]:
+        """Look up a result before paying to load the ledger"""
+        return self._cache.get(cache_key)
+
+    def compute(self, cache_key: Any, ledger: pd.DataFrame, closes: pd.DataFrame) -> Dict[str, Any]:
+        """Trade and daily P/L, memoized under ``cache_key`` (which should include the ledger length)"""
+        trades = self.trade_pnl(ledger)
+        result = {
+            'trades': trades,
+            'daily': self.daily_pnl(trades, closes) if not closes.empty else pd.DataFrame()
+        }
+        self._cache.set(cache_key, result)
+        return result
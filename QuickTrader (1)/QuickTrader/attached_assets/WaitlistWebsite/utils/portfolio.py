@@ -1,19 +1,103 @@
 import streamlit as st
+import logging
+import random
+import secrets
+import time
 from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
+import numpy as np
 import pandas as pd
 from .market_data import MarketData
+from .history_store import get_history_store, BENCHMARK_SYMBOL
+from .risk_metrics import RiskMetrics
+from .value_at_risk import MonteCarloVaR
+from .rebalancer import Rebalancer
+from .store import get_store
+from .event_log import PortfolioEventLog, Event, ConcurrentModificationError
+from .audit_log import get_audit_log
+from .ledger_index import LedgerIndex
+from .export import export_transactions
+from .pnl import PnLAttribution
+from .attribution import AttributionEngine
+from .metrics import metrics
+
+MAX_WRITE_ATTEMPTS = 12
+# Shown when an account stays contended for all MAX_WRITE_ATTEMPTS
+BUSY_MESSAGE = "Account is busy, please retry"
+# Rebalance orders quoted longer ago than this are re-priced before they fill
+QUOTE_MAX_AGE = 60
+
+logger = logging.getLogger(__name__)
 
 class Portfolio:
     def __init__(self, username: str):
         self.username = username
-        self.portfolio = st.session_state.users[username]['portfolio']
-        if 'transactions' not in self.portfolio:
-            self.portfolio['transactions'] = []
-        if 'pending_orders' not in self.portfolio:
-            self.portfolio['pending_orders'] = []
-        if 'created_at' not in st.session_state.users[username]:
-            st.session_state.users[username]['created_at'] = datetime.now().isoformat()
+        self.store = get_store()
+        self.event_log = PortfolioEventLog(self.store)
+        self.portfolio = self.event_log.load(username)
+        if self.portfolio is None:
+            raise KeyError(f"No portfolio for {username}")
+        self.conflicts = 0
+
+    def _apply(self, build) -> bool:
+        """Optimistically write the events produced by ``build(state)``.
+
+        ``build`` validates against the given state and returns
+        ``(events, ledger_row)``, or None to reject. If another session wrote to
+        the account first, state is caught up and ``build`` re-validates, so
+        checks like available cash always hold against the committed state.
+        """
+        for attempt in range(MAX_WRITE_ATTEMPTS):
+            planned = build(self.portfolio)
+            if planned is None:
+                return False
+            events, transaction = planned
+            try:
+                self.portfolio = self.event_log.append(self.username, self.portfolio, events, transaction)
+                break
+            except ConcurrentModificationError:
+                self.conflicts += 1
+                self.portfolio = self.event_log.catch_up(self.username, self.portfolio)
+                # Jittered exponential backoff so racing sessions stop colliding in lockstep
+                time.sleep(random.uniform(0, 0.001 * 2 ** min(attempt, 6)))
+        else:
+            raise ConcurrentModificationError(f"Gave up writing to {self.username} after {MAX_WRITE_ATTEMPTS} attempts")
+
+        if transaction is not None:
+            # The write is committed, so an audit failure must not report it as failed;
+            # the fill stays in audit_pending until the audit log's backfill records it
+            try:
+                get_audit_log().record(self.username, transaction)
+                self.store.clear_audit_pending(self.username, self.portfolio['version'])
+            except Exception:
+                metrics.counter('audit.record_failed').inc()
+                logger.exception("Audit record for %s not confirmed; left for backfill", self.username)
+        return True
+
+    def get_state_as_of(self, as_of: datetime) -> Optional[Dict[str, Any]]:
+        """Cash, positions and orders as they stood at ``as_of``"""
+        return self.event_log.state_as_of(self.username, as_of)
+
+    def get_holdings_as_of(self, as_of: datetime) -> Dict[str, Any]:
+        """What the account held at ``as_of``, valued at the last close on or before it"""
+        index = LedgerIndex.for_account(self.store, self.username, self.portfolio['created_at'])
+        cash, positions = index.holdings_as_of(as_of.isoformat())
+        prices: Dict[str, float] = {}
+        if positions:
+            closes = get_history_store().get_close_matrix(list(positions))
+            closes = closes.loc[:pd.Timestamp(as_of).normalize()]
+            if not closes.empty:
+                prices = closes.iloc[-1].dropna().to_dict()
+        return {
+            'as_of': as_of,
+            'cash': cash,
+            'positions': positions,
+            'prices': prices,
+            'value': cash + sum(q * prices.get(s, 0.0) for s, q in positions.items())
+        }
+
+    def _get_transactions(self) -> List[Dict[str, Any]]:
+        return self.store.get_transactions(self.username)
 
     def get_positions(self) -> Dict[str, int]:
         return self.portfolio['positions']
@@ -30,15 +114,22 @@ class Portfolio:
         price: Optional[float] = None,
         trigger_price: Optional[float] = None,
         validity: str = "Day"
-    ) -> bool:
+    ) -> tuple[bool, str]:
         current_price = MarketData.get_current_price(symbol)
 
         # For market orders
         if order_type == "Market":
-            return self._execute_market_order(symbol, quantity, is_buy, current_price)
+            try:
+                filled = self._execute_market_order(symbol, quantity, is_buy, current_price)
+            except ConcurrentModificationError:
+                return False, BUSY_MESSAGE
+            if not filled:
+                return False, "Failed to place order. Please check your balance/positions."
+            return True, f"Successfully placed {order_type} order for {quantity} shares of {symbol}"
 
         # For limit, stop-loss, and stop-limit orders
         order = {
+            'order_id': secrets.token_hex(8),
             'symbol': symbol,
             'quantity': quantity,
             'is_buy': is_buy,
@@ -52,17 +143,39 @@ class Portfolio:
             ).isoformat()
         }
 
-        # Validate order
-        if is_buy and (price or current_price) * quantity > self.portfolio['cash']:
-            return False
-        if not is_buy and (
-            symbol not in self.portfolio['positions'] or 
-            self.portfolio['positions'][symbol] < quantity
-        ):
-            return False
+        def build(state):
+            # Validate order
+            if is_buy and (price or current_price) * quantity > state['cash']:
+                return None
+            if not is_buy and (
+                symbol not in state['positions'] or 
+                state['positions'][symbol] < quantity
+            ):
+                return None
+            return [('order_placed', {'order': order})], None
 
-        self.portfolio['pending_orders'].append(order)
-        return True
+        try:
+            placed = self._apply(build)
+        except ConcurrentModificationError:
+            return False, BUSY_MESSAGE
+        if not placed:
+            return False, "Failed to place order. Please check your balance/positions."
+        return True, f"Successfully placed {order_type} order for {quantity} shares of {symbol}"
+
+    def cancel_order(self, order_id: str) -> tuple[bool, str]:
+        """Cancel a pending order"""
+        def build(state):
+            if not any(o.get('order_id') == order_id for o in state['pending_orders']):
+                return None
+            return [('order_cancelled', {'order_id': order_id})], None
+
+        try:
+            cancelled = self._apply(build)
+        except ConcurrentModificationError:
+            return False, BUSY_MESSAGE
+        if not cancelled:
+            return False, "Order not found"
+        return True, "Order cancelled"
 
     def _execute_market_order(
         self,
@@ -73,50 +186,34 @@ class Portfolio:
     ) -> bool:
         total_cost = current_price * quantity
 
-        if is_buy:
-            if total_cost > self.portfolio['cash']:
-                return False
-
-            self.portfolio['cash'] -= total_cost
-            self.portfolio['positions'][symbol] = (
-                self.portfolio['positions'].get(symbol, 0) + quantity
-            )
-
-            self._record_transaction(symbol, 'buy', quantity, current_price)
-        else:
-            if symbol not in self.portfolio['positions'] or self.portfolio['positions'][symbol] < quantity:
-                return False
-
-            self.portfolio['cash'] += total_cost
-            self.portfolio['positions'][symbol] -= quantity
-
-            self._record_transaction(symbol, 'sell', quantity, current_price)
+        def build(state):
+            if is_buy:
+                if total_cost > state['cash']:
+                    return None
+                return self._record_transaction(symbol, 'buy', quantity, current_price)
 
-            if self.portfolio['positions'][symbol] == 0:
-                del self.portfolio['positions'][symbol]
+            if symbol not in state['positions'] or state['positions'][symbol] < quantity:
+                return None
+            return self._record_transaction(symbol, 'sell', quantity, current_price)
 
-        return True
+        return self._apply(build)
 
     def _record_transaction(self, symbol: str, trade_type: str, quantity: int, price: float):
-        """Record a new transaction in the portfolio history"""
-        self.portfolio['transactions'].append({
+        """Build the fill event and its row in the transaction ledger"""
+        transaction = {
             'timestamp': datetime.now().isoformat(),
             'symbol': symbol,
             'type': trade_type,
             'quantity': quantity,
             'price': price,
             'entry_price': self._get_entry_price(symbol) if trade_type == 'sell' else price
-        })
+        }
+        fill = {'symbol': symbol, 'side': trade_type, 'quantity': quantity, 'price': price}
+        return [('fill', fill)], transaction
 
     def _get_entry_price(self, symbol: str) -> float:
         """Calculate the average entry price for a symbol"""
-        buys = [t for t in self.portfolio['transactions'] 
-                if t['symbol'] == symbol and t['type'] == 'buy']
-        if not buys:
-            return 0
-        total_cost = sum(t['price'] * t['quantity'] for t in buys)
-        total_quantity = sum(t['quantity'] for t in buys)
-        return total_cost / total_quantity if total_quantity > 0 else 0
+        return self.store.get_entry_price(self.username, symbol)
 
     def get_portfolio_value(self) -> float:
         """Calculate total portfolio value including cash and positions"""
@@ -125,10 +222,58 @@ class Portfolio:
             total_value += MarketData.get_current_price(symbol) * quantity
         return total_value
 
+    def export_transactions(
+        self,
+        fmt: str = 'csv',
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        symbols: Optional[List[str]] = None
+    ) -> str:
+        """Write the ledger, filtered by date range and symbol, to a temp file and return its path"""
+        return export_transactions(
+            self.store,
+            self.username,
+            fmt,
+            start.isoformat() if start else None,
+            datetime.combine(end, datetime.max.time()).isoformat() if end else None,
+            symbols
+        )
+
+    def query_transactions(self, **query) -> tuple[List[Dict[str, Any]], Optional[tuple]]:
+        """One page of the ledger; see Store.query_transactions for filters and paging"""
+        return self.store.query_transactions(self.username, **query)
+
+    def summarize_transactions(self, by: str = 'symbol', **filters) -> pd.DataFrame:
+        """Per-symbol or per-month trade summary over the filtered ledger"""
+        return pd.DataFrame(self.store.summarize_transactions(self.username, by, **filters))
+
+    def get_pnl(self) -> Dict[str, Any]:
+        """Per-trade and daily realized/unrealized P/L, recomputed only when the ledger grows"""
+        engine = PnLAttribution()
+        cache_key = (self.username, self.store.count_transactions(self.username), date.today())
+        cached = engine.get_cached(cache_key)
+        if cached is not None:
+            return cached
+
+        ledger = pd.DataFrame(self._get_transactions(), columns=['timestamp', 'symbol', 'type', 'quantity', 'price', 'entry_price'])
+        closes = pd.DataFrame()
+        if not ledger.empty:
+            start = pd.Timestamp(ledger['timestamp'].min()).normalize()
+            closes = get_history_store().get_close_matrix(list(ledger['symbol'].unique()), start)
+        return engine.compute(cache_key, ledger, closes)
+
+    def get_pnl_attribution(self, start: date, end: Optional[date] = None) -> Dict[str, pd.DataFrame]:
+        """Stored nightly P/L attribution over a date range, by day, position and sector"""
+        records = self.store.get_attribution(self.username, start.isoformat(), (end or date.today()).isoformat())
+        if not records:
+            return {}
+        symbols = {symbol for record in records for symbol in record['positions']}
+        return AttributionEngine.summarize(records, MarketData.get_sectors(list(symbols)))
+
     def get_transaction_history(self) -> List[Dict[str, Any]]:
         """Get the full transaction history"""
         return sorted(
-            self.portfolio['transactions'],
+            self._get_transactions(),
             key=lambda x: x['timestamp'],
             reverse=True
         )
@@ -143,9 +288,96 @@ class Portfolio:
 
     def _get_account_age(self) -> datetime:
         """Get the account creation date"""
-        created_at = st.session_state.users[self.username]['created_at']
+        created_at = self.portfolio['created_at']
         return datetime.fromisoformat(created_at)
 
+    def get_nav_history(self) -> pd.Series:
+        """Daily net asset value since account creation, rebuilt from the ledger"""
+        start = pd.Timestamp(self._get_account_age()).normalize()
+        transactions = pd.DataFrame(self._get_transactions())
+        symbols = sorted(set(self.get_positions()) | (
+            set(transactions['symbol']) if not transactions.empty else set()
+        ))
+        if not symbols:
+            dates = pd.date_range(start, datetime.now(), freq='B')
+            return pd.Series(self.get_cash(), index=dates, name='value')
+
+        closes = get_history_store().get_close_matrix(symbols, start)
+        if closes.empty:
+            return pd.Series(dtype=float, name='value')
+
+        deltas = np.zeros(closes.shape)
+        cash_deltas = np.zeros(len(closes))
+        if not transactions.empty:
+            # Map each fill onto the first session on or after its timestamp
+            trade_dates = pd.to_datetime(transactions['timestamp']).dt.normalize()
+            rows = np.minimum(closes.index.searchsorted(trade_dates), len(closes) - 1)
+            cols = closes.columns.get_indexer(transactions['symbol'])
+            signed = np.where(transactions['type'] == 'buy', 1, -1) * transactions['quantity'].to_numpy()
+            np.add.at(deltas, (rows, cols), signed)
+            np.add.at(cash_deltas, rows, -signed * transactions['price'].to_numpy())
+
+        # Work backwards from today's state so starting balances need not be stored
+        current = np.array([self.get_positions().get(s, 0) for s in symbols], dtype=float)
+        holdings = current - deltas.sum(axis=0) + np.cumsum(deltas, axis=0)
+        cash = self.get_cash() - cash_deltas.sum() + np.cumsum(cash_deltas)
+
+        nav = cash + (holdings * closes.fillna(0).to_numpy()).sum(axis=1)
+        return pd.Series(nav, index=closes.index, name='value')
+
+    def _get_risk_metrics(self) -> Dict[str, Any]:
+        """Risk metrics cached per portfolio version and market date"""
+        cache_key = (self.portfolio['version'], date.today())
+        cache = st.session_state.setdefault('risk_metrics_cache', {})
+        cached = cache.get(self.username)
+        if cached and cached[0] == cache_key:
+            return cached[1]
+
+        nav = self.get_nav_history()
+        benchmark = None
+        if not nav.empty:
+            benchmark = get_history_store().get_close_matrix([BENCHMARK_SYMBOL], nav.index[0])[BENCHMARK_SYMBOL]
+        metrics = RiskMetrics().compute(nav, benchmark)
+        if len(nav) > 1:
+            metrics['daily_return'] = float(nav.pct_change().mean() * 100)
+
+        cache[self.username] = (cache_key, metrics)
+        return metrics
+
+    def get_value_at_risk(
+        self,
+        var_engine: MonteCarloVaR,
+        lookback_days: int = 504,
+        run: bool = True,
+        progress_callback=None
+    ) -> Optional[Dict[str, Any]]:
+        """VaR/CVaR for current positions; with ``run=False`` only cached results are returned.
+
+        Positions without price history are left out of the simulation and
+        listed under ``excluded``, so one unknown symbol does not blank the result.
+        """
+        positions = {s: q for s, q in self.get_positions().items() if q > 0}
+        if not positions:
+            return None
+
+        store = get_history_store()
+        closes = store.get_close_matrix(list(positions)).iloc[-(lookback_days + 1):]
+        returns = closes.pct_change().iloc[1:]
+        excluded = sorted(s for s in positions if returns[s].count() < 2)
+        held = {s: q for s, q in positions.items() if s not in excluded}
+        if not held:
+            return None
+
+        key = var_engine.cache_key(held, store.market_date)
+        result = var_engine.get_cached(key)
+        if result is None and run:
+            returns = returns[sorted(held)].dropna()
+            if len(returns) < 2:
+                return None
+            prices = closes.iloc[-1].to_dict()
+            result = var_engine.run(held, prices, returns.to_numpy(), store.market_date, progress_callback)
+        return None if result is None else {**result, 'excluded': excluded}
+
     def get_portfolio_metrics(self) -> Dict[str, Any]:
         """Get comprehensive portfolio metrics"""
         total_value = self.get_portfolio_value()
@@ -160,13 +392,74 @@ class Portfolio:
             'pending_orders': len(self.get_pending_orders())
         }
 
-        # Calculate daily returns
-        if self.get_transaction_history():
-            first_trade = min(
-                datetime.fromisoformat(t['timestamp'])
-                for t in self.get_transaction_history()
-            )
-            days_trading = (datetime.now() - first_trade).days or 1
-            metrics['daily_return'] = metrics['total_return'] / days_trading
+        metrics.update(self._get_risk_metrics())
+        return metrics
 
-        return metrics
\ No newline at end of file
+    def get_target_weights(self) -> Dict[str, float]:
+        return self.portfolio['target_weights']
+
+    def set_target_weights(self, target_weights: Dict[str, float]) -> tuple[bool, str]:
+        """Set target allocation as fractions of total portfolio value"""
+        # Only exact zeros mean "no target"; negatives are left for validation to reject
+        target_weights = {s.upper(): w for s, w in target_weights.items() if w != 0}
+        valid, message = Rebalancer.validate_weights(target_weights)
+        if not valid:
+            return False, message
+        try:
+            self._apply(lambda state: ([('targets_set', {'target_weights': target_weights})], None))
+        except ConcurrentModificationError:
+            return False, BUSY_MESSAGE
+        return True, "Target allocation saved"
+
+    def get_rebalance_orders(self, tolerance: float = 0.02) -> List[Dict[str, Any]]:
+        """Preview the orders that would bring the portfolio onto its targets"""
+        target_weights = self.get_target_weights()
+        if not target_weights:
+            return []
+        prices = MarketData.get_current_prices(list(self.get_positions()) + list(target_weights))
+        return Rebalancer(tolerance).compute_orders(
+            self.get_positions(), self.get_cash(), prices, target_weights
+        )
+
+    def apply_orders(self, orders: List[Dict[str, Any]], max_quote_age: float = QUOTE_MAX_AGE) -> int:
+        """Execute precomputed orders, returning the fill count.
+
+        Orders fill at their quoted price while it is fresh; older quotes, such
+        as a preview left open on the page, are re-quoted in one download and
+        orders with no current price are skipped. Orders that stay contended
+        are skipped like rejected ones; the next rebalance picks up whatever
+        drift they leave.
+        """
+        now = time.time()
+        stale = {o['symbol'] for o in orders if now - o.get('quoted_at', 0) > max_quote_age}
+        fresh = MarketData.get_current_prices(list(stale)) if stale else {}
+        filled = 0
+        for o in orders:
+            price = fresh.get(o['symbol'], 0) if o['symbol'] in stale else o['price']
+            if not price > 0:
+                continue
+            try:
+                filled += self._execute_market_order(o['symbol'], o['quantity'], o['is_buy'], price)
+            except ConcurrentModificationError:
+                continue
+        return filled
+
+    @staticmethod
+    def rebalance_all_accounts(tolerance: float = 0.02) -> Dict[str, int]:
+        """Scheduled rebalance of every account that has target weights"""
+        event_log = PortfolioEventLog(get_store())
+        accounts = {
+            username: state
+            for username in get_store().get_accounts_with_event('targets_set')
+            if (state := event_log.load(username)) and state['target_weights']
+        }
+        symbols = {
+            s for account in accounts.values()
+            for s in list(account['positions']) + list(account['target_weights'])
+        }
+        prices = MarketData.get_current_prices(list(symbols))
+        batch = Rebalancer(tolerance).compute_batch(accounts, prices)
+        return {
+            username: Portfolio(username).apply_orders(orders)
+            for username, orders in batch.items()
+        }
@@ -0,0 +1,26 @@
+import random
+import time
+from typing import Optional
+from .store import get_store
+
+class RateLimiter:
+    """Generic cell rate algorithm over the shared store.
+
+    Allows ``limit`` events per ``period`` seconds per key, with bursts up to
+    ``limit``. Each key is a single timestamp, so memory is constant per key,
+    and keys whose window has drained are swept out every so often.
+    """
+
+    def __init__(self, name: str, limit: int, period: float, sweep_probability: float = 0.01, store=None):
+        self.name = name
+        self.interval = period / limit
+        self.tolerance = self.interval * (limit - 1)
+        self.sweep_probability = sweep_probability
+        self.store = store or get_store()
+
+    def hit(self, key: str) -> Optional[float]:
+        """Count one event for ``key``; None if allowed, else seconds to wait"""
+        now = time.time()
+        if random.random() < self.sweep_probability:
+            self.store.expire_rate_limits(now)
+        return self.store.consume_rate_limit(f"{self.name}:{key}", now, self.interval, self.tolerance)
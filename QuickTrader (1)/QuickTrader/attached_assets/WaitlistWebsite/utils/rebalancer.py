@@ -0,0 +1,140 @@
+import time
+import numpy as np
+from typing import Dict, List, Any, Tuple, Optional
+
+class Rebalancer:
+    """Compute integer share orders that move portfolios onto target weights"""
+
+    def __init__(self, tolerance: float = 0.02):
+        self.tolerance = tolerance
+
+    @staticmethod
+    def solve_deltas(
+        quantities: np.ndarray,
+        cash: np.ndarray,
+        prices: np.ndarray,
+        weights: np.ndarray,
+        tolerance: float,
+        needs_trade: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Return signed share deltas for an (accounts x symbols) problem.
+
+        Buys never exceed cash plus sell proceeds and sells never exceed the
+        position, matching the checks in ``Portfolio._execute_market_order``.
+        """
+        holdings = quantities * prices
+        total_value = cash + holdings.sum(axis=1)
+        safe_value = np.where(total_value > 0, total_value, 1.0)[:, None]
+
+        # Only symbols drifting outside the band are traded, which keeps turnover minimal
+        if needs_trade is None:
+            drift = holdings / safe_value - weights
+            needs_trade = np.abs(drift) > tolerance
+
+        target_qty = np.floor(weights * safe_value / prices)
+        deltas = np.where(needs_trade, target_qty - quantities, 0.0)
+
+        # Scale buys down when sells plus cash cannot fund them
+        sell_proceeds = np.where(deltas < 0, -deltas * prices, 0.0).sum(axis=1)
+        buy_cost = np.where(deltas > 0, deltas * prices, 0.0).sum(axis=1)
+        available = cash + sell_proceeds
+        scale = np.where(buy_cost > available, available / np.where(buy_cost > 0, buy_cost, 1.0), 1.0)
+        deltas = np.where(deltas > 0, np.floor(deltas * scale[:, None]), deltas)
+
+        return deltas.astype(np.int64)
+
+    def compute_orders(
+        self,
+        positions: Dict[str, int],
+        cash: float,
+        prices: Dict[str, float],
+        target_weights: Dict[str, float]
+    ) -> List[Dict[str, Any]]:
+        """Compute the orders needed to bring one portfolio onto its targets"""
+        symbols = sorted(set(positions) | set(target_weights))
+        symbols = [s for s in symbols if prices.get(s, 0) > 0]
+        if not symbols:
+            return []
+
+        quantities = np.array([[positions.get(s, 0) for s in symbols]], dtype=float)
+        price_vector = np.array([prices[s] for s in symbols], dtype=float)
+        weights = np.array([[target_weights.get(s, 0.0) for s in symbols]], dtype=float)
+
+        deltas = self.solve_deltas(quantities, np.array([cash], dtype=float), price_vector, weights, self.tolerance)[0]
+        return self._to_orders(symbols, deltas, price_vector)
+
+    def compute_batch(
+        self,
+        accounts: Dict[str, Dict[str, Any]],
+        prices: Dict[str, float]
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Compute orders for many portfolios in a single vectorized pass.
+
+        ``accounts`` maps an account id to a dict with ``positions``, ``cash``
+        and ``target_weights`` as stored on the portfolio.
+        """
+        accounts = {
+            account_id: account for account_id, account in accounts.items()
+            if account.get('target_weights')
+        }
+        if not accounts:
+            return {}
+
+        symbols = sorted({
+            s for account in accounts.values()
+            for s in list(account['positions']) + list(account['target_weights'])
+            if prices.get(s, 0) > 0
+        })
+        if not symbols:
+            return {}
+        column = {s: i for i, s in enumerate(symbols)}
+        account_ids = list(accounts)
+
+        quantities = np.zeros((len(account_ids), len(symbols)))
+        weights = np.zeros((len(account_ids), len(symbols)))
+        cash = np.zeros(len(account_ids))
+        for row, account_id in enumerate(account_ids):
+            account = accounts[account_id]
+            cash[row] = account['cash']
+            for symbol, qty in account['positions'].items():
+                if symbol in column:
+                    quantities[row, column[symbol]] = qty
+            for symbol, weight in account['target_weights'].items():
+                if symbol in column:
+                    weights[row, column[symbol]] = weight
+
+        price_vector = np.array([prices[s] for s in symbols], dtype=float)
+        deltas = self.solve_deltas(quantities, cash, price_vector, weights, self.tolerance)
+
+        return {
+            account_id: self._to_orders(symbols, deltas[row], price_vector)
+            for row, account_id in enumerate(account_ids)
+        }
+
+    @staticmethod
+    def _to_orders(symbols: List[str], deltas: np.ndarray, prices: np.ndarray) -> List[Dict[str, Any]]:
+        """Turn share deltas into order dicts, sells first so they fund the buys"""
+        traded = np.nonzero(deltas)[0]
+        quoted_at = time.time()
+        orders = [
+            {
+                'symbol': symbols[i],
+                'quantity': int(abs(deltas[i])),
+                'is_buy': bool(deltas[i] > 0),
+                'price': float(prices[i]),
+                'value': float(abs(deltas[i]) * prices[i]),
+                'quoted_at': quoted_at
+            }
+            for i in traded
+        ]
+        return sorted(orders, key=lambda o: o['is_buy'])
+
+    @staticmethod
+    def validate_weights(target_weights: Dict[str, float]) -> Tuple[bool, str]:
+        if not all(np.isfinite(w) for w in target_weights.values()):
+            return False, "Target weights must be numbers"
+        if any(w < 0 for w in target_weights.values()):
+            return False, "Target weights cannot be negative"
+        if sum(target_weights.values()) > 1.0 + 1e-9:
+            return False, "Target weights cannot add up to more than 100%"
+        return True, ""
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import Dict, Any, Optional
+
+TRADING_DAYS = 252
+
+class RiskMetrics:
+    """Vectorized risk statistics over a daily NAV series"""
+
+    def __init__(self, risk_free_rate: float = 0.0, window: int = 63):
+        self.risk_free_rate = risk_free_rate
+        self.window = window
+
+    @staticmethod
+    def _max_drawdown(nav: np.ndarray) -> np.ndarray:
+        """Max drawdown along the last axis"""
+        peaks = np.maximum.accumulate(nav, axis=-1)
+        return (nav / peaks - 1).min(axis=-1)
+
+    def _stats(self, returns: np.ndarray, benchmark: Optional[np.ndarray]) -> Dict[str, np.ndarray]:
+        """Annualized statistics along the last axis, so 1-D and windowed input share one path"""
+        excess = returns - self.risk_free_rate / TRADING_DAYS
+        std = returns.std(axis=-1, ddof=1)
+        downside = np.sqrt(np.mean(np.minimum(excess, 0) ** 2, axis=-1))
+        mean_excess = excess.mean(axis=-1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stats = {
+                'volatility': std * np.sqrt(TRADING_DAYS),
+                'sharpe_ratio': np.where(std > 0, mean_excess / std, np.nan) * np.sqrt(TRADING_DAYS),
+                'sortino_ratio': np.where(downside > 0, mean_excess / downside, np.nan) * np.sqrt(TRADING_DAYS),
+            }
+            if benchmark is not None:
+                r = returns - returns.mean(axis=-1, keepdims=True)
+                b = benchmark - benchmark.mean(axis=-1, keepdims=True)
+                variance = (b * b).sum(axis=-1)
+                stats['beta'] = np.where(variance > 0, (r * b).sum(axis=-1) / variance, np.nan)
+        return stats
+
+    def compute(self, nav: pd.Series, benchmark: Optional[pd.Series] = None) -> Dict[str, Any]:
+        """Point-in-time metrics plus rolling versions over ``self.window`` days"""
+        nav = nav.dropna()
+        if len(nav) < 3:
+            return {}
+
+        returns = nav.pct_change().iloc[1:]
+        bench_returns = None
+        if benchmark is not None and not benchmark.dropna().empty:
+            bench_returns = benchmark.reindex(nav.index).ffill().pct_change().iloc[1:].fillna(0).to_numpy()
+
+        r = returns.to_numpy()
+        metrics = {k: float(v) for k, v in self._stats(r, bench_returns).items()}
+        metrics['max_drawdown'] = float(self._max_drawdown(nav.to_numpy()))
+
+        if len(r) >= self.window:
+            windows = sliding_window_view(r, self.window)
+            bench_windows = None if bench_returns is None else sliding_window_view(bench_returns, self.window)
+            rolling = self._stats(windows, bench_windows)
+            rolling['max_drawdown'] = self._max_drawdown(sliding_window_view(nav.to_numpy()[1:], self.window))
+            metrics['rolling'] = pd.DataFrame(rolling, index=returns.index[self.window - 1:])
+        else:
+            metrics['rolling'] = pd.DataFrame()
+
+        return metrics
@@ -0,0 +1,128 @@
+import hashlib
+import heapq
+import random
+import secrets
+import threading
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from .store import get_store
+
+# Sessions end after this long without a request...
+IDLE_TIMEOUT = 2 * 60 * 60
+# ...and after this long regardless of activity
+ABSOLUTE_TIMEOUT = 12 * 60 * 60
+# Sliding expiry is only written back once it has moved this far
+TOUCH_INTERVAL = 60
+# A cached session is trusted this long before the shared store is asked again,
+# which bounds how long a revocation in another process goes unnoticed
+REVALIDATE_AFTER = 15
+
+def _hash_token(token: str) -> str:
+    # Only the digest is stored, so a leaked database holds no usable tokens
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class SessionStore:
+    """Opaque session tokens backed by the shared store.
+
+    Each process keeps the sessions it has seen in a dict, with a min-heap of
+    ``(expires_at, token_hash)`` for eviction: expired sessions are popped off
+    the top in O(log n) each instead of scanning every session. Sliding
+    expiry pushes a fresh heap entry and leaves the old one to be skipped when
+    it surfaces; the heap is rebuilt when such stale entries dominate.
+    """
+
+    def __init__(self, store=None, sweep_probability: float = 0.01):
+        self.store = store or get_store()
+        self.sweep_probability = sweep_probability
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._expiry: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def _cache(self, token_hash: str, session: Dict[str, Any], now: float):
+        previous = self._sessions.get(token_hash)
+        session['checked_at'] = now
+        self._sessions[token_hash] = session
+        if previous is None or previous['expires_at'] != session['expires_at']:
+            heapq.heappush(self._expiry, (session['expires_at'], token_hash))
+        if len(self._expiry) > 2 * len(self._sessions) + 1024:
+            self._expiry = [(s['expires_at'], h) for h, s in self._sessions.items()]
+            heapq.heapify(self._expiry)
+
+    def _evict_expired(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, token_hash = heapq.heappop(self._expiry)
+            session = self._sessions.get(token_hash)
+            # Entries left behind by sliding expiry no longer match the session
+            if session is not None and session['expires_at'] <= now:
+                del self._sessions[token_hash]
+
+    def create(self, username: str) -> str:
+        """Start a session for ``username`` and return its token"""
+        token = secrets.token_urlsafe(32)
+        token_hash = _hash_token(token)
+        now = time.time()
+        session = {'username': username, 'created_at': now, 'expires_at': now + IDLE_TIMEOUT}
+        self.store.save_session(token_hash, username, session['created_at'], session['expires_at'])
+        with self._lock:
+            self._evict_expired(now)
+            self._cache(token_hash, session, now)
+        return token
+
+    def validate(self, token: str) -> Optional[str]:
+        """Username behind ``token`` if the session is live, extending its expiry"""
+        token_hash = _hash_token(token)
+        now = time.time()
+        if random.random() < self.sweep_probability:
+            self.store.expire_sessions(now)
+
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(token_hash)
+        refreshed = session is None or now - session['checked_at'] > REVALIDATE_AFTER
+        if refreshed:
+            session = self.store.get_session(token_hash)
+            if session is None or session['expires_at'] <= now:
+                with self._lock:
+                    self._sessions.pop(token_hash, None)
+                return None
+
+        expires_at = min(now + IDLE_TIMEOUT, session['created_at'] + ABSOLUTE_TIMEOUT)
+        if expires_at - session['expires_at'] >= TOUCH_INTERVAL:
+            if not self.store.touch_session(token_hash, expires_at):
+                with self._lock:
+                    self._sessions.pop(token_hash, None)
+                return None
+            session, refreshed = {**session, 'expires_at': expires_at}, True
+        if refreshed:
+            with self._lock:
+                self._cache(token_hash, session, now)
+        return session['username']
+
+    def revoke(self, token: str):
+        token_hash = _hash_token(token)
+        self.store.delete_sessions(token_hash=token_hash)
+        with self._lock:
+            self._sessions.pop(token_hash, None)
+
+    def revoke_user(self, username: str):
+        """End every session of ``username``; other processes notice within REVALIDATE_AFTER"""
+        revoked = self.store.delete_sessions(username=username)
+        with self._lock:
+            for token_hash in revoked:
+                self._sessions.pop(token_hash, None)
+
+    def count_active(self) -> int:
+        """Live sessions across all processes"""
+        return self.store.count_sessions(time.time())
+
+_sessions: Optional[SessionStore] = None
+_sessions_lock = threading.Lock()
+
+def get_session_store() -> SessionStore:
+    """Process-wide session store shared by every Streamlit session"""
+    global _sessions
+    if _sessions is None:
+        with _sessions_lock:
+            if _sessions is None:
+                _sessions = SessionStore()
+    return _sessions
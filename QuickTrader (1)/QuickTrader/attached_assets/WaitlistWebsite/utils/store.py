@@ -0,0 +1,886 @@
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+DB_PATH = os.environ.get('VELASA_DB_PATH', 'velasa.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT,
+    parent_account TEXT,
+    google_sub TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_parent ON users(parent_account);
+
+CREATE TABLE IF NOT EXISTS portfolio_events (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    event_type TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (username, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_portfolio_events_type ON portfolio_events(event_type, username);
+
+CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (username, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_portfolio_snapshots_time ON portfolio_snapshots(username, timestamp);
+
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    entry_price REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_time ON transactions(username, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_symbol ON transactions(username, symbol, type);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_symbol_time ON transactions(username, symbol, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_side_time ON transactions(username, type, timestamp);
+CREATE INDEX IF NOT EXISTS idx_transactions_time ON transactions(timestamp);
+
+CREATE TABLE IF NOT EXISTS audit_pending (
+    username TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    price REAL NOT NULL,
+    entry_price REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (username, seq)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fundamentals (
+    symbol TEXT PRIMARY KEY,
+    name TEXT,
+    sector TEXT,
+    fetched_at TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS pnl_attribution (
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    date TEXT NOT NULL,
+    price_pnl REAL NOT NULL,
+    trading_pnl REAL NOT NULL,
+    positions TEXT NOT NULL,
+    PRIMARY KEY (username, date)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    tat REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rate_limits_tat ON rate_limits(tat);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    token_hash TEXT PRIMARY KEY,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions(username);
+
+CREATE TABLE IF NOT EXISTS verifications (
+    username TEXT PRIMARY KEY REFERENCES users(username) ON DELETE CASCADE,
+    email_token_hash TEXT UNIQUE,
+    phone_otp_hash TEXT,
+    email TEXT,
+    phone TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    resends INTEGER NOT NULL DEFAULT 0,
+    expires_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_verifications_expires ON verifications(expires_at);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    username TEXT,
+    kind TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    sent_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(next_attempt_at) WHERE status IN ('pending', 'sending');
+CREATE INDEX IF NOT EXISTS idx_outbox_username ON outbox(username);
+"""
+
+TRANSACTION_COLUMNS = ('timestamp', 'symbol', 'type', 'quantity', 'price', 'entry_price')
+
+# Ledger columns that transaction pages may be sorted by
+TRANSACTION_SORT_COLUMNS = ('timestamp', 'symbol', 'quantity', 'price')
+
+# Verification secret cleared by each completed verification
+VERIFICATION_SECRET_COLUMNS = {'email_verified': 'email_token_hash', 'phone_verified': 'phone_otp_hash'}
+
+def hash_secret(value: str, salt: str = '') -> str:
+    """Digest under which verification tokens and codes are stored"""
+    return hashlib.sha256(f"{salt}:{value}".encode()).hexdigest()
+
+def _transaction_filter(
+    username: str,
+    symbols: Optional[List[str]],
+    side: Optional[str],
+    start: Optional[str],
+    end: Optional[str]
+) -> Tuple[str, Dict[str, Any]]:
+    """WHERE clause and parameters for the ledger filters that are set.
+
+    Only clauses for present filters are emitted, so the planner can pick the
+    symbol, side or time index; the handful of variants stay statement-cached.
+    """
+    clauses = ["username = :username"]
+    if symbols:
+        clauses.append("symbol IN (SELECT value FROM json_each(:symbols))")
+    if side:
+        clauses.append("type = :side")
+    if start:
+        clauses.append("timestamp >= :start")
+    if end:
+        clauses.append("timestamp <= :end")
+    params = {
+        'username': username,
+        'symbols': json.dumps(symbols) if symbols else None,
+        'side': side,
+        'start': start,
+        'end': end
+    }
+    return " AND ".join(clauses), params
+
+# Older snapshots are thinned to one per this many events, enough for cheap as-of queries
+SNAPSHOT_RETENTION_INTERVAL = 1000
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections shared by all sessions in a process"""
+
+    def __init__(self, path: str, size: int = 8):
+        self.path = path
+        self.size = size
+        self._idle: 'queue.LifoQueue[sqlite3.Connection]' = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit mode: transactions are opened explicitly by Store.transaction
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._created < self.size
+                if can_create:
+                    self._created += 1
+            conn = self._connect() if can_create else self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+class Store:
+    """Durable user and portfolio store shared by every server process.
+
+    All SQL is written as constant parameterized statements so each pooled
+    connection compiles it once and reuses the prepared statement.
+    """
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = 8):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+        self._migrate_portfolio_rows()
+        self._migrate_user_directory()
+        self._migrate_pending_verifications()
+        self._migrate_verification_resends()
+
+    def _migrate_user_directory(self):
+        """Add the Google subject column and the unique lookup indexes"""
+        with self.transaction() as conn:
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(users)")}
+            if 'google_sub' not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN google_sub TEXT")
+                # Simulated Google sign-in identifies users by their Google email
+                conn.execute(
+                    "UPDATE users SET google_sub = lower(coalesce(json_extract(data, '$.google_email'), email)) "
+                    "WHERE json_extract(data, '$.google_user')"
+                )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_google_sub ON users(google_sub) WHERE google_sub IS NOT NULL"
+            )
+        try:
+            with self.transaction() as conn:
+                # One primary account per email; linked sub-accounts carry no email
+                conn.execute(
+                    "CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_unique ON users(email COLLATE NOCASE) "
+                    "WHERE email IS NOT NULL AND parent_account IS NULL"
+                )
+                conn.execute("DROP INDEX IF EXISTS idx_users_email")
+        except sqlite3.IntegrityError:
+            # Emails registered twice before uniqueness was enforced; keep a plain index until resolved
+            with self.transaction() as conn:
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email COLLATE NOCASE)")
+
+    def _migrate_pending_verifications(self):
+        """Move plaintext pending verifications into the hashed table"""
+        with self.transaction() as conn:
+            legacy = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pending_verifications'"
+            ).fetchone()
+            if legacy is None:
+                return
+            conn.executemany(
+                "INSERT OR IGNORE INTO verifications "
+                "(username, email_token_hash, phone_otp_hash, email, phone, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        row['username'],
+                        hash_secret(row['email_token']),
+                        hash_secret(row['phone_otp'], row['username']),
+                        row['email'],
+                        row['phone'],
+                        datetime.fromisoformat(row['expires_at']).timestamp()
+                    )
+                    for row in conn.execute("SELECT * FROM pending_verifications")
+                ]
+            )
+            conn.execute("DROP TABLE pending_verifications")
+
+    def _migrate_verification_resends(self):
+        """Add the count of SMS codes resent since verification started"""
+        with self.transaction() as conn:
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(verifications)")}
+            if 'resends' not in columns:
+                conn.execute("ALTER TABLE verifications ADD COLUMN resends INTEGER NOT NULL DEFAULT 0")
+
+    def _migrate_portfolio_rows(self):
+        """Turn rows of the old mutable portfolios table into snapshots"""
+        with self.transaction() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'portfolios'"
+            ).fetchone()
+            if not exists:
+                return
+            for row in conn.execute("SELECT * FROM portfolios").fetchall():
+                state = {
+                    'cash': row['cash'],
+                    'positions': json.loads(row['positions']),
+                    'pending_orders': json.loads(row['pending_orders']),
+                    'target_weights': json.loads(row['target_weights']),
+                    'version': row['version'],
+                    'created_at': row['created_at']
+                }
+                conn.execute(
+                    "INSERT OR IGNORE INTO portfolio_snapshots (username, seq, timestamp, state) VALUES (?, ?, ?, ?)",
+                    (row['username'], row['version'], datetime.now().isoformat(), json.dumps(state))
+                )
+            conn.execute("DROP TABLE portfolios")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front to avoid upgrade deadlocks"""
+        with self.pool.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def _query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        with self.pool.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    # Users
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        row = self._query_one("SELECT data FROM users WHERE username = ?", (username,))
+        return json.loads(row['data']) if row else None
+
+    def user_exists(self, username: str) -> bool:
+        return self._query_one("SELECT 1 FROM users WHERE username = ?", (username,)) is not None
+
+    def find_user_by_email(self, email: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(username, record) of the primary account registered with ``email``"""
+        row = self._query_one(
+            "SELECT username, data FROM users "
+            "WHERE email = ? COLLATE NOCASE AND email IS NOT NULL AND parent_account IS NULL",
+            (email,)
+        )
+        return (row['username'], json.loads(row['data'])) if row else None
+
+    def find_user_by_google_sub(self, google_sub: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = self._query_one(
+            "SELECT username, data FROM users WHERE google_sub = ? AND google_sub IS NOT NULL", (google_sub,)
+        )
+        return (row['username'], json.loads(row['data'])) if row else None
+
+    def create_account(self, username: str, record: Dict[str, Any], cash: float) -> bool:
+        """Insert a user and its portfolio atomically; False if the username, email or Google id is taken"""
+        try:
+            with self.transaction() as conn:
+                self._insert_accounts(conn, [(username, record, cash)])
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def create_accounts(self, accounts: List[Tuple[str, Dict[str, Any], float]]) -> List[str]:
+        """Insert a batch of users and portfolios in one transaction; returns the usernames created.
+
+        If any account conflicts, the batch is retried one account per
+        transaction so only the conflicting ones are skipped.
+        """
+        try:
+            with self.transaction() as conn:
+                self._insert_accounts(conn, accounts)
+            return [username for username, _, _ in accounts]
+        except sqlite3.IntegrityError:
+            return [username for username, record, cash in accounts if self.create_account(username, record, cash)]
+
+    def _insert_accounts(self, conn: sqlite3.Connection, accounts: List[Tuple[str, Dict[str, Any], float]]):
+        conn.executemany(
+            "INSERT INTO users (username, email, parent_account, google_sub, data) VALUES (?, ?, ?, ?, ?)",
+            [
+                (username, record.get('email'), record.get('parent_account'), record.get('google_sub'), json.dumps(record))
+                for username, record, _ in accounts
+            ]
+        )
+        events = []
+        for username, record, cash in accounts:
+            created_at = record.get('created_at', datetime.now().isoformat())
+            events.append((username, 1, created_at, 'opened', json.dumps({'created_at': created_at})))
+            events.append((username, 2, created_at, 'deposit', json.dumps({'amount': cash})))
+        conn.executemany(
+            "INSERT INTO portfolio_events (username, seq, timestamp, event_type, payload) VALUES (?, ?, ?, ?, ?)",
+            events
+        )
+
+    def find_taken(self, usernames: List[str], emails: List[str]) -> Tuple[set, set]:
+        """Which of ``usernames`` and (lowercased) ``emails`` already belong to an account"""
+        taken_usernames = self._query(
+            "SELECT username FROM users WHERE username IN (SELECT value FROM json_each(?))",
+            (json.dumps(usernames),)
+        )
+        taken_emails = self._query(
+            "SELECT lower(email) AS email FROM users "
+            "WHERE email COLLATE NOCASE IN (SELECT value FROM json_each(?)) AND email IS NOT NULL AND parent_account IS NULL",
+            (json.dumps(emails),)
+        )
+        return {row['username'] for row in taken_usernames}, {row['email'] for row in taken_emails}
+
+    def median_password_iterations(self, legacy_iterations: int) -> Optional[int]:
+        """Median PBKDF2 cost over users with a password; None if there are none"""
+        row = self._query_one(
+            "WITH costs AS ("
+            "SELECT coalesce(json_extract(data, '$.iterations'), ?) AS iterations FROM users "
+            "WHERE json_extract(data, '$.password_hash') IS NOT NULL"
+            ") SELECT iterations FROM costs ORDER BY iterations "
+            "LIMIT 1 OFFSET (SELECT count(*) / 2 FROM costs)",
+            (legacy_iterations,)
+        )
+        return row['iterations'] if row else None
+
+    def update_user(self, username: str, fields: Dict[str, Any]) -> bool:
+        """Merge ``fields`` into the stored user record.
+
+        Raises sqlite3.IntegrityError if the new email or Google id belongs to another user.
+        """
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE users SET data = json_patch(data, ?1), "
+                "email = coalesce(json_extract(?1, '$.email'), email), "
+                "google_sub = coalesce(json_extract(?1, '$.google_sub'), google_sub) "
+                "WHERE username = ?2",
+                (json.dumps(fields), username)
+            )
+        return cursor.rowcount > 0
+
+    def delete_users(self, usernames: List[str]):
+        with self.transaction() as conn:
+            conn.executemany("DELETE FROM users WHERE username = ?", [(u,) for u in usernames])
+
+    def get_linked_accounts(self, parent: str) -> List[str]:
+        rows = self._query("SELECT username FROM users WHERE parent_account = ? ORDER BY username", (parent,))
+        return [row['username'] for row in rows]
+
+    # Portfolios
+
+    def append_events(
+        self,
+        username: str,
+        expected_version: int,
+        events: List[Tuple[str, Dict[str, Any]]],
+        transaction: Optional[Dict[str, Any]] = None,
+        snapshot: Optional[Dict[str, Any]] = None
+    ):
+        """Append events after ``expected_version``, with the ledger row and snapshot they produce.
+
+        Raises sqlite3.IntegrityError if another writer already used those sequence numbers.
+        """
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO portfolio_events (username, seq, timestamp, event_type, payload) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (username, expected_version + i, now, event_type, json.dumps(payload))
+                    for i, (event_type, payload) in enumerate(events, 1)
+                ]
+            )
+            if transaction is not None:
+                conn.execute(
+                    "INSERT INTO transactions (username, timestamp, symbol, type, quantity, price, entry_price) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (username, *(transaction[c] for c in TRANSACTION_COLUMNS))
+                )
+                # Committed with the fill, so a crash before the audit append still leaves a trace to backfill
+                conn.execute(
+                    "INSERT INTO audit_pending (username, seq, timestamp, symbol, type, quantity, price, entry_price, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (username, expected_version + len(events), *(transaction[c] for c in TRANSACTION_COLUMNS), time.time())
+                )
+            if snapshot is not None:
+                conn.execute(
+                    "INSERT INTO portfolio_snapshots (username, seq, timestamp, state) VALUES (?, ?, ?, ?)",
+                    (username, snapshot['version'], now, json.dumps(snapshot))
+                )
+                # Compact: keep the newest snapshot plus a sparse trail for as-of queries
+                conn.execute(
+                    "DELETE FROM portfolio_snapshots WHERE username = ? AND seq < ? AND seq % ? != 0",
+                    (username, snapshot['version'], SNAPSHOT_RETENTION_INTERVAL)
+                )
+
+    def get_latest_snapshot(self, username: str, as_of: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if as_of is None:
+            row = self._query_one(
+                "SELECT seq, state FROM portfolio_snapshots WHERE username = ? ORDER BY seq DESC LIMIT 1",
+                (username,)
+            )
+        else:
+            row = self._query_one(
+                "SELECT seq, state FROM portfolio_snapshots WHERE username = ? AND timestamp <= ? "
+                "ORDER BY timestamp DESC, seq DESC LIMIT 1",
+                (username, as_of)
+            )
+        return {'seq': row['seq'], 'state': json.loads(row['state'])} if row else None
+
+    def get_events(self, username: str, after_seq: int = 0, as_of: Optional[str] = None) -> List[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT seq, timestamp, event_type, payload FROM portfolio_events "
+            "WHERE username = ? AND seq > ? AND timestamp <= coalesce(?, timestamp) ORDER BY seq",
+            (username, after_seq, as_of)
+        )
+        return [{**dict(row), 'payload': json.loads(row['payload'])} for row in rows]
+
+    def get_accounts_with_event(self, event_type: str) -> List[str]:
+        rows = self._query(
+            "SELECT DISTINCT username FROM portfolio_events WHERE event_type = ?", (event_type,)
+        )
+        return [row['username'] for row in rows]
+
+    def get_transactions(self, username: str) -> List[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT timestamp, symbol, type, quantity, price, entry_price FROM transactions "
+            "WHERE username = ? ORDER BY timestamp, id",
+            (username,)
+        )
+        return [dict(row) for row in rows]
+
+    def count_transactions(self, username: str) -> int:
+        row = self._query_one("SELECT COUNT(*) AS n FROM transactions WHERE username = ?", (username,))
+        return row['n']
+
+    def iter_transactions(
+        self,
+        username: str,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        symbols: Optional[List[str]] = None,
+        batch_size: int = 5000
+    ) -> Iterator[List[sqlite3.Row]]:
+        """Ledger rows in time order, ``batch_size`` at a time.
+
+        Pages are fetched by keyset on (timestamp, id) along the user/time
+        index, so no read transaction or connection is held between batches.
+        """
+        symbols_json = json.dumps(symbols) if symbols else None
+        after = (start or '', -1)
+        while True:
+            rows = self._query(
+                "SELECT id, timestamp, symbol, type, quantity, price, entry_price FROM transactions "
+                "WHERE username = ?1 AND (timestamp, id) > (?2, ?3) AND timestamp <= coalesce(?4, timestamp) "
+                "AND (?5 IS NULL OR symbol IN (SELECT value FROM json_each(?5))) "
+                "ORDER BY timestamp, id LIMIT ?6",
+                (username, *after, end, symbols_json, batch_size)
+            )
+            if not rows:
+                return
+            yield rows
+            if len(rows) < batch_size:
+                return
+            after = (rows[-1]['timestamp'], rows[-1]['id'])
+
+    def query_transactions(
+        self,
+        username: str,
+        symbols: Optional[List[str]] = None,
+        side: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        sort: str = 'timestamp',
+        descending: bool = True,
+        cursor: Optional[Tuple[Any, int]] = None,
+        limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], Optional[Tuple[Any, int]]]:
+        """One page of filtered ledger rows and the cursor for the next page.
+
+        Pagination is by keyset on (sort column, id), so every page costs an
+        index seek rather than skipping OFFSET rows.
+        """
+        if sort not in TRANSACTION_SORT_COLUMNS:
+            raise ValueError(f"Cannot sort transactions by {sort}")
+        # Only whitelisted identifiers are interpolated; values stay parameters
+        where, params = _transaction_filter(username, symbols, side, start, end)
+        direction, compare = ('DESC', '<') if descending else ('ASC', '>')
+        if cursor is not None:
+            where += f" AND ({sort}, id) {compare} (:after, :after_id)"
+            params.update(after=cursor[0], after_id=cursor[1])
+        rows = self._query(
+            f"SELECT id, timestamp, symbol, type, quantity, price, entry_price FROM transactions "
+            f"WHERE {where} ORDER BY {sort} {direction}, id {direction} LIMIT :limit",
+            {**params, 'limit': limit + 1}
+        )
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = (page[-1][sort], page[-1]['id']) if len(rows) > limit else None
+        return page, next_cursor
+
+    def summarize_transactions(
+        self,
+        username: str,
+        by: str = 'symbol',
+        symbols: Optional[List[str]] = None,
+        side: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Trade counts, volumes and realized P/L per symbol or per calendar month"""
+        group = {'symbol': 'symbol', 'month': 'substr(timestamp, 1, 7)'}.get(by)
+        if group is None:
+            raise ValueError(f"Cannot summarize transactions by {by}")
+        where, params = _transaction_filter(username, symbols, side, start, end)
+        rows = self._query(
+            f"SELECT {group} AS {by}, COUNT(*) AS trades, "
+            f"SUM(CASE WHEN type = 'buy' THEN quantity ELSE 0 END) AS shares_bought, "
+            f"SUM(CASE WHEN type = 'sell' THEN quantity ELSE 0 END) AS shares_sold, "
+            f"SUM(CASE WHEN type = 'buy' THEN quantity * price ELSE 0 END) AS bought, "
+            f"SUM(CASE WHEN type = 'sell' THEN quantity * price ELSE 0 END) AS sold, "
+            f"SUM(CASE WHEN type = 'sell' THEN quantity * (price - entry_price) ELSE 0 END) AS realized_pl "
+            f"FROM transactions WHERE {where} GROUP BY {by} ORDER BY {by}",
+            params
+        )
+        return [dict(row) for row in rows]
+
+    def get_transactions_since(self, start: str) -> List[Dict[str, Any]]:
+        """Every account's fills at or after ``start``, for batch jobs"""
+        rows = self._query(
+            "SELECT username, timestamp, symbol, type, quantity, price FROM transactions "
+            "WHERE timestamp >= ? ORDER BY timestamp, id",
+            (start,)
+        )
+        return [dict(row) for row in rows]
+
+    def get_entry_price(self, username: str, symbol: str) -> float:
+        row = self._query_one(
+            "SELECT SUM(price * quantity) AS cost, SUM(quantity) AS quantity FROM transactions "
+            "WHERE username = ? AND symbol = ? AND type = 'buy'",
+            (username, symbol)
+        )
+        return row['cost'] / row['quantity'] if row and row['quantity'] else 0
+
+    def clear_audit_pending(self, username: str, seq: int):
+        """Forget a fill once its audit record is on disk"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM audit_pending WHERE username = ? AND seq = ?", (username, seq))
+
+    def claim_audit_pending(self, before: float) -> List[Dict[str, Any]]:
+        """Take fills left unaudited since before ``before``; each is handed to one caller only"""
+        with self.transaction() as conn:
+            rows = conn.execute("DELETE FROM audit_pending WHERE created_at <= ? RETURNING *", (before,)).fetchall()
+        return [dict(row) for row in rows]
+
+    def restore_audit_pending(self, fills: List[Dict[str, Any]]):
+        """Put back claimed fills whose audit records could not be written"""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO audit_pending "
+                "(username, seq, timestamp, symbol, type, quantity, price, entry_price, created_at) "
+                "VALUES (:username, :seq, :timestamp, :symbol, :type, :quantity, :price, :entry_price, :created_at)",
+                fills
+            )
+
+    # Market data
+
+    def get_fundamentals(self, symbols: List[str], fresh_after: str) -> Dict[str, Dict[str, Any]]:
+        rows = self._query(
+            "SELECT symbol, name, sector FROM fundamentals "
+            "WHERE symbol IN (SELECT value FROM json_each(?)) AND fetched_at >= ?",
+            (json.dumps(symbols), fresh_after)
+        )
+        return {row['symbol']: dict(row) for row in rows}
+
+    def save_fundamentals(self, fundamentals: Dict[str, Dict[str, Any]]):
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fundamentals (symbol, name, sector, fetched_at) VALUES (?, ?, ?, ?)",
+                [(symbol, info.get('name'), info.get('sector'), now) for symbol, info in fundamentals.items()]
+            )
+
+    # Attribution
+
+    def save_attribution(self, day: str, rows: List[Tuple[str, float, float, Dict[str, List[float]]]]):
+        """Store one day's (username, price P/L, trading P/L, per-position split) rows, replacing reruns"""
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pnl_attribution (username, date, price_pnl, trading_pnl, positions) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (username, day, price_pnl, trading_pnl, json.dumps(positions, separators=(',', ':')))
+                    for username, price_pnl, trading_pnl, positions in rows
+                ]
+            )
+
+    def get_attribution(self, username: str, start: str, end: str) -> List[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT date, price_pnl, trading_pnl, positions FROM pnl_attribution "
+            "WHERE username = ? AND date BETWEEN ? AND ? ORDER BY date",
+            (username, start, end)
+        )
+        return [{**dict(row), 'positions': json.loads(row['positions'])} for row in rows]
+
+    # Rate limits and sessions
+
+    def consume_rate_limit(self, key: str, now: float, interval: float, tolerance: float) -> Optional[float]:
+        """Take one GCRA slot for ``key``; None if allowed, else seconds until the next slot.
+
+        Only the theoretical arrival time is kept per key, and the check and
+        update are one upsert, so concurrent processes cannot both take the
+        last slot.
+        """
+        with self.transaction() as conn:
+            allowed = conn.execute(
+                "INSERT INTO rate_limits (key, tat) VALUES (?1, ?2 + ?3) "
+                "ON CONFLICT(key) DO UPDATE SET tat = max(tat, ?2) + ?3 WHERE max(tat, ?2) - ?2 <= ?4 "
+                "RETURNING tat",
+                (key, now, interval, tolerance)
+            ).fetchone()
+            if allowed is not None:
+                return None
+            tat = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()['tat']
+            return tat - tolerance - now
+
+    def expire_rate_limits(self, now: float) -> int:
+        """Drop keys whose window has fully drained; they behave exactly like absent keys"""
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM rate_limits WHERE tat <= ?", (now,)).rowcount
+
+    def save_session(self, token_hash: str, username: str, created_at: float, expires_at: float):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO sessions (token_hash, username, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (token_hash, username, created_at, expires_at)
+            )
+
+    def get_session(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._query_one("SELECT * FROM sessions WHERE token_hash = ?", (token_hash,))
+        return dict(row) if row else None
+
+    def touch_session(self, token_hash: str, expires_at: float) -> bool:
+        """Push a session's expiry forward; False if it was revoked or has already expired"""
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE sessions SET expires_at = max(expires_at, ?) WHERE token_hash = ?",
+                (expires_at, token_hash)
+            ).rowcount > 0
+
+    def delete_sessions(self, token_hash: Optional[str] = None, username: Optional[str] = None) -> List[str]:
+        """Revoke one session, or every session of ``username``; returns the revoked hashes"""
+        with self.transaction() as conn:
+            rows = conn.execute(
+                "DELETE FROM sessions WHERE token_hash = ? OR username = ? RETURNING token_hash",
+                (token_hash, username)
+            ).fetchall()
+        return [row['token_hash'] for row in rows]
+
+    def expire_sessions(self, now: float) -> int:
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,)).rowcount
+
+    def count_sessions(self, now: float) -> int:
+        return self._query_one("SELECT COUNT(*) AS n FROM sessions WHERE expires_at > ?", (now,))['n']
+
+    # Outbox
+
+    def enqueue_messages(self, messages: List[Dict[str, Any]]) -> int:
+        """Queue outbound messages; ones whose idempotency key is already queued are skipped"""
+        with self.transaction() as conn:
+            return conn.executemany(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, username, kind, recipient, payload, next_attempt_at, created_at) "
+                "VALUES (:idempotency_key, :username, :kind, :recipient, :payload, :next_attempt_at, :created_at)",
+                [{**m, 'payload': json.dumps(m['payload'])} for m in messages]
+            ).rowcount
+
+    def claim_messages(self, now: float, limit: int, lease: float) -> List[Dict[str, Any]]:
+        """Lease up to ``limit`` due messages to the caller.
+
+        A claimed message stays 'sending' until its lease runs out, after which
+        another worker may claim it again, so a crashed worker loses nothing.
+        """
+        with self.transaction() as conn:
+            rows = conn.execute(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, next_attempt_at = ?1 + ?3 "
+                "WHERE id IN (SELECT id FROM outbox WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?1 "
+                "ORDER BY next_attempt_at LIMIT ?2) RETURNING *",
+                (now, limit, lease)
+            ).fetchall()
+        return [{**dict(row), 'payload': json.loads(row['payload'])} for row in rows]
+
+    def finish_message(self, message_id: int, status: str, error: Optional[str] = None, now: Optional[float] = None):
+        """Mark a claimed message sent or failed; its payload is dropped either way"""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = ?, last_error = ?, sent_at = ?, payload = '{}' WHERE id = ?",
+                (status, error, now, message_id)
+            )
+
+    def retry_message(self, message_id: int, next_attempt_at: float, error: str):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (next_attempt_at, error, message_id)
+            )
+
+    def get_message_status(self, username: str) -> List[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT kind, status, attempts, last_error, created_at, sent_at FROM outbox WHERE username = ? ORDER BY id",
+            (username,)
+        )
+        return [dict(row) for row in rows]
+
+    # Pending verifications
+
+    def save_verification(self, username: str, verification: Dict[str, Any]):
+        """Start (or restart) verification for ``username``, resetting its attempts"""
+        self.save_verifications([{**verification, 'username': username}])
+
+    def save_verifications(self, verifications: List[Dict[str, Any]]):
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO verifications "
+                "(username, email_token_hash, phone_otp_hash, email, phone, expires_at) "
+                "VALUES (:username, :email_token_hash, :phone_otp_hash, :email, :phone, :expires_at)",
+                verifications
+            )
+
+    def find_verification_by_token(self, email_token_hash: str) -> Optional[Dict[str, Any]]:
+        row = self._query_one("SELECT * FROM verifications WHERE email_token_hash = ?", (email_token_hash,))
+        return dict(row) if row else None
+
+    def get_verification(self, username: str) -> Optional[Dict[str, Any]]:
+        row = self._query_one("SELECT * FROM verifications WHERE username = ?", (username,))
+        return dict(row) if row else None
+
+    def record_verification_attempt(self, username: str, max_attempts: int) -> bool:
+        """Count one code attempt; False once ``max_attempts`` have been used"""
+        with self.transaction() as conn:
+            return conn.execute(
+                "UPDATE verifications SET attempts = attempts + 1 WHERE username = ? AND attempts < ? RETURNING attempts",
+                (username, max_attempts)
+            ).fetchone() is not None
+
+    def reset_phone_otp(self, username: str, phone_otp_hash: str, max_resends: int, now: float) -> Optional[str]:
+        """Replace a live SMS code and clear its attempts; returns the phone to send it to.
+
+        None if there is no unexpired code to replace or ``max_resends`` have been used.
+        """
+        with self.transaction() as conn:
+            row = conn.execute(
+                "UPDATE verifications SET phone_otp_hash = ?, attempts = 0, resends = resends + 1 "
+                "WHERE username = ? AND phone_otp_hash IS NOT NULL AND expires_at > ? AND resends < ? "
+                "RETURNING phone",
+                (phone_otp_hash, username, now, max_resends)
+            ).fetchone()
+            return row['phone'] if row else None
+
+    def complete_verification(self, username: str, field: str):
+        """Mark ``field`` verified on the user, dropping the entry once nothing is left to verify"""
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE users SET data = json_set(data, '$.' || ?, json('true')) WHERE username = ?",
+                (field, username)
+            )
+            conn.execute(
+                f"UPDATE verifications SET {VERIFICATION_SECRET_COLUMNS[field]} = NULL WHERE username = ?",
+                (username,)
+            )
+            conn.execute(
+                "DELETE FROM verifications WHERE username = ? AND email_token_hash IS NULL AND phone_otp_hash IS NULL",
+                (username,)
+            )
+
+    def expire_verifications(self, now: float) -> int:
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM verifications WHERE expires_at <= ?", (now,)).rowcount
+
+_store: Optional[Store] = None
+_store_lock = threading.Lock()
+
+def get_store() -> Store:
+    """Process-wide store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = Store()
+    return _store
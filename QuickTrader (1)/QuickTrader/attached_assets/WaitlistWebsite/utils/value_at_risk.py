@@ -0,0 +1,167 @@
+import atexit
+import multiprocessing
+import threading
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Callable, List, Optional
+from .cache import LRUCache, hash_key
+
+def _simulate_chunk(method: str, n_paths: int, horizon: int, seed: int, state: Dict[str, np.ndarray]) -> np.ndarray:
+    """Simulated horizon P&L for one chunk of paths.
+
+    Every input arrives as an argument, so concurrent sessions simulating in
+    the same process cannot see each other's positions.
+    """
+    rng = np.random.default_rng(seed)
+    values = state['values']
+
+    if method == 'historical':
+        # Bootstrap whole days so cross-asset correlation is preserved
+        log_returns = state['log_returns']
+        horizon_returns = np.zeros((n_paths, len(values)))
+        for _ in range(horizon):
+            horizon_returns += log_returns[rng.integers(0, len(log_returns), n_paths)]
+    else:
+        shocks = rng.standard_normal((n_paths, len(values)))
+        horizon_returns = state['mean'] * horizon + np.sqrt(horizon) * shocks @ state['cholesky'].T
+
+    return np.expm1(horizon_returns) @ values
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def get_simulation_pool() -> ProcessPoolExecutor:
+    """Process-wide simulation workers, started once and shut down at exit"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # Streamlit runs a thread per session, so workers are spawned rather than forked
+                _pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(_pool.shutdown)
+    return _pool
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died so the next run starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+class MonteCarloVaR:
+    """Value-at-Risk and CVaR for current positions from simulated horizon P&L"""
+
+    _cache = LRUCache(max_size=64)
+
+    def __init__(
+        self,
+        n_paths: int = 100_000,
+        horizon: int = 10,
+        confidence: float = 0.95,
+        method: str = 'historical',
+        parallel_threshold: int = 50,
+        seed: int = 0
+    ):
+        if method not in ('historical', 'parametric'):
+            raise ValueError(f"Unknown simulation method: {method}")
+        self.n_paths = n_paths
+        self.horizon = horizon
+        self.confidence = confidence
+        self.method = method
+        self.parallel_threshold = parallel_threshold
+        self.seed = seed
+
+    def cache_key(self, holdings: Dict[str, float], market_date: Any) -> str:
+        """Key results by holdings, market date and simulation settings"""
+        return hash_key(
+            sorted(holdings.items()), str(market_date),
+            self.n_paths, self.horizon, self.confidence, self.method, self.seed
+        )
+
+    @classmethod
+    def get_cached(cls, key: str) -> Optional[Dict[str, Any]]:
+        return cls._cache.get(key)
+
+    def _chunk_sizes(self, n_assets: int) -> List[int]:
+        # Keep each (paths x assets) block around 16MB so memory stays bounded
+        chunk = max(1_000, 2_000_000 // max(n_assets, 1))
+        sizes = [chunk] * (self.n_paths // chunk)
+        if self.n_paths % chunk:
+            sizes.append(self.n_paths % chunk)
+        return sizes
+
+    def simulate(
+        self,
+        values: np.ndarray,
+        returns: np.ndarray,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ) -> np.ndarray:
+        """Simulated horizon P&L per path for position ``values`` given daily ``returns`` (days x assets)"""
+        log_returns = np.log1p(returns)
+        mean = log_returns.mean(axis=0)
+        covariance = np.atleast_2d(np.cov(log_returns, rowvar=False))
+        # Jitter the diagonal so near-singular covariances still factorize
+        cholesky = np.linalg.cholesky(covariance + np.eye(len(values)) * 1e-12)
+
+        sizes = self._chunk_sizes(len(values))
+        seeds = np.random.SeedSequence(self.seed).generate_state(len(sizes))
+        state = {'log_returns': log_returns, 'values': values, 'mean': mean, 'cholesky': cholesky}
+
+        if len(values) >= self.parallel_threshold and len(sizes) > 1:
+            pool = get_simulation_pool()
+            try:
+                futures = {
+                    pool.submit(_simulate_chunk, self.method, size, self.horizon, int(seed), state): i
+                    for i, (size, seed) in enumerate(zip(sizes, seeds))
+                }
+                results: List[Optional[np.ndarray]] = [None] * len(futures)
+                for done, future in enumerate(as_completed(futures), 1):
+                    results[futures[future]] = future.result()
+                    if progress_callback:
+                        progress_callback(done / len(futures))
+                return np.concatenate(results)
+            except BrokenProcessPool:
+                # A worker was killed, e.g. out of memory; this run finishes in-process
+                _discard_pool(pool)
+
+        results = []
+        for done, (size, seed) in enumerate(zip(sizes, seeds), 1):
+            results.append(_simulate_chunk(self.method, size, self.horizon, int(seed), state))
+            if progress_callback:
+                progress_callback(done / len(sizes))
+        return np.concatenate(results)
+
+    def run(
+        self,
+        holdings: Dict[str, float],
+        prices: Dict[str, float],
+        returns: np.ndarray,
+        market_date: Any,
+        progress_callback: Optional[Callable[[float], None]] = None
+    ) -> Dict[str, Any]:
+        """Compute VaR/CVaR for ``holdings`` (symbol -> quantity), reusing cached results"""
+        key = self.cache_key(holdings, market_date)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return cached
+
+        symbols = sorted(holdings)
+        values = np.array([holdings[s] * prices[s] for s in symbols], dtype=float)
+        pnl = self.simulate(values, returns, progress_callback)
+
+        losses = -pnl
+        var = float(np.quantile(losses, self.confidence))
+        tail = losses[losses >= var]
+        result = {
+            'var': var,
+            'cvar': float(tail.mean()) if len(tail) else var,
+            'portfolio_value': float(values.sum()),
+            'horizon': self.horizon,
+            'confidence': self.confidence,
+            'method': self.method,
+            'pnl_percentiles': np.percentile(pnl, np.arange(1, 100)),
+        }
+        self._cache.set(key, result)
+        return result
@@ -1,34 +1,40 @@
 import os
-import random
-import smtplib
+import secrets
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from twilio.rest import Client
-from typing import Tuple
+from typing import Dict, Optional, Tuple
+from .messaging import get_twilio_client, get_smtp_pool
 
 class Verification:
+    """Email and SMS senders over the process-wide Twilio client and SMTP pool.
+
+    Construction is free, so per-rerun instances cost nothing; the clients
+    are created on first send.
+    """
+
     def __init__(self):
-        self.twilio_client = Client(
-            os.environ['TWILIO_ACCOUNT_SID'],
-            os.environ['TWILIO_AUTH_TOKEN']
-        )
         self.smtp_username = os.environ['SMTP_USERNAME']
-        self.smtp_password = os.environ['SMTP_PASSWORD']
-        
-    def _generate_otp(self) -> str:
-        return str(random.randint(100000, 999999))
+
+    @staticmethod
+    def _generate_otp() -> str:
+        return str(secrets.randbelow(900000) + 100000)
     
-    def send_sms_otp(self, phone_number: str) -> Tuple[bool, str, str]:
+    def send_sms(self, phone_number: str, body: str) -> Tuple[bool, str]:
         try:
-            otp = self._generate_otp()
-            message = self.twilio_client.messages.create(
-                body=f"Your Velasa Trading verification code is: {otp}",
+            get_twilio_client().messages.create(
+                body=body,
                 from_=os.environ['TWILIO_PHONE_NUMBER'],
                 to=phone_number
             )
-            return True, otp, "OTP sent successfully"
+            return True, "SMS sent successfully"
         except Exception as e:
-            return False, "", f"Failed to send OTP: {str(e)}"
+            return False, f"Failed to send SMS: {str(e)}"
+
+    def send_sms_otp(self, phone_number: str, otp: Optional[str] = None) -> Tuple[bool, str, str]:
+        """Text ``otp`` (a fresh one if not given) to ``phone_number``"""
+        otp = otp or self._generate_otp()
+        success, message = self.send_sms(phone_number, f"Your Velasa Trading verification code is: {otp}")
+        return success, otp if success else "", message
     
     def send_email_verification(self, email: str, verification_link: str) -> Tuple[bool, str]:
         try:
@@ -61,11 +67,17 @@ class Verification:
             
             msg.attach(MIMEText(body, 'html'))
             
-            with smtplib.SMTP('smtp.gmail.com', 587) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
-                
+            get_smtp_pool().send_message(msg)
+
             return True, "Verification email sent successfully"
         except Exception as e:
             return False, f"Failed to send verification email: {str(e)}"
+
+    def deliver(self, kind: str, recipient: str, payload: Dict) -> Tuple[bool, str]:
+        """Send one outbox message"""
+        if kind == 'email_verification':
+            return self.send_email_verification(recipient, payload['link'])
+        if kind == 'sms_otp':
+            success, _, message = self.send_sms_otp(recipient, payload['otp'])
+            return success, message
+        return False, f"Unknown message kind: {kind}"
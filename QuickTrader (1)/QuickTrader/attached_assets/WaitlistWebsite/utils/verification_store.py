@@ -0,0 +1,117 @@
+import atexit
+import hmac
+import threading
+import time
+from typing import Dict, List, Optional
+from .store import get_store, hash_secret
+from .metrics import metrics
+
+VERIFICATION_TTL = 24 * 60 * 60
+# Wrong SMS codes allowed before the code is locked and a new one is needed
+MAX_OTP_ATTEMPTS = 5
+# New SMS codes a user may request before verification has to start over
+MAX_OTP_RESENDS = 3
+SWEEP_INTERVAL = 5 * 60
+
+# Outcomes of a verification check
+VERIFIED = 'verified'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+class VerificationStore:
+    """Pending email and SMS verifications, holding only digests of the secrets.
+
+    Email tokens are looked up through a unique index on their digest and SMS
+    codes by username. Expired entries are deleted in bulk by a background
+    sweeper over the expiry index, so abandoned signups do not accumulate.
+    """
+
+    def __init__(self, store=None, sweep_interval: float = SWEEP_INTERVAL):
+        self.store = store or get_store()
+        self.sweep_interval = sweep_interval
+        self._expired = metrics.counter('verification.expired')
+        self._stopped = threading.Event()
+        self._sweeper = threading.Thread(target=self._run, name='verification-sweeper', daemon=True)
+        self._sweeper.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.sweep_interval):
+            self.sweep()
+
+    def sweep(self) -> int:
+        """Delete every expired verification; returns how many went"""
+        expired = self.store.expire_verifications(time.time())
+        self._expired.inc(expired)
+        return expired
+
+    def create(self, username: str, email: str, phone: str, email_token: str, phone_otp: str, ttl: float = VERIFICATION_TTL):
+        self.create_many([{
+            'username': username,
+            'email': email,
+            'phone': phone,
+            'email_token': email_token,
+            'phone_otp': phone_otp
+        }], ttl)
+
+    def create_many(self, pending: List[Dict[str, str]], ttl: float = VERIFICATION_TTL):
+        """Start verification for many users in one transaction"""
+        expires_at = time.time() + ttl
+        self.store.save_verifications([
+            {
+                'username': p['username'],
+                'email_token_hash': hash_secret(p['email_token']),
+                # Six-digit codes are salted per user so equal codes do not share a digest
+                'phone_otp_hash': hash_secret(p['phone_otp'], p['username']),
+                'email': p['email'],
+                'phone': p['phone'],
+                'expires_at': expires_at
+            }
+            for p in pending
+        ])
+
+    def verify_email(self, email_token: str) -> tuple[str, Optional[str]]:
+        """Check an email link token; returns the outcome and the username it belongs to"""
+        verification = self.store.find_verification_by_token(hash_secret(email_token))
+        if verification is None:
+            return INVALID, None
+        if verification['expires_at'] <= time.time():
+            return EXPIRED, verification['username']
+        self.store.complete_verification(verification['username'], 'email_verified')
+        return VERIFIED, verification['username']
+
+    def verify_phone(self, username: str, otp: str) -> str:
+        verification = self.store.get_verification(username)
+        if verification is None or verification['phone_otp_hash'] is None:
+            return NOT_FOUND
+        if verification['expires_at'] <= time.time():
+            return EXPIRED
+        # Counted before comparing, so concurrent guesses cannot exceed the limit
+        if not self.store.record_verification_attempt(username, MAX_OTP_ATTEMPTS):
+            return LOCKED
+        if not hmac.compare_digest(verification['phone_otp_hash'], hash_secret(otp, username)):
+            return INVALID
+        self.store.complete_verification(username, 'phone_verified')
+        return VERIFIED
+
+    def resend_phone_otp(self, username: str, phone_otp: str) -> Optional[str]:
+        """Swap in a new SMS code with fresh attempts; returns the phone to send it to, or None"""
+        return self.store.reset_phone_otp(username, hash_secret(phone_otp, username), MAX_OTP_RESENDS, time.time())
+
+    def close(self):
+        self._stopped.set()
+        self._sweeper.join()
+
+_verification_store: Optional[VerificationStore] = None
+_verification_store_lock = threading.Lock()
+
+def get_verification_store() -> VerificationStore:
+    """Process-wide verification store; its sweeper stops at exit"""
+    global _verification_store
+    if _verification_store is None:
+        with _verification_store_lock:
+            if _verification_store is None:
+                _verification_store = VerificationStore()
+                atexit.register(_verification_store.close)
+    return _verification_store
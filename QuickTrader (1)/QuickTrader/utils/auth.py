@@ -93,7 +93,7 @@ class AuthManager:
         # Send verification email and SMS
         verification_link = f"https://velasa-trading.com/verify/email/{email_token}"
         email_success, email_msg = self.verification.send_email_verification(email, verification_link)
-        sms_success, otp, sms_msg = self.verification.send_sms_otp(phone)
+        sms_success, otp, sms_msg = self.verification.send_sms_otp(phone, phone_otp)
 
         if not email_success:
             return False, f"Failed to send verification email: {email_msg}"
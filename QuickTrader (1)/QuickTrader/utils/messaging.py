@@ -0,0 +1,21 @@
+import os
+import threading
+from typing import Optional
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client
+
+_twilio_client: Optional[Client] = None
+_twilio_lock = threading.Lock()
+
+def get_twilio_client() -> Client:
+    """Process-wide Twilio client whose HTTP session keeps connections alive between sends"""
+    global _twilio_client
+    if _twilio_client is None:
+        with _twilio_lock:
+            if _twilio_client is None:
+                _twilio_client = Client(
+                    os.getenv("TWILIO_ACCOUNT_SID"),
+                    os.getenv("TWILIO_AUTH_TOKEN"),
+                    http_client=TwilioHttpClient(pool_connections=True, max_retries=3)
+                )
+    return _twilio_client
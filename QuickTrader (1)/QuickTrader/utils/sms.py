@@ -1,15 +1,13 @@
 import os
-from twilio.rest import Client
 import random
+from utils.messaging import get_twilio_client
 
-TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
-TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
 TWILIO_PHONE_NUMBER = os.getenv("TWILIO_PHONE_NUMBER")
 
 def send_verification_code(phone_number: str) -> str:
     """Send verification code via SMS"""
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    
+    client = get_twilio_client()
+
     # Generate verification code
     verification_code = str(random.randint(100000, 999999))
     
@@ -1,30 +1,27 @@
-from twilio.rest import Client
 import os
 import secrets
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import Optional
+from utils.messaging import get_twilio_client
 
 class Verification:
     def __init__(self):
-        self.twilio_client = Client(
-            os.getenv("TWILIO_ACCOUNT_SID"),
-            os.getenv("TWILIO_AUTH_TOKEN")
-        )
+        # The Twilio client is shared by the whole process, so instances are free to create
         self.twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
 
     def _generate_otp(self) -> str:
         """Generate a 6-digit OTP"""
         return ''.join([str(secrets.randbelow(10)) for _ in range(6)])
 
-    def send_sms_otp(self, phone_number: str) -> tuple[bool, str, str]:
-        """Send OTP via SMS"""
+    def send_sms_otp(self, phone_number: str, otp: Optional[str] = None) -> tuple[bool, str, str]:
+        """Send ``otp`` (a fresh one if not given) via SMS"""
         try:
             if not phone_number.startswith('+'):
                 return False, "", "Phone number must include country code (e.g., +1234567890)"
 
-            otp = self._generate_otp()
-            message = self.twilio_client.messages.create(
+            otp = otp or self._generate_otp()
+            message = get_twilio_client().messages.create(
                 body=f"Your Velasa Trading verification code is: {otp}",
                 from_=self.twilio_phone,
                 to=phone_number